@@ -7,38 +7,36 @@
 - 晚间时段: 16:00-24:00 (对应美股盘)
 """
 import asyncio
-import yaml
 import pandas as pd
 import numpy as np
 from datetime import datetime
 from loguru import logger
 import sys
 
-from data_fetcher import DataFetcher
+from data_fetcher import close_shared_fetcher, fetch_ohlcv_cached, to_numpy_dict
 from indicators import TechnicalIndicators
-from strategy import TradingStrategy, SignalType
+from strategy import TradingStrategy
+from backtest_core import simulate, load_config
 
 
-def get_session(hour: int) -> str:
-    """根据北京时间小时判断时段"""
-    if 0 <= hour < 8:
-        return "凌晨(0-8点)"
-    elif 8 <= hour < 16:
-        return "白天(8-16点)"
-    else:
-        return "晚间(16-24点)"
+# 时段名称，下标即时段编码
+SESSION_NAMES = ("凌晨(0-8点)", "白天(8-16点)", "晚间(16-24点)")
+
+
+def get_session_codes(index: pd.DatetimeIndex) -> np.ndarray:
+    """按北京时间小时计算每根K线的时段编码（0=凌晨, 1=白天, 2=晚间）"""
+    beijing_hours = (index.hour.to_numpy() + 8) % 24
+    return (beijing_hours // 8).astype(np.uint8)
 
 
 async def analyze_sessions(days: int = 40):
-    with open('config.yaml', 'r', encoding='utf-8') as f:
-        config = yaml.safe_load(f)
+    config = load_config()
     
-    fetcher = DataFetcher(config)
-    await fetcher.init()
-    
-    limit = min(days * 24, 1000)
-    df = await fetcher.fetch_ohlcv('1h', limit=limit)
-    await fetcher.close()
+    limit = days * 24
+    try:
+        df = await fetch_ohlcv_cached(config, '1h', limit=limit)
+    finally:
+        await close_shared_fetcher()
     
     if df.empty or len(df) < 100:
         print("数据不足")
@@ -47,79 +45,21 @@ async def analyze_sessions(days: int = 40):
     indicators_calc = TechnicalIndicators(config)
     strategy = TradingStrategy(config)
     
-    # 存储每个时段的交易
-    session_trades = {
-        "凌晨(0-8点)": [],
-        "白天(8-16点)": [],
-        "晚间(16-24点)": []
-    }
+    # 一次性计算全部指标序列和每根K线的信号，避免逐根K线重算
+    indicator_arrays = indicators_calc.calculate_all_vectorized(df)
+    signal_type, stop_loss, take_profit, _ = strategy.analyze_batch(indicator_arrays)
     
     # 模拟交易
-    position = None
+    ohlcv = to_numpy_dict(df)
+    result = simulate(ohlcv['low'], ohlcv['high'], ohlcv['close'],
+                      signal_type, stop_loss, take_profit)
     
-    for i in range(50, len(df)):
-        current_bar = df.iloc[i]
-        current_time = df.index[i]
-        current_price = current_bar['close']
-        
-        # 转换为北京时间 (UTC+8)
-        beijing_hour = (current_time.hour + 8) % 24
-        session = get_session(beijing_hour)
-        
-        historical = df.iloc[:i+1].copy()
-        ind = indicators_calc.calculate_all(historical)
-        
-        if not ind:
-            continue
-        
-        # 检查平仓
-        if position:
-            exit_reason = None
-            exit_price = None
-            
-            if position['direction'] == 'long':
-                if current_bar['low'] <= position['stop_loss']:
-                    exit_price = position['stop_loss']
-                    exit_reason = "止损"
-                elif current_bar['high'] >= position['take_profit']:
-                    exit_price = position['take_profit']
-                    exit_reason = "止盈"
-            else:
-                if current_bar['high'] >= position['stop_loss']:
-                    exit_price = position['stop_loss']
-                    exit_reason = "止损"
-                elif current_bar['low'] <= position['take_profit']:
-                    exit_price = position['take_profit']
-                    exit_reason = "止盈"
-            
-            if exit_reason:
-                if position['direction'] == 'long':
-                    pnl_pct = (exit_price - position['entry_price']) / position['entry_price'] * 100
-                else:
-                    pnl_pct = (position['entry_price'] - exit_price) / position['entry_price'] * 100
-                
-                session_trades[position['session']].append({
-                    'entry_time': position['entry_time'],
-                    'exit_time': current_time,
-                    'direction': position['direction'],
-                    'pnl_pct': pnl_pct,
-                    'exit_reason': exit_reason
-                })
-                position = None
-        
-        # 开新仓
-        if not position:
-            signal = strategy.analyze(ind, '1h')
-            if signal and signal.signal_type != SignalType.NEUTRAL:
-                direction = 'long' if signal.signal_type in [SignalType.BUY, SignalType.STRONG_BUY] else 'short'
-                position = {
-                    'entry_time': current_time,
-                    'entry_price': current_price,
-                    'direction': direction,
-                    'stop_loss': signal.stop_loss,
-                    'take_profit': signal.take_profit,
-                    'session': session
-                }
+    # 按开仓时段归类，每个时段保存其交易的收益率(%)数组
+    trade_sessions = get_session_codes(df.index)[result.trades['entry_idx']]
+    trade_pnl_pct = result.trades['pnl_pct'] * 100
+    session_trades = {
+        name: trade_pnl_pct[trade_sessions == code] for code, name in enumerate(SESSION_NAMES)
+    }
     
     # 打印分析结果
     print("\n" + "=" * 70)
@@ -128,24 +68,22 @@ async def analyze_sessions(days: int = 40):
     print(f"数据范围: {df.index[50]} ~ {df.index[-1]}")
     print(f"总天数: {days}天\n")
     
-    all_trades = []
-    for session_name, trades in session_trades.items():
-        all_trades.extend(trades)
-        
-        if not trades:
+    for session_name, pnl_pct in session_trades.items():
+        if not len(pnl_pct):
             print(f"\n🕐 {session_name}: 无交易")
             continue
         
-        wins = [t for t in trades if t['pnl_pct'] > 0]
-        losses = [t for t in trades if t['pnl_pct'] <= 0]
+        wins_mask = pnl_pct > 0
+        wins = pnl_pct[wins_mask]
+        losses = pnl_pct[~wins_mask]
         
-        total_pnl = sum(t['pnl_pct'] for t in trades)
-        win_rate = len(wins) / len(trades) * 100
-        avg_win = np.mean([t['pnl_pct'] for t in wins]) if wins else 0
-        avg_loss = np.mean([t['pnl_pct'] for t in losses]) if losses else 0
+        total_pnl = pnl_pct.sum()
+        win_rate = wins_mask.mean() * 100
+        avg_win = wins.mean() if len(wins) else 0
+        avg_loss = losses.mean() if len(losses) else 0
         
         print(f"\n🕐 {session_name}")
-        print(f"   交易次数: {len(trades)}")
+        print(f"   交易次数: {len(pnl_pct)}")
         print(f"   胜率:     {win_rate:.1f}%")
         print(f"   总收益:   {total_pnl:+.2f}%")
         print(f"   平均盈利: {avg_win:+.2f}%")
@@ -163,11 +101,11 @@ async def analyze_sessions(days: int = 40):
     best_session = None
     best_return = -999
     
-    for session_name, trades in session_trades.items():
-        if trades:
-            total_return = sum(t['pnl_pct'] for t in trades)
-            win_rate = len([t for t in trades if t['pnl_pct'] > 0]) / len(trades) * 100
-            print(f"   {session_name}: {len(trades)}笔, 胜率{win_rate:.0f}%, 收益{total_return:+.1f}%")
+    for session_name, pnl_pct in session_trades.items():
+        if len(pnl_pct):
+            total_return = pnl_pct.sum()
+            win_rate = (pnl_pct > 0).mean() * 100
+            print(f"   {session_name}: {len(pnl_pct)}笔, 胜率{win_rate:.0f}%, 收益{total_return:+.1f}%")
             
             if total_return > best_return:
                 best_return = total_return
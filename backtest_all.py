@@ -3,125 +3,60 @@
 所有策略对比回测
 """
 import asyncio
-import yaml
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 from datetime import datetime
 from loguru import logger
 import sys
 
-from data_fetcher import DataFetcher
+from data_fetcher import close_shared_fetcher, fetch_ohlcv_cached, to_numpy_dict
 from indicators import TechnicalIndicators
 from strategy_overnight import OvernightStrategy
-from strategy_trend import TrendStrategy, SignalType
+from strategy_trend import TrendStrategy
 from strategy_breakout import BreakoutStrategy
 from strategy_combo import ComboStrategy
+from backtest_core import simulate, trade_hold_hours, max_drawdown, load_config
 
 
-async def backtest_strategy(strategy, strategy_name, df, indicators_calc, leverage=20, position_size=0.10):
-    """回测单个策略"""
-    trades = []
-    position = None
+async def backtest_strategy(strategy, strategy_name, df, indicator_arrays, leverage=20, position_size=0.10):
+    """回测单个策略，indicator_arrays 为各策略共用的整段指标序列"""
     initial_capital = 10000
-    capital = initial_capital
     
-    for i in range(50, len(df)):
-        current_bar = df.iloc[i]
-        current_time = df.index[i]
-        current_price = current_bar['close']
-        
-        historical = df.iloc[:i+1].copy()
-        ind = indicators_calc.calculate_all(historical)
-        
-        if not ind:
-            continue
-        
-        # 检查平仓
-        if position:
-            exit_reason = None
-            exit_price = None
-            
-            if position['direction'] == 'long':
-                if current_bar['low'] <= position['stop_loss']:
-                    exit_price = position['stop_loss']
-                    exit_reason = "止损"
-                elif current_bar['high'] >= position['take_profit']:
-                    exit_price = position['take_profit']
-                    exit_reason = "止盈"
-            else:
-                if current_bar['high'] >= position['stop_loss']:
-                    exit_price = position['stop_loss']
-                    exit_reason = "止损"
-                elif current_bar['low'] <= position['take_profit']:
-                    exit_price = position['take_profit']
-                    exit_reason = "止盈"
-            
-            if exit_reason:
-                if position['direction'] == 'long':
-                    pnl_pct = (exit_price - position['entry_price']) / position['entry_price']
-                else:
-                    pnl_pct = (position['entry_price'] - exit_price) / position['entry_price']
-                
-                pnl_pct_leveraged = pnl_pct * leverage * position_size
-                pnl = capital * pnl_pct_leveraged
-                
-                if pnl_pct * leverage <= -1:
-                    pnl = -capital * position_size
-                
-                capital += pnl
-                hold_hours = (current_time - position['entry_time']).total_seconds() / 3600
-                
-                trades.append({
-                    'pnl_pct': pnl_pct_leveraged * 100,
-                    'pnl': pnl,
-                    'exit_reason': exit_reason,
-                    'hold_hours': hold_hours
-                })
-                position = None
-                
-                if capital <= 0:
-                    break
-        
-        # 开仓
-        if not position and capital > 0:
-            signal = strategy.analyze(ind, '1h')
-            if signal and signal.signal_type != SignalType.NEUTRAL:
-                direction = 'long' if signal.signal_type in [SignalType.BUY, SignalType.STRONG_BUY] else 'short'
-                position = {
-                    'entry_time': current_time,
-                    'entry_price': current_price,
-                    'direction': direction,
-                    'stop_loss': signal.stop_loss,
-                    'take_profit': signal.take_profit
-                }
-    
-    # 计算统计
-    if not trades:
+    # 一次性生成每根K线的信号，避免逐根K线重算
+    signal_type, stop_loss, take_profit, _ = strategy.analyze_batch(indicator_arrays)
+    
+    ohlcv = to_numpy_dict(df)
+    result = simulate(ohlcv['low'], ohlcv['high'], ohlcv['close'],
+                      signal_type, stop_loss, take_profit,
+                      initial_capital=initial_capital, leverage=leverage, position_size=position_size)
+    capital = result.capital
+    trades = result.trades
+    
+    # 计算统计（直接在交易记录的各列上做向量运算）
+    if not len(trades):
         return None
     
-    wins = [t for t in trades if t['pnl_pct'] > 0]
-    losses = [t for t in trades if t['pnl_pct'] <= 0]
+    pnl_pct = trades['pnl_pct'] * leverage * position_size * 100
+    hold_hours = trade_hold_hours(df.index, trades)
+    wins_mask = pnl_pct > 0
+    wins = pnl_pct[wins_mask]
+    losses = pnl_pct[~wins_mask]
     
     total_return = (capital - initial_capital) / initial_capital * 100
-    win_rate = len(wins) / len(trades) * 100 if trades else 0
-    avg_win = np.mean([t['pnl_pct'] for t in wins]) if wins else 0
-    avg_loss = np.mean([t['pnl_pct'] for t in losses]) if losses else 0
-    profit_factor = abs(sum(t['pnl_pct'] for t in wins) / sum(t['pnl_pct'] for t in losses)) if losses and sum(t['pnl_pct'] for t in losses) != 0 else float('inf')
-    avg_hold = np.mean([t['hold_hours'] for t in trades])
-    
-    # 最大回撤
-    equity = initial_capital
-    peak = initial_capital
-    max_dd = 0
-    for t in trades:
-        equity += t['pnl']
-        peak = max(peak, equity)
-        dd = (equity - peak) / peak
-        max_dd = min(max_dd, dd)
+    win_rate = wins_mask.mean() * 100
+    avg_win = wins.mean() if len(wins) else 0
+    avg_loss = losses.mean() if len(losses) else 0
+    loss_sum = losses.sum()
+    profit_factor = abs(wins.sum() / loss_sum) if len(losses) and loss_sum != 0 else float('inf')
+    avg_hold = hold_hours.mean()
+    
+    # 最大回撤（按逐笔平仓后的资金计算）
+    max_dd = max_drawdown(initial_capital, trades['pnl'])
     
     # 夏普比率
     if len(trades) > 1:
-        returns = [t['pnl_pct'] for t in trades]
-        sharpe = np.mean(returns) / np.std(returns) * np.sqrt(252 / avg_hold * 24) if np.std(returns) > 0 else 0
+        std = pnl_pct.std()
+        sharpe = pnl_pct.mean() / std * np.sqrt(252 / avg_hold * 24) if std > 0 else 0
     else:
         sharpe = 0
     
@@ -137,29 +72,31 @@ async def backtest_strategy(strategy, strategy_name, df, indicators_calc, levera
     }
 
 
+def _run_one(strategy_cls, strategy_name, config, df, indicator_arrays):
+    """子进程入口：构建策略后回测"""
+    strategy = strategy_cls(config)
+    return asyncio.run(backtest_strategy(strategy, strategy_name, df, indicator_arrays))
+
+
 async def main(days: int = 40):
-    with open('config.yaml', 'r', encoding='utf-8') as f:
-        config = yaml.safe_load(f)
+    config = load_config()
     
-    fetcher = DataFetcher(config)
-    await fetcher.init()
-    
-    limit = min(days * 24, 1000)
-    df = await fetcher.fetch_ohlcv('1h', limit=limit)
-    await fetcher.close()
+    limit = days * 24
+    try:
+        df = await fetch_ohlcv_cached(config, '1h', limit=limit)
+    finally:
+        await close_shared_fetcher()
     
     if df.empty or len(df) < 100:
         print("数据不足")
         return
     
-    indicators_calc = TechnicalIndicators(config)
-    
     # 所有策略
     strategies = [
-        (OvernightStrategy(config), "均值回归"),
-        (TrendStrategy(config), "趋势跟踪"),
-        (BreakoutStrategy(config), "突破策略"),
-        (ComboStrategy(config), "多策略组合"),
+        (OvernightStrategy, "均值回归"),
+        (TrendStrategy, "趋势跟踪"),
+        (BreakoutStrategy, "突破策略"),
+        (ComboStrategy, "多策略组合"),
     ]
     
     print("\n" + "=" * 80)
@@ -167,11 +104,17 @@ async def main(days: int = 40):
     print("=" * 80)
     print(f"数据范围: {df.index[50]} ~ {df.index[-1]}\n")
     
-    results = []
-    for strategy, name in strategies:
-        result = await backtest_strategy(strategy, name, df, indicators_calc)
-        if result:
-            results.append(result)
+    # 指标与策略无关，主进程只算一次，随任务分发给各子进程
+    indicator_arrays = TechnicalIndicators(config).calculate_all_vectorized(df)
+    
+    # 各策略互不依赖，分发到多进程并行回测
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(max_workers=len(strategies)) as pool:
+        outputs = await asyncio.gather(*[
+            loop.run_in_executor(pool, _run_one, strategy_cls, name, config, df, indicator_arrays)
+            for strategy_cls, name in strategies
+        ])
+    results = [r for r in outputs if r]
     
     # 打印对比表格
     print(f"{'策略':<12} {'收益':>8} {'胜率':>8} {'盈亏比':>8} {'回撤':>8} {'夏普':>8} {'交易数':>8}")
@@ -0,0 +1,260 @@
+"""
+回测公共模块 - 各回测脚本共用的持仓模拟内核、出场扫描等函数
+"""
+from dataclasses import dataclass
+from functools import lru_cache
+
+import numpy as np
+import yaml
+
+from jit_utils import njit
+
+
+# 信号类型编码，按枚举名称对应（各策略模块各自定义了SignalType）
+SIGNAL_CODES = {
+    'STRONG_BUY': 2,
+    'BUY': 1,
+    'NEUTRAL': 0,
+    'SELL': -1,
+    'STRONG_SELL': -2
+}
+
+# 指标快照从第50根K线起才有数据
+MIN_BARS = 50
+
+# 每小时的纳秒数，持仓时长按int64纳秒时间戳计算
+NS_PER_HOUR = 3_600_000_000_000
+
+# 平仓原因编码即下标
+EXIT_REASONS = ("止损", "止盈", "回测结束")
+
+# 模拟内核输出的交易记录，pnl_pct为未计杠杆和仓位的价格涨跌幅
+TRADE_RECORD_DTYPE = np.dtype([
+    ('entry_idx', np.int64),
+    ('exit_idx', np.int64),
+    ('entry_price', np.float64),
+    ('exit_price', np.float64),
+    ('stop_loss', np.float64),
+    ('take_profit', np.float64),
+    ('direction', np.int64),
+    ('exit_reason', np.int64),
+    ('pnl', np.float64),
+    ('pnl_pct', np.float64),
+    ('position_size', np.float64)
+])
+
+
+@dataclass
+class SimulationResult:
+    trades: np.ndarray  # TRADE_RECORD_DTYPE 结构化数组
+    equity: np.ndarray  # 从start起逐根K线的权益
+    capital: float
+    consecutive_losses: int
+    cooldown_bars: int
+
+
+@lru_cache(maxsize=None)
+def load_config(path: str = 'config.yaml') -> dict:
+    """读取配置文件，同一进程内只解析一次（返回的dict各处共用，不要原地修改）"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return yaml.safe_load(f)
+
+
+def indicator_column(arrays: dict, key: str, default) -> np.ndarray:
+    """按 dict.get 语义取指标序列：未计算的指标和周期不足(NaN)的均线取默认值"""
+    n = len(arrays['price'])
+    if key not in arrays:
+        return np.broadcast_to(np.asarray(default, dtype=np.float64), (n,))
+    values = arrays[key]
+    if key.startswith(('ma_', 'ema_')):
+        return np.where(np.isnan(values), default, values)
+    return values
+
+
+def trade_hold_hours(index, trades: np.ndarray) -> np.ndarray:
+    """按K线时间索引计算每笔交易的持仓小时数（int64纳秒相减，不经Timedelta对象）"""
+    ts_ns = index.values.astype('datetime64[ns]').view(np.int64)
+    return (ts_ns[trades['exit_idx']] - ts_ns[trades['entry_idx']]) / NS_PER_HOUR
+
+
+def max_drawdown(initial_capital: float, pnls: np.ndarray) -> float:
+    """按逐笔平仓后的资金计算最大回撤（非正的小数），权益从初始资金起逐笔累加，与资金的累加顺序一致"""
+    equity = np.cumsum(np.concatenate(([initial_capital], pnls)))[1:]
+    peaks = np.maximum(np.maximum.accumulate(equity), initial_capital)
+    return min(((equity - peaks) / peaks).min(), 0)
+
+
+def finalize_signals(valid: np.ndarray, score: np.ndarray, stop_loss: np.ndarray,
+                     take_profit: np.ndarray, strong: float, normal: float) -> tuple:
+    """组装 analyze_batch 的输出 (信号编码, 止损, 止盈, 强度)
+    
+    strong/normal 为强信号和普通信号的分数阈值，无信号的K线编码为0、止损止盈为NaN
+    """
+    n = len(score)
+    valid = valid & (np.arange(n) >= MIN_BARS - 1)
+    codes = np.select(
+        [score >= strong, score >= normal, score <= -strong, score <= -normal],
+        [2, 1, -2, -1], 0
+    )
+    codes = np.where(valid, codes, 0).astype(np.int8)
+    
+    has_signal = codes != 0
+    stop_loss = np.where(has_signal, np.round(stop_loss, 2), np.nan)
+    take_profit = np.where(has_signal, np.round(take_profit, 2), np.nan)
+    # 强度取值0-100，用int8存储，与信号编码一样按字节读取
+    strength = np.where(has_signal, np.minimum(100, np.abs(np.trunc(score))), 0).astype(np.int8)
+    return codes, stop_loss, take_profit, strength
+
+
+@njit(cache=True, nogil=True)
+def _simulate_kernel(low, high, close, signal_type, stop_loss, take_profit, strength, entry_mask,
+                     start, initial_capital, leverage, position_size, risk_control, close_at_end,
+                     consecutive_losses, cooldown_bars, records, equity):
+    """逐根K线模拟持仓，交易写入records，权益写入equity
+    返回 (交易笔数, 最终资金, 连续亏损次数, 冷却期剩余K线数)
+    """
+    n = len(close)
+    capital = initial_capital
+    n_trades = 0
+    
+    in_position = False
+    direction = 0
+    entry_idx = 0
+    entry_price = 0.0
+    sl = 0.0
+    tp = 0.0
+    size = 0.0
+    
+    last = start - 1
+    for i in range(start, n):
+        last = i
+        current_price = close[i]
+        
+        # 检查止损止盈（同一根K线都触及时按止损处理）
+        # direction为±1，多空统一按符号比较：不利价格(多头最低/空头最高)穿过止损，有利价格穿过止盈
+        if in_position:
+            adverse = low[i] if direction > 0 else high[i]
+            favorable = high[i] if direction > 0 else low[i]
+            hit_sl = direction * (adverse - sl) <= 0
+            hit_tp = direction * (favorable - tp) >= 0
+            
+            if hit_sl or hit_tp:
+                exit_price = sl if hit_sl else tp
+                exit_reason = 0 if hit_sl else 1
+                pnl_pct = direction * (exit_price - entry_price) / entry_price
+                pnl = capital * (pnl_pct * leverage * size)
+                # 杠杆仓位最多亏光保证金
+                if leverage > 1 and pnl_pct * leverage <= -1:
+                    pnl = -capital * size
+                capital += pnl
+                
+                if risk_control:
+                    if pnl < 0:
+                        consecutive_losses += 1
+                        if consecutive_losses >= 3:
+                            cooldown_bars = 5  # 连续3次亏损后冷却5根K线
+                    else:
+                        consecutive_losses = 0
+                    
+                rec = records[n_trades]
+                rec['entry_idx'] = entry_idx
+                rec['exit_idx'] = i
+                rec['entry_price'] = entry_price
+                rec['exit_price'] = exit_price
+                rec['stop_loss'] = sl
+                rec['take_profit'] = tp
+                rec['direction'] = direction
+                rec['exit_reason'] = exit_reason
+                rec['pnl'] = pnl
+                rec['pnl_pct'] = pnl_pct
+                rec['position_size'] = size
+                n_trades += 1
+                in_position = False
+                
+        # 资金归零停止回测
+        if capital <= 0:
+            equity[i - start:] = capital
+            break
+        
+        # 冷却期倒计时
+        if cooldown_bars > 0:
+            cooldown_bars -= 1
+            
+        # 开新仓
+        if not in_position and cooldown_bars == 0 and signal_type[i] != 0 and entry_mask[i]:
+            size = position_size
+            if risk_control:
+                # 动态仓位：根据信号强度和连续亏损调整
+                if strength[i] < 40:
+                    size = position_size * 0.6
+                elif strength[i] < 50:
+                    size = position_size * 0.8
+                if consecutive_losses >= 2:
+                    size *= 0.5
+                    
+            in_position = True
+            direction = 1 if signal_type[i] > 0 else -1
+            entry_idx = i
+            entry_price = current_price
+            sl = stop_loss[i]
+            tp = take_profit[i]
+            
+        # 记录权益曲线
+        current_equity = capital
+        if in_position:
+            current_equity += capital * (direction * (current_price - entry_price)) / entry_price
+        equity[i - start] = current_equity
+        
+    # 强制平仓未完成的交易
+    if close_at_end and in_position:
+        exit_price = close[last]
+        pnl_pct = direction * (exit_price - entry_price) / entry_price
+        # 按开仓参数计算，不受动态仓位调整影响
+        pnl = capital * (pnl_pct * leverage * position_size)
+        capital += pnl
+        
+        rec = records[n_trades]
+        rec['entry_idx'] = entry_idx
+        rec['exit_idx'] = last
+        rec['entry_price'] = entry_price
+        rec['exit_price'] = exit_price
+        rec['stop_loss'] = sl
+        rec['take_profit'] = tp
+        rec['direction'] = direction
+        rec['exit_reason'] = 2
+        rec['pnl'] = pnl
+        rec['pnl_pct'] = pnl_pct
+        rec['position_size'] = size
+        n_trades += 1
+        
+    return n_trades, capital, consecutive_losses, cooldown_bars
+
+
+def simulate(low: np.ndarray, high: np.ndarray, close: np.ndarray, signal_type: np.ndarray,
+             stop_loss: np.ndarray, take_profit: np.ndarray, strength: np.ndarray = None, *,
+             entry_mask: np.ndarray = None, start: int = MIN_BARS, initial_capital: float = 10000,
+             leverage: float = 1.0, position_size: float = 1.0, risk_control: bool = False,
+             close_at_end: bool = False, consecutive_losses: int = 0,
+             cooldown_bars: int = 0) -> SimulationResult:
+    """按 analyze_batch 生成的信号逐根模拟开平仓，各回测脚本共用
+    
+    risk_control: 按信号强度和连续亏损调整仓位，连续3次亏损后冷却5根K线
+    close_at_end: 回测结束时按最后收盘价强制平仓
+    entry_mask: 允许开仓的K线（如只在特定时段开仓），平仓不受限制，默认全部允许
+    """
+    n = len(close)
+    if strength is None:
+        strength = np.zeros(n, dtype=np.int8)
+    if entry_mask is None:
+        entry_mask = np.ones(n, dtype=np.bool_)
+    records = np.zeros(n, dtype=TRADE_RECORD_DTYPE)
+    equity = np.empty(max(n - start, 0))
+    n_trades, capital, consecutive_losses, cooldown_bars = _simulate_kernel(
+        np.ascontiguousarray(low, dtype=np.float64),
+        np.ascontiguousarray(high, dtype=np.float64),
+        np.ascontiguousarray(close, dtype=np.float64),
+        signal_type, stop_loss, take_profit, strength, np.asarray(entry_mask, dtype=np.bool_),
+        start, float(initial_capital), float(leverage), float(position_size),
+        risk_control, close_at_end, consecutive_losses, cooldown_bars, records, equity
+    )
+    return SimulationResult(records[:n_trades], equity, capital, consecutive_losses, cooldown_bars)
@@ -3,34 +3,32 @@
 隔夜时段专用回测 - 只在北京时间0:00-8:00开仓
 """
 import asyncio
-import yaml
 import pandas as pd
 import numpy as np
 from datetime import datetime
 from loguru import logger
 import sys
 
-from data_fetcher import DataFetcher
+from data_fetcher import close_shared_fetcher, fetch_ohlcv_cached, to_numpy_dict
 from indicators import TechnicalIndicators
-from strategy import TradingStrategy, SignalType
+from strategy import TradingStrategy
+from backtest_core import EXIT_REASONS, simulate, max_drawdown, load_config
 
 
-def is_overnight_session(utc_time) -> bool:
-    """判断是否在北京时间凌晨时段 (0:00-8:00)，对应UTC 16:00-00:00"""
-    beijing_hour = (utc_time.hour + 8) % 24
-    return 0 <= beijing_hour < 8
+def is_overnight_session(index: pd.DatetimeIndex) -> np.ndarray:
+    """逐根K线判断是否在北京时间凌晨时段 (0:00-8:00)，对应UTC 16:00-00:00"""
+    beijing_hours = (index.hour.to_numpy() + 8) % 24
+    return beijing_hours < 8
 
 
 async def backtest_overnight(days: int = 40):
-    with open('config.yaml', 'r', encoding='utf-8') as f:
-        config = yaml.safe_load(f)
+    config = load_config()
     
-    fetcher = DataFetcher(config)
-    await fetcher.init()
-    
-    limit = min(days * 24, 1000)
-    df = await fetcher.fetch_ohlcv('1h', limit=limit)
-    await fetcher.close()
+    limit = days * 24
+    try:
+        df = await fetch_ohlcv_cached(config, '1h', limit=limit)
+    finally:
+        await close_shared_fetcher()
     
     if df.empty or len(df) < 100:
         print("数据不足")
@@ -39,178 +37,101 @@ async def backtest_overnight(days: int = 40):
     indicators_calc = TechnicalIndicators(config)
     strategy = TradingStrategy(config)
     
-    trades = []
-    position = None
     initial_capital = 10000
-    capital = initial_capital
-    
-    for i in range(50, len(df)):
-        current_bar = df.iloc[i]
-        current_time = df.index[i]
-        current_price = current_bar['close']
-        
-        historical = df.iloc[:i+1].copy()
-        ind = indicators_calc.calculate_all(historical)
-        
-        if not ind:
-            continue
-        
-        # 检查平仓（任何时间都可以平仓）
-        if position:
-            exit_reason = None
-            exit_price = None
-            
-            if position['direction'] == 'long':
-                if current_bar['low'] <= position['stop_loss']:
-                    exit_price = position['stop_loss']
-                    exit_reason = "止损"
-                elif current_bar['high'] >= position['take_profit']:
-                    exit_price = position['take_profit']
-                    exit_reason = "止盈"
-            else:
-                if current_bar['high'] >= position['stop_loss']:
-                    exit_price = position['stop_loss']
-                    exit_reason = "止损"
-                elif current_bar['low'] <= position['take_profit']:
-                    exit_price = position['take_profit']
-                    exit_reason = "止盈"
-            
-            if exit_reason:
-                if position['direction'] == 'long':
-                    pnl_pct = (exit_price - position['entry_price']) / position['entry_price']
-                else:
-                    pnl_pct = (position['entry_price'] - exit_price) / position['entry_price']
-                
-                pnl = capital * pnl_pct
-                capital += pnl
-                
-                trades.append({
-                    'entry_time': position['entry_time'],
-                    'exit_time': current_time,
-                    'direction': position['direction'],
-                    'entry_price': position['entry_price'],
-                    'exit_price': exit_price,
-                    'pnl_pct': pnl_pct * 100,
-                    'pnl': pnl,
-                    'exit_reason': exit_reason
-                })
-                position = None
-        
-        # 只在隔夜时段开仓
-        if not position and is_overnight_session(current_time):
-            signal = strategy.analyze(ind, '1h')
-            if signal and signal.signal_type != SignalType.NEUTRAL:
-                direction = 'long' if signal.signal_type in [SignalType.BUY, SignalType.STRONG_BUY] else 'short'
-                position = {
-                    'entry_time': current_time,
-                    'entry_price': current_price,
-                    'direction': direction,
-                    'stop_loss': signal.stop_loss,
-                    'take_profit': signal.take_profit
-                }
-    
-    # 强制平仓
-    if position:
-        exit_price = df.iloc[-1]['close']
-        if position['direction'] == 'long':
-            pnl_pct = (exit_price - position['entry_price']) / position['entry_price']
-        else:
-            pnl_pct = (position['entry_price'] - exit_price) / position['entry_price']
-        
-        pnl = capital * pnl_pct
-        capital += pnl
-        trades.append({
-            'entry_time': position['entry_time'],
-            'exit_time': df.index[-1],
-            'direction': position['direction'],
-            'entry_price': position['entry_price'],
-            'exit_price': exit_price,
-            'pnl_pct': pnl_pct * 100,
-            'pnl': pnl,
-            'exit_reason': '回测结束'
-        })
-    
-    # 打印报告
-    print("\n" + "=" * 70)
-    print("         ETH/USDT 隔夜时段专用回测报告")
-    print("         (仅在北京时间 0:00-8:00 开仓)")
-    print("=" * 70)
-    print(f"数据范围: {df.index[50]} ~ {df.index[-1]}")
-    print(f"回测天数: {days}天\n")
-    
-    if not trades:
-        print("无交易")
+    
+    # 一次性计算全部指标序列和每根K线的信号，避免逐根K线重算
+    indicator_arrays = indicators_calc.calculate_all_vectorized(df)
+    signal_type, stop_loss, take_profit, _ = strategy.analyze_batch(indicator_arrays)
+    
+    # 只在隔夜时段开仓，任何时间都可以平仓，结束时按最后收盘价强制平仓
+    ohlcv = to_numpy_dict(df)
+    result = simulate(ohlcv['low'], ohlcv['high'], ohlcv['close'],
+                      signal_type, stop_loss, take_profit, entry_mask=is_overnight_session(df.index),
+                      initial_capital=initial_capital, close_at_end=True)
+    capital = result.capital
+    trades = result.trades
+    
+    # 打印报告（整段拼好后一次写出，避免逐行print）
+    lines = []
+    lines.append("\n" + "=" * 70)
+    lines.append("         ETH/USDT 隔夜时段专用回测报告")
+    lines.append("         (仅在北京时间 0:00-8:00 开仓)")
+    lines.append("=" * 70)
+    lines.append(f"数据范围: {df.index[50]} ~ {df.index[-1]}")
+    lines.append(f"回测天数: {days}天\n")
+    
+    if not len(trades):
+        lines.append("无交易")
+        sys.stdout.write("\n".join(lines) + "\n")
         return
     
-    wins = [t for t in trades if t['pnl_pct'] > 0]
-    losses = [t for t in trades if t['pnl_pct'] <= 0]
+    # 统计直接在交易记录的各列上做向量运算
+    pnl_pct = trades['pnl_pct'] * 100
+    wins_mask = pnl_pct > 0
+    wins = pnl_pct[wins_mask]
+    losses = pnl_pct[~wins_mask]
+    loss_sum = losses.sum()
     
     total_return = (capital - initial_capital) / initial_capital * 100
-    win_rate = len(wins) / len(trades) * 100
-    avg_win = np.mean([t['pnl_pct'] for t in wins]) if wins else 0
-    avg_loss = np.mean([t['pnl_pct'] for t in losses]) if losses else 0
+    win_rate = wins_mask.mean() * 100
+    avg_win = wins.mean() if len(wins) else 0
+    avg_loss = losses.mean() if len(losses) else 0
     
     # 盈亏比
-    profit_factor = abs(sum(t['pnl_pct'] for t in wins) / sum(t['pnl_pct'] for t in losses)) if losses else float('inf')
+    profit_factor = abs(wins.sum() / loss_sum) if len(losses) and loss_sum != 0 else float('inf')
     
     # 最大回撤
-    equity = initial_capital
-    peak = initial_capital
-    max_dd = 0
-    for t in trades:
-        equity += t['pnl']
-        peak = max(peak, equity)
-        dd = (equity - peak) / peak
-        max_dd = min(max_dd, dd)
-    
-    print(f"📊 资金统计")
-    print(f"   初始资金:     ${initial_capital:,.2f}")
-    print(f"   最终资金:     ${capital:,.2f}")
-    print(f"   总收益:       {total_return:+.2f}%")
-    
-    print(f"\n📈 交易统计")
-    print(f"   总交易次数:   {len(trades)}")
-    print(f"   盈利次数:     {len(wins)}")
-    print(f"   亏损次数:     {len(losses)}")
-    print(f"   胜率:         {win_rate:.1f}%")
-    
-    print(f"\n💰 盈亏分析")
-    print(f"   盈亏比:       {profit_factor:.2f}")
-    print(f"   平均盈利:     {avg_win:+.2f}%")
-    print(f"   平均亏损:     {avg_loss:.2f}%")
-    print(f"   最大回撤:     {max_dd*100:.2f}%")
-    
-    print(f"\n📋 最近10笔交易")
-    print("-" * 70)
-    for t in trades[-10:]:
-        direction = "🟢做多" if t['direction'] == 'long' else "🔴做空"
-        pnl_emoji = "✅" if t['pnl_pct'] > 0 else "❌"
-        print(f"   {direction} | 入场: ${t['entry_price']:.2f} | "
-              f"出场: ${t['exit_price']:.2f} | "
-              f"{pnl_emoji} {t['pnl_pct']:+.2f}% | {t['exit_reason']}")
-    
-    print("\n" + "=" * 70)
+    max_dd = max_drawdown(initial_capital, trades['pnl'])
+    
+    lines.append(f"📊 资金统计")
+    lines.append(f"   初始资金:     ${initial_capital:,.2f}")
+    lines.append(f"   最终资金:     ${capital:,.2f}")
+    lines.append(f"   总收益:       {total_return:+.2f}%")
+    
+    lines.append(f"\n📈 交易统计")
+    lines.append(f"   总交易次数:   {len(trades)}")
+    lines.append(f"   盈利次数:     {len(wins)}")
+    lines.append(f"   亏损次数:     {len(losses)}")
+    lines.append(f"   胜率:         {win_rate:.1f}%")
+    
+    lines.append(f"\n💰 盈亏分析")
+    lines.append(f"   盈亏比:       {profit_factor:.2f}")
+    lines.append(f"   平均盈利:     {avg_win:+.2f}%")
+    lines.append(f"   平均亏损:     {avg_loss:.2f}%")
+    lines.append(f"   最大回撤:     {max_dd*100:.2f}%")
+    
+    lines.append(f"\n📋 最近10笔交易")
+    lines.append("-" * 70)
+    for rec, pct in zip(trades[-10:], pnl_pct[-10:]):
+        direction = "🟢做多" if rec['direction'] > 0 else "🔴做空"
+        pnl_emoji = "✅" if pct > 0 else "❌"
+        lines.append(f"   {direction} | 入场: ${rec['entry_price']:.2f} | "
+                     f"出场: ${rec['exit_price']:.2f} | "
+                     f"{pnl_emoji} {pct:+.2f}% | {EXIT_REASONS[rec['exit_reason']]}")
+    
+    lines.append("\n" + "=" * 70)
     
     # 评估
-    print("\n📝 隔夜策略评估:")
+    lines.append("\n📝 隔夜策略评估:")
     if win_rate >= 60:
-        print(f"   ✅ 胜率优秀 ({win_rate:.1f}%)")
+        lines.append(f"   ✅ 胜率优秀 ({win_rate:.1f}%)")
     elif win_rate >= 50:
-        print(f"   ⚠️ 胜率一般 ({win_rate:.1f}%)")
+        lines.append(f"   ⚠️ 胜率一般 ({win_rate:.1f}%)")
     else:
-        print(f"   ❌ 胜率偏低 ({win_rate:.1f}%)")
+        lines.append(f"   ❌ 胜率偏低 ({win_rate:.1f}%)")
     
     if profit_factor >= 1.5:
-        print(f"   ✅ 盈亏比优秀 ({profit_factor:.2f})")
+        lines.append(f"   ✅ 盈亏比优秀 ({profit_factor:.2f})")
     elif profit_factor >= 1:
-        print(f"   ⚠️ 盈亏比一般 ({profit_factor:.2f})")
+        lines.append(f"   ⚠️ 盈亏比一般 ({profit_factor:.2f})")
     else:
-        print(f"   ❌ 盈亏比不佳 ({profit_factor:.2f})")
+        lines.append(f"   ❌ 盈亏比不佳 ({profit_factor:.2f})")
     
     if total_return > 0:
-        print(f"   ✅ 策略盈利 ({total_return:+.2f}%)")
+        lines.append(f"   ✅ 策略盈利 ({total_return:+.2f}%)")
     else:
-        print(f"   ❌ 策略亏损 ({total_return:.2f}%)")
+        lines.append(f"   ❌ 策略亏损 ({total_return:.2f}%)")
+    sys.stdout.write("\n".join(lines) + "\n")
 
 
 if __name__ == '__main__':
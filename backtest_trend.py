@@ -3,27 +3,25 @@
 趋势跟踪策略回测
 """
 import asyncio
-import yaml
 import numpy as np
 from datetime import datetime
 from loguru import logger
 import sys
 
-from data_fetcher import DataFetcher
+from data_fetcher import close_shared_fetcher, fetch_ohlcv_cached, to_numpy_dict
 from indicators import TechnicalIndicators
-from strategy_trend import TrendStrategy, SignalType
+from strategy_trend import TrendStrategy
+from backtest_core import EXIT_REASONS, simulate, trade_hold_hours, max_drawdown, load_config
 
 
 async def backtest(days: int = 40):
-    with open('config.yaml', 'r', encoding='utf-8') as f:
-        config = yaml.safe_load(f)
+    config = load_config()
     
-    fetcher = DataFetcher(config)
-    await fetcher.init()
-    
-    limit = min(days * 24, 1000)
-    df = await fetcher.fetch_ohlcv('1h', limit=limit)
-    await fetcher.close()
+    limit = days * 24
+    try:
+        df = await fetch_ohlcv_cached(config, '1h', limit=limit)
+    finally:
+        await close_shared_fetcher()
     
     if df.empty or len(df) < 100:
         print("数据不足")
@@ -32,181 +30,93 @@ async def backtest(days: int = 40):
     indicators_calc = TechnicalIndicators(config)
     strategy = TrendStrategy(config)
     
-    trades = []
-    position = None
     initial_capital = 10000
-    capital = initial_capital
     leverage = 20
     position_size = 0.10
     
-    for i in range(50, len(df)):
-        current_bar = df.iloc[i]
-        current_time = df.index[i]
-        current_price = current_bar['close']
-        
-        historical = df.iloc[:i+1].copy()
-        ind = indicators_calc.calculate_all(historical)
-        
-        if not ind:
-            continue
-        
-        # 检查平仓
-        if position:
-            exit_reason = None
-            exit_price = None
-            
-            if position['direction'] == 'long':
-                if current_bar['low'] <= position['stop_loss']:
-                    exit_price = position['stop_loss']
-                    exit_reason = "止损"
-                elif current_bar['high'] >= position['take_profit']:
-                    exit_price = position['take_profit']
-                    exit_reason = "止盈"
-            else:
-                if current_bar['high'] >= position['stop_loss']:
-                    exit_price = position['stop_loss']
-                    exit_reason = "止损"
-                elif current_bar['low'] <= position['take_profit']:
-                    exit_price = position['take_profit']
-                    exit_reason = "止盈"
-            
-            if exit_reason:
-                if position['direction'] == 'long':
-                    pnl_pct = (exit_price - position['entry_price']) / position['entry_price']
-                else:
-                    pnl_pct = (position['entry_price'] - exit_price) / position['entry_price']
-                
-                pnl_pct_leveraged = pnl_pct * leverage * position_size
-                pnl = capital * pnl_pct_leveraged
-                
-                if pnl_pct * leverage <= -1:
-                    pnl = -capital * position_size
-                
-                capital += pnl
-                hold_hours = (current_time - position['entry_time']).total_seconds() / 3600
-                
-                trades.append({
-                    'entry_time': position['entry_time'],
-                    'exit_time': current_time,
-                    'direction': position['direction'],
-                    'entry_price': position['entry_price'],
-                    'exit_price': exit_price,
-                    'pnl_pct': pnl_pct_leveraged * 100,
-                    'pnl': pnl,
-                    'exit_reason': exit_reason,
-                    'hold_hours': hold_hours
-                })
-                position = None
-                
-                if capital <= 0:
-                    break
-        
-        # 开仓
-        if not position and capital > 0:
-            signal = strategy.analyze(ind, '1h')
-            if signal and signal.signal_type != SignalType.NEUTRAL:
-                direction = 'long' if signal.signal_type in [SignalType.BUY, SignalType.STRONG_BUY] else 'short'
-                position = {
-                    'entry_time': current_time,
-                    'entry_price': current_price,
-                    'direction': direction,
-                    'stop_loss': signal.stop_loss,
-                    'take_profit': signal.take_profit
-                }
-    
-    # 强制平仓
-    if position and capital > 0:
-        exit_price = df.iloc[-1]['close']
-        if position['direction'] == 'long':
-            pnl_pct = (exit_price - position['entry_price']) / position['entry_price']
-        else:
-            pnl_pct = (position['entry_price'] - exit_price) / position['entry_price']
-        
-        pnl_pct_leveraged = pnl_pct * leverage * position_size
-        pnl = capital * pnl_pct_leveraged
-        capital += pnl
-        hold_hours = (df.index[-1] - position['entry_time']).total_seconds() / 3600
-        trades.append({
-            'entry_time': position['entry_time'],
-            'exit_time': df.index[-1],
-            'direction': position['direction'],
-            'entry_price': position['entry_price'],
-            'exit_price': exit_price,
-            'pnl_pct': pnl_pct_leveraged * 100,
-            'pnl': pnl,
-            'exit_reason': '回测结束',
-            'hold_hours': hold_hours
-        })
-    
-    # 打印报告
-    print("\n" + "=" * 70)
-    print(f"         趋势跟踪策略回测报告（{leverage}倍杠杆，{int(position_size*100)}%仓位）")
-    print("=" * 70)
-    print(f"数据范围: {df.index[50]} ~ {df.index[-1]}")
-    print(f"回测天数: {days}天\n")
-    
-    if not trades:
-        print("无交易")
+    # 一次性计算全部指标序列和每根K线的信号，避免逐根K线重算
+    indicator_arrays = indicators_calc.calculate_all_vectorized(df)
+    signal_type, stop_loss, take_profit, _ = strategy.analyze_batch(indicator_arrays)
+    
+    # 编译后的模拟内核逐根K线开平仓，结束时按最后收盘价强制平仓
+    ohlcv = to_numpy_dict(df)
+    result = simulate(ohlcv['low'], ohlcv['high'], ohlcv['close'],
+                      signal_type, stop_loss, take_profit,
+                      initial_capital=initial_capital, leverage=leverage,
+                      position_size=position_size, close_at_end=True)
+    capital = result.capital
+    trades = result.trades
+    
+    # 打印报告（整段拼好后一次写出，避免逐行print）
+    lines = []
+    lines.append("\n" + "=" * 70)
+    lines.append(f"         趋势跟踪策略回测报告（{leverage}倍杠杆，{int(position_size*100)}%仓位）")
+    lines.append("=" * 70)
+    lines.append(f"数据范围: {df.index[50]} ~ {df.index[-1]}")
+    lines.append(f"回测天数: {days}天\n")
+    
+    if not len(trades):
+        lines.append("无交易")
+        sys.stdout.write("\n".join(lines) + "\n")
         return
     
-    wins = [t for t in trades if t['pnl_pct'] > 0]
-    losses = [t for t in trades if t['pnl_pct'] <= 0]
+    # 统计直接在交易记录的各列上做向量运算
+    pnl_pct = trades['pnl_pct'] * leverage * position_size * 100
+    wins_mask = pnl_pct > 0
+    wins = pnl_pct[wins_mask]
+    losses = pnl_pct[~wins_mask]
+    loss_sum = losses.sum()
     
     total_return = (capital - initial_capital) / initial_capital * 100
-    win_rate = len(wins) / len(trades) * 100
-    avg_win = np.mean([t['pnl_pct'] for t in wins]) if wins else 0
-    avg_loss = np.mean([t['pnl_pct'] for t in losses]) if losses else 0
+    win_rate = wins_mask.mean() * 100
+    avg_win = wins.mean() if len(wins) else 0
+    avg_loss = losses.mean() if len(losses) else 0
     
-    profit_factor = abs(sum(t['pnl_pct'] for t in wins) / sum(t['pnl_pct'] for t in losses)) if losses and sum(t['pnl_pct'] for t in losses) != 0 else float('inf')
-    avg_hold = np.mean([t['hold_hours'] for t in trades])
+    profit_factor = abs(wins.sum() / loss_sum) if len(losses) and loss_sum != 0 else float('inf')
+    hold_hours = trade_hold_hours(df.index, trades)
+    avg_hold = hold_hours.mean()
     actual_days = (df.index[-1] - df.index[50]).days or 1
     trades_per_day = len(trades) / actual_days
     
-    equity = initial_capital
-    peak = initial_capital
-    max_dd = 0
-    for t in trades:
-        equity += t['pnl']
-        peak = max(peak, equity)
-        dd = (equity - peak) / peak
-        max_dd = min(max_dd, dd)
+    max_dd = max_drawdown(initial_capital, trades['pnl'])
     
     if len(trades) > 1:
-        returns = [t['pnl_pct'] for t in trades]
-        sharpe = np.mean(returns) / np.std(returns) * np.sqrt(252 / avg_hold * 24) if np.std(returns) > 0 else 0
+        std = pnl_pct.std()
+        sharpe = pnl_pct.mean() / std * np.sqrt(252 / avg_hold * 24) if std > 0 else 0
     else:
         sharpe = 0
     
-    print(f"📊 资金统计")
-    print(f"   初始资金:     ${initial_capital:,.2f}")
-    print(f"   最终资金:     ${capital:,.2f}")
-    print(f"   总收益:       {total_return:+.2f}%")
-    print(f"   最大回撤:     {max_dd*100:.2f}%")
-    print(f"   夏普比率:     {sharpe:.2f}")
-    
-    print(f"\n📈 交易统计")
-    print(f"   总交易次数:   {len(trades)}")
-    print(f"   日均交易:     {trades_per_day:.1f}笔")
-    print(f"   平均持仓:     {avg_hold:.1f}小时")
-    print(f"   盈利次数:     {len(wins)}")
-    print(f"   亏损次数:     {len(losses)}")
-    print(f"   胜率:         {win_rate:.1f}%")
-    
-    print(f"\n💰 盈亏分析")
-    print(f"   盈亏比:       {profit_factor:.2f}")
-    print(f"   平均盈利:     {avg_win:+.2f}%")
-    print(f"   平均亏损:     {avg_loss:.2f}%")
-    
-    print(f"\n📋 最近10笔交易")
-    print("-" * 70)
-    for t in trades[-10:]:
-        direction = "🟢做多" if t['direction'] == 'long' else "🔴做空"
-        pnl_emoji = "✅" if t['pnl_pct'] > 0 else "❌"
-        print(f"   {direction} | 入场: ${t['entry_price']:.2f} | "
-              f"出场: ${t['exit_price']:.2f} | "
-              f"{pnl_emoji} {t['pnl_pct']:+.2f}% | {t['exit_reason']} | {t['hold_hours']:.1f}h")
-    
-    print("\n" + "=" * 70)
+    lines.append(f"📊 资金统计")
+    lines.append(f"   初始资金:     ${initial_capital:,.2f}")
+    lines.append(f"   最终资金:     ${capital:,.2f}")
+    lines.append(f"   总收益:       {total_return:+.2f}%")
+    lines.append(f"   最大回撤:     {max_dd*100:.2f}%")
+    lines.append(f"   夏普比率:     {sharpe:.2f}")
+    
+    lines.append(f"\n📈 交易统计")
+    lines.append(f"   总交易次数:   {len(trades)}")
+    lines.append(f"   日均交易:     {trades_per_day:.1f}笔")
+    lines.append(f"   平均持仓:     {avg_hold:.1f}小时")
+    lines.append(f"   盈利次数:     {len(wins)}")
+    lines.append(f"   亏损次数:     {len(losses)}")
+    lines.append(f"   胜率:         {win_rate:.1f}%")
+    
+    lines.append(f"\n💰 盈亏分析")
+    lines.append(f"   盈亏比:       {profit_factor:.2f}")
+    lines.append(f"   平均盈利:     {avg_win:+.2f}%")
+    lines.append(f"   平均亏损:     {avg_loss:.2f}%")
+    
+    lines.append(f"\n📋 最近10笔交易")
+    lines.append("-" * 70)
+    for rec, pct, hours in zip(trades[-10:], pnl_pct[-10:], hold_hours[-10:]):
+        direction = "🟢做多" if rec['direction'] > 0 else "🔴做空"
+        pnl_emoji = "✅" if pct > 0 else "❌"
+        lines.append(f"   {direction} | 入场: ${rec['entry_price']:.2f} | "
+                     f"出场: ${rec['exit_price']:.2f} | "
+                     f"{pnl_emoji} {pct:+.2f}% | {EXIT_REASONS[rec['exit_reason']]} | {hours:.1f}h")
+    
+    lines.append("\n" + "=" * 70)
+    sys.stdout.write("\n".join(lines) + "\n")
 
 
 if __name__ == '__main__':
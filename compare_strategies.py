@@ -3,102 +3,46 @@
 策略对比 - 简化版
 """
 import asyncio
-import yaml
-import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from loguru import logger
 import sys
 
-from data_fetcher import DataFetcher
+from data_fetcher import close_shared_fetcher, fetch_ohlcv_cached, to_numpy_dict
 from indicators import TechnicalIndicators
+from backtest_core import simulate, max_drawdown, load_config
 
 
-def run_backtest(strategy_class, config, df, indicators_calc, leverage=20, position_size=0.10):
-    """运行单个策略回测"""
+def run_backtest(strategy_class, config, df, indicator_arrays, leverage=20, position_size=0.10):
+    """运行单个策略回测，indicator_arrays 为 calculate_all_vectorized 的结果，各策略共用"""
     strategy = strategy_class(config)
     
-    trades = []
-    position = None
     initial_capital = 10000
-    capital = initial_capital
-    
-    for i in range(50, len(df)):
-        current_bar = df.iloc[i]
-        current_time = df.index[i]
-        current_price = current_bar['close']
-        
-        historical = df.iloc[:i+1].copy()
-        ind = indicators_calc.calculate_all(historical)
-        
-        if not ind:
-            continue
-        
-        # 检查平仓
-        if position:
-            exit_reason = None
-            exit_price = None
-            
-            if position['direction'] == 'long':
-                if current_bar['low'] <= position['stop_loss']:
-                    exit_price = position['stop_loss']
-                    exit_reason = "止损"
-                elif current_bar['high'] >= position['take_profit']:
-                    exit_price = position['take_profit']
-                    exit_reason = "止盈"
-            else:
-                if current_bar['high'] >= position['stop_loss']:
-                    exit_price = position['stop_loss']
-                    exit_reason = "止损"
-                elif current_bar['low'] <= position['take_profit']:
-                    exit_price = position['take_profit']
-                    exit_reason = "止盈"
-            
-            if exit_reason:
-                if position['direction'] == 'long':
-                    pnl_pct = (exit_price - position['entry_price']) / position['entry_price']
-                else:
-                    pnl_pct = (position['entry_price'] - exit_price) / position['entry_price']
-                
-                pnl_pct_leveraged = pnl_pct * leverage * position_size
-                pnl = capital * pnl_pct_leveraged
-                capital += pnl
-                
-                trades.append({'pnl_pct': pnl_pct_leveraged * 100, 'pnl': pnl})
-                position = None
-                
-                if capital <= 0:
-                    break
-        
-        # 开仓
-        if not position and capital > 0:
-            signal = strategy.analyze(ind, '1h')
-            if signal and signal.signal_type.value in ['买入', '强烈买入', '卖出', '强烈卖出']:
-                direction = 'long' if signal.signal_type.value in ['买入', '强烈买入'] else 'short'
-                position = {
-                    'entry_time': current_time,
-                    'entry_price': current_price,
-                    'direction': direction,
-                    'stop_loss': signal.stop_loss,
-                    'take_profit': signal.take_profit
-                }
-    
-    if not trades:
+    
+    # 一次性生成每根K线的信号，避免逐根K线重算
+    signal_type, stop_loss, take_profit, _ = strategy.analyze_batch(indicator_arrays)
+    
+    # 编译后的模拟内核逐根K线开平仓
+    ohlcv = to_numpy_dict(df)
+    result = simulate(ohlcv['low'], ohlcv['high'], ohlcv['close'],
+                      signal_type, stop_loss, take_profit,
+                      initial_capital=initial_capital, leverage=leverage, position_size=position_size)
+    capital = result.capital
+    trades = result.trades
+    
+    if not len(trades):
         return None
     
-    wins = [t for t in trades if t['pnl_pct'] > 0]
-    losses = [t for t in trades if t['pnl_pct'] <= 0]
+    pnl_pct = trades['pnl_pct'] * leverage * position_size * 100
+    wins_mask = pnl_pct > 0
+    wins = pnl_pct[wins_mask]
+    losses = pnl_pct[~wins_mask]
+    loss_sum = losses.sum()
     
     total_return = (capital - initial_capital) / initial_capital * 100
-    win_rate = len(wins) / len(trades) * 100
-    profit_factor = abs(sum(t['pnl_pct'] for t in wins) / sum(t['pnl_pct'] for t in losses)) if losses and sum(t['pnl_pct'] for t in losses) != 0 else 999
-    
-    equity = initial_capital
-    peak = initial_capital
-    max_dd = 0
-    for t in trades:
-        equity += t['pnl']
-        peak = max(peak, equity)
-        dd = (equity - peak) / peak
-        max_dd = min(max_dd, dd)
+    win_rate = wins_mask.mean() * 100
+    profit_factor = abs(wins.sum() / loss_sum) if len(losses) and loss_sum != 0 else 999
+    
+    max_dd = max_drawdown(initial_capital, trades['pnl'])
     
     return {
         'total_return': total_return,
@@ -110,21 +54,20 @@ def run_backtest(strategy_class, config, df, indicators_calc, leverage=20, posit
 
 
 async def main(days: int = 40):
-    with open('config.yaml', 'r', encoding='utf-8') as f:
-        config = yaml.safe_load(f)
-    
-    fetcher = DataFetcher(config)
-    await fetcher.init()
+    config = load_config()
     
-    limit = min(days * 24, 1000)
-    df = await fetcher.fetch_ohlcv('1h', limit=limit)
-    await fetcher.close()
+    limit = days * 24
+    try:
+        df = await fetch_ohlcv_cached(config, '1h', limit=limit)
+    finally:
+        await close_shared_fetcher()
     
     if df.empty or len(df) < 100:
         print("数据不足")
         return
     
-    indicators_calc = TechnicalIndicators(config)
+    # 指标序列只计算一次，供所有策略共用
+    indicator_arrays = TechnicalIndicators(config).calculate_all_vectorized(df)
     
     # 导入策略
     from strategy_overnight import OvernightStrategy
@@ -146,9 +89,16 @@ async def main(days: int = 40):
     print(f"\n{'策略':<12} {'收益':>10} {'胜率':>8} {'盈亏比':>8} {'回撤':>10} {'交易数':>8}")
     print("-" * 75)
     
+    # 各策略只读共用的指标数组，模拟内核释放GIL，用线程并行避免向子进程复制数据
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=len(strategies)) as pool:
+        outputs = await asyncio.gather(*[
+            loop.run_in_executor(pool, run_backtest, strategy_class, config, df, indicator_arrays)
+            for strategy_class, _ in strategies
+        ])
+    
     results = []
-    for strategy_class, name in strategies:
-        result = run_backtest(strategy_class, config, df, indicators_calc)
+    for (_, name), result in zip(strategies, outputs):
         if result:
             result['name'] = name
             results.append(result)
@@ -2,13 +2,26 @@
 数据获取模块 - 支持多交易所，国内服务器优化
 """
 import asyncio
+import atexit
+import os
 import ccxt.async_support as ccxt
+import numpy as np
 import pandas as pd
 from datetime import datetime
 from loguru import logger
 from typing import Dict, List, Optional
 
 
+# 回测K线磁盘缓存目录
+CACHE_DIR = '.cache'
+
+# K线数值列
+OHLCV_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+# 交易所单次请求的K线数量上限
+OHLCV_PAGE_LIMIT = 1000
+
+
 class DataFetcher:
     # 国内可用的交易所优先级（从高到低）
     FALLBACK_EXCHANGES = ['gateio', 'huobi', 'okx']
@@ -21,12 +34,24 @@ class DataFetcher:
         self.data_cache: Dict[str, pd.DataFrame] = {}
         self.retry_count = 3
         self.retry_delay = 2
+        self.exchange_name = None
+        # 连通性是否已确认，未确认时由第一次K线请求验证
+        self.verified = False
+        self._verify_lock = asyncio.Lock()
+        
+    async def init(self, verify: bool = True):
+        """初始化交易所连接，支持自动切换备用交易所
         
-    async def init(self):
-        """初始化交易所连接，支持自动切换备用交易所"""
+        verify=False 时只创建交易所实例，不额外请求行情探测连通性，
+        由第一次 fetch_ohlcv 验证，失败时再切换备用交易所（只取K线的场景可省一次请求）
+        """
         exchange_config = self.config['exchange']
         exchange_name = exchange_config.get('name', 'gateio')
         
+        if not verify:
+            self._create_exchange(exchange_name, exchange_config)
+            return
+        
         # 尝试连接主交易所
         if await self._try_connect(exchange_name, exchange_config):
             return
@@ -40,17 +65,22 @@ class DataFetcher:
                     
         raise Exception("所有交易所连接失败，请检查网络或配置代理")
         
+    def _create_exchange(self, exchange_name: str, exchange_config: dict):
+        """创建交易所实例（不发起请求）"""
+        exchange_class = getattr(ccxt, exchange_name)
+        self.exchange = exchange_class({
+            'apiKey': exchange_config.get('api_key', ''),
+            'secret': exchange_config.get('api_secret', ''),
+            'enableRateLimit': True,
+            'timeout': 30000,  # 30秒超时
+            'options': {'defaultType': 'spot'}
+        })
+        self.exchange_name = exchange_name
+        
     async def _try_connect(self, exchange_name: str, exchange_config: dict) -> bool:
         """尝试连接指定交易所"""
         try:
-            exchange_class = getattr(ccxt, exchange_name)
-            self.exchange = exchange_class({
-                'apiKey': exchange_config.get('api_key', ''),
-                'secret': exchange_config.get('api_secret', ''),
-                'enableRateLimit': True,
-                'timeout': 30000,  # 30秒超时
-                'options': {'defaultType': 'spot'}
-            })
+            self._create_exchange(exchange_name, exchange_config)
             
             # 测试连接
             await asyncio.wait_for(
@@ -58,6 +88,7 @@ class DataFetcher:
                 timeout=15
             )
             logger.info(f"交易所连接成功: {exchange_name}")
+            self.verified = True
             return True
         except asyncio.TimeoutError:
             logger.warning(f"{exchange_name} 连接超时")
@@ -103,17 +134,45 @@ class DataFetcher:
                     await asyncio.sleep(self.retry_delay)
         return {}
             
-    async def fetch_ohlcv(self, timeframe: str, limit: int = 200) -> pd.DataFrame:
-        """获取K线数据（带重试）"""
+    async def fetch_ohlcv(self, timeframe: str, limit: int = 200, since: Optional[int] = None) -> pd.DataFrame:
+        """获取K线数据（带重试），since为起始时间戳(毫秒)，默认取最近limit根"""
+        if not self.verified:
+            # 并发请求时只由第一个请求验证连通性，其余等待验证完成
+            async with self._verify_lock:
+                if not self.verified:
+                    return await self._fetch_ohlcv_with_fallback(timeframe, limit, since)
+        return await self._fetch_ohlcv(timeframe, limit, since)
+        
+    async def _fetch_ohlcv_with_fallback(self, timeframe: str, limit: int, since: Optional[int]) -> pd.DataFrame:
+        """用第一次K线请求验证交易所连通性，失败时依次切换备用交易所"""
+        df = await self._fetch_ohlcv(timeframe, limit, since)
+        for fallback in self.FALLBACK_EXCHANGES:
+            if not df.empty:
+                break
+            if fallback == self.exchange_name:
+                continue
+            logger.warning(f"{self.exchange_name} 获取K线失败，尝试备用交易所 {fallback}...")
+            await self.exchange.close()
+            self._create_exchange(fallback, self.config['exchange'])
+            df = await self._fetch_ohlcv(timeframe, limit, since)
+            
+        if df.empty:
+            raise Exception("所有交易所连接失败，请检查网络或配置代理")
+        logger.info(f"交易所连接成功: {self.exchange_name}")
+        self.verified = True
+        return df
+        
+    async def _fetch_ohlcv(self, timeframe: str, limit: int, since: Optional[int]) -> pd.DataFrame:
+        """请求K线数据，超时或出错时按retry_count重试，全部失败返回空DataFrame"""
         for attempt in range(self.retry_count):
             try:
                 ohlcv = await asyncio.wait_for(
-                    self.exchange.fetch_ohlcv(self.symbol, timeframe, limit=limit),
+                    self.exchange.fetch_ohlcv(self.symbol, timeframe, since=since, limit=limit),
                     timeout=15
                 )
                 df = pd.DataFrame(
                     ohlcv, 
-                    columns=['timestamp', 'open', 'high', 'low', 'close', 'volume']
+                    columns=['timestamp', *OHLCV_COLUMNS]
                 )
                 df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
                 df.set_index('timestamp', inplace=True)
@@ -128,6 +187,29 @@ class DataFetcher:
                     await asyncio.sleep(self.retry_delay)
         return pd.DataFrame()
             
+    async def fetch_ohlcv_history(self, timeframe: str, total_limit: int) -> pd.DataFrame:
+        """获取最近total_limit根K线，超过单次请求上限时按时间窗口分页并发请求后拼接"""
+        if total_limit <= OHLCV_PAGE_LIMIT:
+            return await self.fetch_ohlcv(timeframe, limit=total_limit)
+            
+        bar_ms = int(pd.Timedelta(timeframe).total_seconds() * 1000)
+        now_ms = int(pd.Timestamp.now(tz='UTC').timestamp() * 1000) // bar_ms * bar_ms
+        start_ms = now_ms - (total_limit - 1) * bar_ms
+        window_ms = OHLCV_PAGE_LIMIT * bar_ms
+        pages = await asyncio.gather(*[
+            self.fetch_ohlcv(timeframe, limit=OHLCV_PAGE_LIMIT, since=since)
+            for since in range(start_ms, now_ms + 1, window_ms)
+        ])
+        
+        if any(page.empty for page in pages):
+            # 某一页重试后仍失败，拼接结果中间会缺一段，整体视为失败，避免缺口被当作连续K线使用或写入缓存
+            logger.error(f"分页获取K线失败 [{timeframe}]: {sum(page.empty for page in pages)}/{len(pages)} 页无数据")
+            return pd.DataFrame()
+        df = pd.concat(pages)
+        df = df[~df.index.duplicated(keep='last')].sort_index().tail(total_limit)
+        self.data_cache[timeframe] = df
+        return df
+            
     async def fetch_all_timeframes(self) -> Dict[str, pd.DataFrame]:
         """获取所有时间周期的数据"""
         tasks = [self.fetch_ohlcv(tf) for tf in self.timeframes]
@@ -157,3 +239,154 @@ class DataFetcher:
     def get_cached_data(self, timeframe: str) -> Optional[pd.DataFrame]:
         """获取缓存的数据"""
         return self.data_cache.get(timeframe)
+
+
+# 进程内共用的DataFetcher及其所属事件循环，避免每次取数都重新连接交易所
+_shared_fetcher: Optional[DataFetcher] = None
+_shared_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+async def get_fetcher(config: dict) -> DataFetcher:
+    """获取进程内共用的DataFetcher，首次调用时按传入配置连接交易所，之后直接复用"""
+    global _shared_fetcher, _shared_loop
+    loop = asyncio.get_running_loop()
+    # 连接绑定在创建它的事件循环上，换了循环（如再次 asyncio.run）需要重新连接，先关掉旧连接
+    if _shared_fetcher is not None and _shared_loop is not loop:
+        if _shared_loop.is_closed():
+            logger.warning("上一个事件循环已结束，其交易所连接的socket无法正常释放，"
+                           "调用方应在退出事件循环前 await close_shared_fetcher()")
+        try:
+            await _shared_fetcher.close()
+        except Exception as e:
+            logger.warning(f"关闭上一个事件循环的交易所连接失败: {e}")
+        _shared_fetcher = _shared_loop = None
+    if _shared_fetcher is None:
+        fetcher = DataFetcher(config)
+        # 共用连接只用于取K线，连通性由第一次K线请求验证
+        await fetcher.init(verify=False)
+        _shared_fetcher, _shared_loop = fetcher, loop
+    return _shared_fetcher
+
+
+async def close_shared_fetcher():
+    """关闭共用的交易所连接，需在创建它的事件循环结束前调用（各脚本取完数据后调用）"""
+    global _shared_fetcher, _shared_loop
+    if _shared_fetcher is None:
+        return
+    fetcher = _shared_fetcher
+    _shared_fetcher = _shared_loop = None
+    await fetcher.close()
+
+
+@atexit.register
+def _close_shared_fetcher():
+    """进程退出时兜底：所属事件循环仍可用时在其上关闭共用连接，否则记录未能关闭的连接"""
+    global _shared_fetcher, _shared_loop
+    if _shared_fetcher is None:
+        return
+    fetcher, loop = _shared_fetcher, _shared_loop
+    _shared_fetcher = _shared_loop = None
+    if loop is not None and not loop.is_closed() and not loop.is_running():
+        try:
+            loop.run_until_complete(fetcher.close())
+            return
+        except Exception as e:
+            logger.warning(f"退出时关闭交易所连接失败: {e}")
+    logger.warning(f"退出时仍有未关闭的交易所连接（{fetcher.exchange_name}），"
+                   f"所属事件循环已结束，请在脚本中 await close_shared_fetcher()")
+
+
+def to_numpy_dict(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """把K线DataFrame拆成按列的float64数组，回测热路径直接按下标取值，不经过pandas"""
+    return {col: df[col].to_numpy(dtype=np.float64) for col in OHLCV_COLUMNS}
+
+
+def _cache_path(config: dict, timeframe: str, exchange: Optional[str] = None) -> str:
+    """K线缓存文件路径，按交易所、交易对和周期区分，exchange默认取配置的交易所"""
+    exchange = exchange or config['exchange'].get('name', 'gateio')
+    symbol = config['trading']['symbol'].replace('/', '_')
+    return os.path.join(CACHE_DIR, f"{exchange}_{symbol}_{timeframe}.pkl")
+
+
+def _is_contiguous(df: pd.DataFrame, timeframe: str) -> bool:
+    """K线时间索引是否逐根相隔一个周期、中间没有缺口"""
+    return bool((df.index[1:] - df.index[:-1] == pd.Timedelta(timeframe)).all())
+
+
+def _save_cache(cache_path: str, cached: pd.DataFrame, df: pd.DataFrame, timeframe: str) -> pd.DataFrame:
+    """与已有缓存合并去重后写回，返回合并后的数据，合并结果有缺口时不写入缓存"""
+    if not cached.empty and df.index[0] > cached.index[-1] + pd.Timedelta(timeframe):
+        # 新数据与旧缓存接不上，丢弃旧缓存，避免缓存文件中间出现断档
+        cached = pd.DataFrame()
+    merged = pd.concat([cached, df]) if not cached.empty else df
+    merged = merged[~merged.index.duplicated(keep='last')].sort_index()
+    if not _is_contiguous(merged, timeframe):
+        logger.warning(f"K线存在缺口，不写入缓存: {cache_path}")
+        return merged
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    merged.to_pickle(cache_path)
+    return merged
+
+
+async def fetch_ohlcv_cached_multi(config: dict, timeframes: List[str], limit: int = 200) -> Dict[str, pd.DataFrame]:
+    """获取多个时间周期的K线数据，优先读取磁盘缓存
+    缓存最新一根K线在写入时可能尚未收盘，因此每次都从它开始补拉增量（缓存历史不足时拉取完整历史）
+    各周期通过进程内共用的交易所连接并发请求，总耗时取决于最慢的一个请求
+    """
+    now = pd.Timestamp.now(tz='UTC').tz_localize(None)
+    data = {}
+    caches = {}
+    requests = []
+    for tf in timeframes:
+        cache_path = _cache_path(config, tf)
+        cached = pd.read_pickle(cache_path) if os.path.exists(cache_path) else pd.DataFrame()
+        caches[tf] = (cache_path, cached)
+        missing_bars = (now - cached.index[-1]) / pd.Timedelta(tf) if not cached.empty else limit
+        if len(cached) >= limit and missing_bars < min(limit, OHLCV_PAGE_LIMIT):
+            # 最后一根缓存K线可能未收盘，从它开始重新拉取
+            since = int(cached.index[-1].timestamp() * 1000)
+            requests.append((tf, since))
+        else:
+            requests.append((tf, None))
+            
+    fetcher = await get_fetcher(config)
+    results = await asyncio.gather(*[
+        _fetch_tail_delta(fetcher, tf, since, min(limit, OHLCV_PAGE_LIMIT)) if since is not None
+        else fetcher.fetch_ohlcv_history(tf, limit)
+        for tf, since in requests
+    ])
+    
+    for (tf, since), (cache_path, cached), df in zip(requests, caches.values(), results):
+        served_path = _cache_path(config, tf, fetcher.exchange_name)
+        if not df.empty and served_path != cache_path:
+            # 数据来自备用交易所，不能并入配置交易所的缓存，改写到该交易所自己的缓存文件
+            logger.warning(f"K线由备用交易所 {fetcher.exchange_name} 提供，写入其缓存: {served_path}")
+            if since is not None:
+                # 增量的起点取自配置交易所的缓存，需从备用交易所重新拉取完整历史
+                df = await fetcher.fetch_ohlcv_history(tf, limit)
+            if not df.empty:
+                cache_path = served_path
+                cached = pd.read_pickle(cache_path) if os.path.exists(cache_path) else pd.DataFrame()
+        if not df.empty:
+            df = _save_cache(cache_path, cached, df, tf).tail(limit)
+        elif since is not None:
+            # 增量没取到（网络波动等），缓存只差最近几根K线，先用缓存
+            logger.warning(f"增量K线获取失败 [{tf}]，使用未更新的缓存: {cache_path}")
+            df = cached.tail(limit)
+        data[tf] = df
+    return data
+
+
+async def _fetch_tail_delta(fetcher: DataFetcher, timeframe: str, since: int, limit: int) -> pd.DataFrame:
+    """拉取缓存末尾之后的增量K线，失败时返回空DataFrame（由调用方退回缓存），不抛出异常"""
+    try:
+        return await fetcher.fetch_ohlcv(timeframe, limit=limit, since=since)
+    except Exception as e:
+        logger.warning(f"增量K线请求异常 [{timeframe}]: {e}")
+        return pd.DataFrame()
+
+
+async def fetch_ohlcv_cached(config: dict, timeframe: str, limit: int = 200) -> pd.DataFrame:
+    """获取单个时间周期的K线数据，优先读取磁盘缓存，只向交易所补拉缓存末尾之后的增量"""
+    data = await fetch_ohlcv_cached_multi(config, [timeframe], limit=limit)
+    return data[timeframe]
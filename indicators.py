@@ -3,220 +3,581 @@
 """
 import pandas as pd
 import numpy as np
-import ta
+from numpy.lib.stride_tricks import sliding_window_view
 from typing import Dict, Any
 from loguru import logger
 
+from jit_utils import njit, NUMBA_AVAILABLE
+
+if NUMBA_AVAILABLE:
+    from numba import types
+
+
+@njit(cache=True)
+def _wilder_average(values: np.ndarray, start: int, seed: float, window: int) -> np.ndarray:
+    """Wilder平滑均值：out[i] = (out[i-1] * (window-1) + values[i]) / window"""
+    out = np.zeros(len(values))
+    out[start] = seed
+    for i in range(start + 1, len(values)):
+        out[i] = (out[i - 1] * (window - 1) + values[i]) / float(window)
+    return out
+
+
+@njit(cache=True)
+def _wilder_sum(values: np.ndarray, seed: float, window: int) -> np.ndarray:
+    """Wilder平滑累加：out[i] = out[i-1] - out[i-1] / window + values[window+i]
+    与ta库一致，最后一个元素保持为0
+    """
+    out = np.zeros(len(values) - (window - 1))
+    out[0] = seed
+    for i in range(1, len(out) - 1):
+        out[i] = out[i - 1] - (out[i - 1] / float(window)) + values[window + i]
+    return out
+
+
+def _average_true_range(high: np.ndarray, low: np.ndarray, close: np.ndarray, window: int) -> np.ndarray:
+    """ATR，数值与 ta.volatility.AverageTrueRange 一致"""
+    prev_close = np.r_[np.nan, close[:-1]]
+    true_range = np.fmax(np.fmax(high - low, np.abs(high - prev_close)), np.abs(low - prev_close))
+    return _wilder_average(true_range, window - 1, true_range[:window].mean(), window)
+
+
+def _adx(high: np.ndarray, low: np.ndarray, close: np.ndarray, window: int) -> tuple:
+    """ADX / +DI / -DI，数值与 ta.trend.ADXIndicator 一致"""
+    n = len(close)
+    prev_close = np.r_[np.nan, close[:-1]]
+    diff_dm = np.maximum(high, prev_close) - np.minimum(low, prev_close)
+    
+    diff_up = high - np.r_[np.nan, high[:-1]]
+    diff_down = np.r_[np.nan, low[:-1]] - low
+    pos = np.abs(((diff_up > diff_down) & (diff_up > 0)) * diff_up)
+    neg = np.abs(((diff_down > diff_up) & (diff_down > 0)) * diff_down)
+    
+    # 首根K线差分为NaN，初值取其后window根之和
+    trs = _wilder_sum(diff_dm, diff_dm[1:window + 1].sum(), window)
+    dip = _wilder_sum(pos, pos[1:window + 1].sum(), window)
+    din = _wilder_sum(neg, neg[1:window + 1].sum(), window)
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        di_plus = np.where(trs != 0, 100 * (dip / trs), 0)
+        di_minus = np.where(trs != 0, 100 * (din / trs), 0)
+        di_sum = di_plus + di_minus
+        directional_index = np.where(di_sum != 0, 100 * np.abs((di_plus - di_minus) / di_sum), 0)
+        
+    # ADX用前一根的DX平滑
+    adx = _wilder_average(np.r_[0.0, directional_index[:-1]], window,
+                          directional_index[0:window].mean(), window)
+    adx = np.r_[np.zeros(window - 1), adx]
+    
+    # +DI/-DI只输出 [window+1, n) 区间，首尾与ta库一样为0
+    adx_pos = np.zeros(n)
+    adx_neg = np.zeros(n)
+    adx_pos[window + 1:n] = di_plus[1:-1]
+    adx_neg[window + 1:n] = di_minus[1:-1]
+    return adx, adx_pos, adx_neg
+
+
+def _cci(high: pd.Series, low: pd.Series, close: pd.Series, window: int = 20,
+         constant: float = 0.015) -> np.ndarray:
+    """CCI，数值与 ta.trend.CCIIndicator 一致，平均绝对偏差用滑动窗口视图批量计算"""
+    typical_price = (high + low + close) / 3.0
+    tp = typical_price.to_numpy(dtype=np.float64)
+    mad = np.full(len(tp), np.nan)
+    if len(tp) >= window:
+        windows = sliding_window_view(tp, window)
+        mad[window - 1:] = np.mean(np.abs(windows - np.mean(windows, axis=1, keepdims=True)), axis=1)
+    rolling_mean = typical_price.rolling(window, min_periods=window).mean().to_numpy()
+    return (tp - rolling_mean) / (constant * mad)
+
+
+# _latest_indicators 输出数组中各指标的位置（均线单独输出）
+_LATEST_KEYS = (
+    'macd', 'macd_signal', 'macd_hist', 'macd_hist_prev',
+    'adx', 'di_plus', 'di_minus',
+    'rsi', 'rsi_prev', 'stoch_k', 'stoch_d', 'cci', 'williams_r',
+    'bb_upper', 'bb_middle', 'bb_lower', 'bb_width', 'bb_pband',
+    'atr', 'kc_upper', 'kc_middle', 'kc_lower',
+    'obv', 'obv_change', 'volume', 'volume_ma', 'volume_ratio', 'vwap',
+    'pivot', 'r1', 'r2', 'r3', 's1', 's2', 's3',
+    'fib_0', 'fib_236', 'fib_382', 'fib_500', 'fib_618', 'fib_786', 'fib_100'
+)
+
+
+@njit(cache=True, nogil=True)
+def _ewm_step(weighted: float, value: float, alpha: float) -> float:
+    """pandas ewm(adjust=False) 的单步递推"""
+    old_weight = 1.0 - alpha
+    return (old_weight * weighted + alpha * value) / (old_weight + alpha)
+
+
+@njit(cache=True)
+def _ewm_mean(values: np.ndarray, alpha: float, min_periods: int) -> np.ndarray:
+    """pandas ewm(alpha, min_periods, adjust=False).mean() 的逐元素递推
+    只支持序列开头的NaN（从第一个有效值起递推），不足min_periods个观测值时输出NaN
+    """
+    out = np.full(len(values), np.nan)
+    weighted = np.nan
+    nobs = 0
+    for i in range(len(values)):
+        value = values[i]
+        if not np.isnan(value):
+            nobs += 1
+            weighted = value if nobs == 1 else _ewm_step(weighted, value, alpha)
+        if nobs >= max(min_periods, 1):
+            out[i] = weighted
+    return out
+
+
+def _macd(close: np.ndarray, fast: int, slow: int, signal: int) -> tuple:
+    """MACD / 信号线 / 柱，数值与 ta.trend.MACD 一致"""
+    ema_fast = _ewm_mean(close, 2.0 / (fast + 1), fast)
+    ema_slow = _ewm_mean(close, 2.0 / (slow + 1), slow)
+    macd = ema_fast - ema_slow
+    macd_signal = _ewm_mean(macd, 2.0 / (signal + 1), signal)
+    return macd, macd_signal, macd - macd_signal
+
+
+@njit(cache=True, nogil=True, error_model='numpy')
+def _rsi(close: np.ndarray, window: int) -> np.ndarray:
+    """RSI，数值与 ta.momentum.RSIIndicator 一致
+    涨跌幅的Wilder平滑在一次递推中完成，不生成中间数组
+    """
+    n = len(close)
+    out = np.full(n, np.nan)
+    alpha = 1.0 / window
+    # 首根K线没有涨跌，按0参与平滑
+    ema_up = 0.0
+    ema_down = 0.0
+    for i in range(n):
+        if i > 0:
+            diff = close[i] - close[i - 1]
+            ema_up = _ewm_step(ema_up, diff if diff > 0 else 0.0, alpha)
+            ema_down = _ewm_step(ema_down, -diff if diff < 0 else 0.0, alpha)
+        if i >= window - 1:
+            out[i] = 100.0 if ema_down == 0 else 100 - (100 / (1 + ema_up / ema_down))
+    return out
+
+
+# 实盘每个周期都会调用，显式给出签名在导入时即编译（或读取磁盘缓存），避免首轮分析卡在JIT编译上
+# K线数组按只读声明：pandas写时复制下 to_numpy 得到的是只读视图，可写数组同样能匹配
+if NUMBA_AVAILABLE:
+    _F8 = types.Array(types.float64, 1, 'A', readonly=True)
+    _I8 = types.Array(types.int64, 1, 'A')
+    _LATEST_INDICATORS_SIGNATURE = types.UniTuple(types.float64[:], 3)(
+        _F8, _F8, _F8, _F8, _I8, _I8,
+        types.int64, types.int64, types.int64, types.int64,
+        types.int64, types.int64, types.int64, types.int64,
+        types.float64, types.int64
+    )
+else:
+    _LATEST_INDICATORS_SIGNATURE = None
+
+
+@njit(_LATEST_INDICATORS_SIGNATURE, cache=True, nogil=True, error_model='numpy')
+def _latest_indicators(high, low, close, volume, ma_periods, ema_periods,
+                       macd_fast, macd_slow, macd_signal, adx_period, rsi_period,
+                       stoch_window, stoch_smooth, bb_period, bb_std, atr_period):
+    """一次遍历K线，只计算最后一根（及前一根）的指标值，数值与ta库一致
+    nogil编译，各时间周期可在线程池中并行计算
+    返回 (各周期MA, 各周期EMA, 按 _LATEST_KEYS 排列的其余指标)
+    """
+    n = len(close)
+    nan = np.nan
+    out = np.full(len(_LATEST_KEYS), nan)
+    
+    # EMA / MACD / RSI / ATR / ADX / OBV 都是递推量，逐根K线更新
+    ema = np.full(len(ema_periods), close[0])
+    ema_fast = close[0]
+    ema_slow = close[0]
+    macd_start = max(macd_fast, macd_slow) - 1
+    macd_sig = nan
+    macd_val = nan
+    hist = nan
+    hist_prev = nan
+    
+    rsi_alpha = 1.0 / rsi_period
+    ema_up = 0.0
+    ema_down = 0.0
+    rsi = nan
+    rsi_prev = nan
+    
+    atr = 0.0
+    tr_sum = 0.0
+    
+    w = adx_period
+    trs = 0.0
+    dip = 0.0
+    din = 0.0
+    di_plus = 0.0
+    di_minus = 0.0
+    dx_sum = 0.0
+    adx = 0.0
+    
+    obv = 0.0
+    obv_prev = 0.0
+    
+    for i in range(n):
+        c = close[i]
+        
+        # EMA
+        if i > 0:
+            for j in range(len(ema_periods)):
+                ema[j] = _ewm_step(ema[j], c, 2.0 / (ema_periods[j] + 1))
+            ema_fast = _ewm_step(ema_fast, c, 2.0 / (macd_fast + 1))
+            ema_slow = _ewm_step(ema_slow, c, 2.0 / (macd_slow + 1))
+            
+        # MACD：信号线从第一个有效MACD值开始递推
+        if i >= macd_start:
+            macd_val = ema_fast - ema_slow
+            if i == macd_start:
+                macd_sig = macd_val
+            else:
+                macd_sig = _ewm_step(macd_sig, macd_val, 2.0 / (macd_signal + 1))
+            hist_prev = hist
+            hist = macd_val - macd_sig if i >= macd_start + macd_signal - 1 else nan
+            
+        if i == 0:
+            obv = volume[0]
+            tr = high[0] - low[0]
+        else:
+            pc = close[i - 1]
+            diff = c - pc
+            
+            # RSI
+            up = diff if diff > 0 else 0.0
+            down = -diff if diff < 0 else 0.0
+            ema_up = _ewm_step(ema_up, up, rsi_alpha)
+            ema_down = _ewm_step(ema_down, down, rsi_alpha)
+            
+            # OBV
+            obv_prev = obv
+            obv += -volume[i] if c < pc else volume[i]
+            
+            tr = max(high[i] - low[i], abs(high[i] - pc), abs(low[i] - pc))
+            
+            # ADX（ta库的Wilder累加：第1~w根求和作初值）
+            diff_dm = max(high[i], pc) - min(low[i], pc)
+            diff_up = high[i] - high[i - 1]
+            diff_down = low[i - 1] - low[i]
+            pos = diff_up if diff_up > diff_down and diff_up > 0 else 0.0
+            neg = diff_down if diff_down > diff_up and diff_down > 0 else 0.0
+            if i <= w:
+                trs += diff_dm
+                dip += pos
+                din += neg
+            else:
+                trs = trs - trs / w + diff_dm
+                dip = dip - dip / w + pos
+                din = din - din / w + neg
+                
+            if i >= w:
+                k = i - w
+                if trs != 0:
+                    dp = 100 * (dip / trs)
+                    dn = 100 * (din / trs)
+                else:
+                    dp = 0.0
+                    dn = 0.0
+                dx = 100 * abs((dp - dn) / (dp + dn)) if dp + dn != 0 else 0.0
+                if i == n - 1:
+                    di_plus = dp
+                    di_minus = dn
+                # ADX：前w个DX的均值作初值，之后Wilder平滑
+                if k < w:
+                    dx_sum += dx
+                    if k == w - 1:
+                        adx = dx_sum / w
+                else:
+                    adx = (adx * (w - 1) + dx) / float(w)
+                    
+        rsi_prev = rsi
+        if i >= rsi_period - 1:
+            rsi = 100.0 if ema_down == 0 else 100 - (100 / (1 + ema_up / ema_down))
+            
+        # ATR
+        if i < atr_period:
+            tr_sum += tr
+            if i == atr_period - 1:
+                atr = tr_sum / atr_period
+        else:
+            atr = (atr * (atr_period - 1) + tr) / float(atr_period)
+            
+    # 各周期MA共用一个从最新K线往前的累加和，按周期从短到长依次读出，
+    # 总共只累加 max(ma_periods) 次，不必为每个周期单独求和
+    ma = np.full(len(ma_periods), nan)
+    total = 0.0
+    count = 0
+    for j in np.argsort(ma_periods):
+        period = ma_periods[j]
+        if period > n:
+            break
+        while count < period:
+            total += close[n - 1 - count]
+            count += 1
+        ma[j] = total / period
+            
+    out[0] = macd_val
+    out[1] = macd_sig if n - 1 >= macd_start + macd_signal - 1 else nan
+    out[2] = hist
+    out[3] = hist_prev
+    out[4] = adx if n >= 2 * w else 0.0
+    out[5] = di_plus if n - 1 >= w + 1 else 0.0
+    out[6] = di_minus if n - 1 >= w + 1 else 0.0
+    out[7] = rsi
+    out[8] = rsi_prev
+    
+    # 随机指标：%D为最近stoch_smooth根%K的均值
+    k_sum = 0.0
+    for t in range(n - stoch_smooth, n):
+        lo = low[t - stoch_window + 1:t + 1].min()
+        hi = high[t - stoch_window + 1:t + 1].max()
+        k_t = 100 * (close[t] - lo) / (hi - lo)
+        k_sum += k_t
+    out[9] = k_t
+    out[10] = k_sum / stoch_smooth
+    
+    # CCI(20)
+    tp = (high[n - 20:] + low[n - 20:] + close[n - 20:]) / 3.0
+    tp_mean = tp.mean()
+    mad = np.abs(tp - tp_mean).mean()
+    out[11] = (tp[-1] - tp_mean) / (0.015 * mad)
+    
+    # Williams %R(14)
+    hh = high[n - 14:].max()
+    ll = low[n - 14:].min()
+    out[12] = -100 * (hh - close[-1]) / (hh - ll)
+    
+    # 布林带
+    window = close[n - bb_period:]
+    mavg = window.mean()
+    mstd = np.sqrt(((window - mavg) ** 2).mean())
+    upper = mavg + bb_std * mstd
+    lower = mavg - bb_std * mstd
+    out[13] = upper
+    out[14] = mavg
+    out[15] = lower
+    out[16] = (upper - lower) / mavg * 100
+    out[17] = (close[-1] - lower) / (upper - lower) if upper != lower else nan
+    
+    out[18] = atr
+    
+    # Keltner Channel(20)
+    h20 = high[n - 20:]
+    l20 = low[n - 20:]
+    c20 = close[n - 20:]
+    out[19] = ((4 * h20 - 2 * l20 + c20) / 3.0).mean()
+    out[20] = ((h20 + l20 + c20) / 3.0).mean()
+    out[21] = ((-2 * h20 + 4 * l20 + c20) / 3.0).mean()
+    
+    out[22] = obv
+    out[23] = obv - obv_prev
+    
+    # 成交量均线和VWAP(14)
+    vol_ma = volume[n - 20:].mean()
+    out[24] = volume[-1]
+    out[25] = vol_ma
+    out[26] = volume[-1] / vol_ma if vol_ma > 0 else 1.0
+    v14 = volume[n - 14:]
+    tp14 = (high[n - 14:] + low[n - 14:] + close[n - 14:]) / 3.0
+    out[27] = (tp14 * v14).sum() / v14.sum()
+    
+    # 枢轴点（最新一根K线）
+    h = high[-1]
+    l = low[-1]
+    pivot = (h + l + close[-1]) / 3
+    out[28] = pivot
+    out[29] = 2 * pivot - l
+    out[30] = pivot + (h - l)
+    out[31] = h + 2 * (pivot - l)
+    out[32] = 2 * pivot - h
+    out[33] = pivot - (h - l)
+    out[34] = l - 2 * (h - pivot)
+    
+    # 斐波那契回撤（最近50根K线的高低点，一次遍历同时取最高和最低）
+    start = max(n - 50, 0)
+    fib_high = high[start]
+    fib_low = low[start]
+    for t in range(start + 1, n):
+        if high[t] > fib_high:
+            fib_high = high[t]
+        if low[t] < fib_low:
+            fib_low = low[t]
+    fib_diff = fib_high - fib_low
+    out[35] = fib_low
+    out[36] = fib_low + fib_diff * 0.236
+    out[37] = fib_low + fib_diff * 0.382
+    out[38] = fib_low + fib_diff * 0.5
+    out[39] = fib_low + fib_diff * 0.618
+    out[40] = fib_low + fib_diff * 0.786
+    out[41] = fib_high
+    
+    return ma, ema, out
+
 
 class TechnicalIndicators:
     def __init__(self, config: dict):
         self.config = config['indicators']
+        # 最新K线内核的参数在构造时一次整理好，每次计算不再逐项查配置字典
+        cfg = self.config
+        self._ma_periods = np.asarray(cfg['ma_periods'], dtype=np.int64)
+        self._ema_periods = np.asarray(cfg['ema_periods'], dtype=np.int64)
+        self._ma_keys = tuple((f'ma_{period}', period) for period in cfg['ma_periods'])
+        self._ema_keys = tuple((f'ema_{period}', period) for period in cfg['ema_periods'])
+        self._kernel_params = (
+            int(cfg['macd_fast']), int(cfg['macd_slow']), int(cfg['macd_signal']), int(cfg['adx_period']),
+            int(cfg['rsi_period']), int(cfg['stoch_k']), int(cfg['stoch_d']), int(cfg['bb_period']),
+            float(cfg['bb_std']), int(cfg['atr_period'])
+        )
         
-    def calculate_all(self, df: pd.DataFrame) -> Dict[str, Any]:
-        """计算所有技术指标"""
-        if df.empty or len(df) < 50:
+    def calculate_all(self, ohlcv: Dict[str, np.ndarray]) -> Dict[str, Any]:
+        """计算所有技术指标（最新一根K线的值）
+        ohlcv 为 data_fetcher.to_numpy_dict 拆出的按列float64数组，K线数据只在入口转换一次
+        """
+        close = ohlcv['close']
+        if len(close) < 50:
             return {}
             
+        # 均线、动量、波动率、成交量指标和支撑阻力位在编译内核中一次遍历算出
+        ma, ema, latest = _latest_indicators(
+            ohlcv['high'], ohlcv['low'], close, ohlcv['volume'],
+            self._ma_periods, self._ema_periods, *self._kernel_params
+        )
+        
         indicators = {}
+        for (key, period), value in zip(self._ma_keys, ma):
+            if len(close) >= period:
+                indicators[key] = value
+        for (key, period), value in zip(self._ema_keys, ema):
+            if len(close) >= period:
+                indicators[key] = value
+        indicators.update(zip(_LATEST_KEYS, latest))
+        
+        # 当前价格和开盘价
+        indicators['price'] = close[-1]
+        indicators['open'] = ohlcv['open'][-1]
+        
+        return indicators
         
-        # 趋势指标
-        indicators.update(self._calc_ma(df))
-        indicators.update(self._calc_ema(df))
-        indicators.update(self._calc_macd(df))
-        indicators.update(self._calc_adx(df))
+    def calculate_all_vectorized(self, df: pd.DataFrame) -> Dict[str, np.ndarray]:
+        """一次性计算整段K线的所有指标序列（回测用）
+        返回与df逐行对齐的float64数组，第i个元素等于 calculate_all(to_numpy_dict(df.iloc[:i+1])) 的对应值
+        """
+        close = df['close']
+        high = df['high']
+        low = df['low']
+        volume = df['volume']
+        n = len(df)
+        series = {}
+        
+        # 趋势指标（数据不足周期时置NaN，取快照时跳过，与 calculate_all 一致）
+        for period in self.config['ma_periods']:
+            series[f'ma_{period}'] = close.rolling(window=period).mean()
+        for period in self.config['ema_periods']:
+            ema = close.ewm(span=period, adjust=False).mean()
+            series[f'ema_{period}'] = ema.where(np.arange(n) >= period - 1)
+            
+        # 不再经过ta库的指标对象，递推类指标用JIT内核，窗口类指标直接用rolling，数值与ta库一致
+        high_arr = high.to_numpy(dtype=np.float64)
+        low_arr = low.to_numpy(dtype=np.float64)
+        close_arr = close.to_numpy(dtype=np.float64)
+        volume_arr = volume.to_numpy(dtype=np.float64)
+        
+        macd, macd_signal, macd_hist = _macd(
+            close_arr, self.config['macd_fast'], self.config['macd_slow'], self.config['macd_signal']
+        )
+        series['macd'] = macd
+        series['macd_signal'] = macd_signal
+        series['macd_hist'] = macd_hist
+        series['macd_hist_prev'] = np.r_[np.nan, macd_hist[:-1]]
+        
+        series['adx'], series['di_plus'], series['di_minus'] = _adx(
+            high_arr, low_arr, close_arr, self.config['adx_period']
+        )
         
         # 动量指标
-        indicators.update(self._calc_rsi(df))
-        indicators.update(self._calc_stochastic(df))
-        indicators.update(self._calc_cci(df))
-        indicators.update(self._calc_williams_r(df))
+        rsi = _rsi(close_arr, self.config['rsi_period'])
+        series['rsi'] = rsi
+        series['rsi_prev'] = np.r_[np.nan, rsi[:-1]]
+        
+        stoch_window = self.config['stoch_k']
+        stoch_low = low.rolling(stoch_window, min_periods=stoch_window).min()
+        stoch_high = high.rolling(stoch_window, min_periods=stoch_window).max()
+        stoch_k = 100 * (close - stoch_low) / (stoch_high - stoch_low)
+        series['stoch_k'] = stoch_k
+        series['stoch_d'] = stoch_k.rolling(self.config['stoch_d'], min_periods=self.config['stoch_d']).mean()
+        series['cci'] = _cci(high, low, close, window=20)
+        highest_high = high.rolling(14, min_periods=14).max()
+        lowest_low = low.rolling(14, min_periods=14).min()
+        series['williams_r'] = -100 * (highest_high - close) / (highest_high - lowest_low)
         
         # 波动率指标
-        indicators.update(self._calc_bollinger(df))
-        indicators.update(self._calc_atr(df))
-        indicators.update(self._calc_keltner(df))
+        bb_period = self.config['bb_period']
+        bb_mavg = close.rolling(bb_period, min_periods=bb_period).mean()
+        bb_mstd = close.rolling(bb_period, min_periods=bb_period).std(ddof=0)
+        bb_upper = bb_mavg + self.config['bb_std'] * bb_mstd
+        bb_lower = bb_mavg - self.config['bb_std'] * bb_mstd
+        series['bb_upper'] = bb_upper
+        series['bb_middle'] = bb_mavg
+        series['bb_lower'] = bb_lower
+        series['bb_width'] = ((bb_upper - bb_lower) / bb_mavg) * 100
+        series['bb_pband'] = (close - bb_lower) / (bb_upper - bb_lower).where(bb_upper != bb_lower, np.nan)
+        
+        series['atr'] = _average_true_range(high_arr, low_arr, close_arr, self.config['atr_period'])
+        
+        # Keltner Channel(20)，上下轨与ta库一样不要求满窗口
+        series['kc_upper'] = (((4 * high) - (2 * low) + close) / 3.0).rolling(20, min_periods=0).mean()
+        series['kc_middle'] = ((high + low + close) / 3.0).rolling(20, min_periods=20).mean()
+        series['kc_lower'] = (((-2 * high) + (4 * low) + close) / 3.0).rolling(20, min_periods=0).mean()
         
         # 成交量指标
-        indicators.update(self._calc_obv(df))
-        indicators.update(self._calc_volume_ma(df))
-        indicators.update(self._calc_vwap(df))
+        obv = np.where(close_arr < np.r_[np.nan, close_arr[:-1]], -volume_arr, volume_arr).cumsum()
+        series['obv'] = obv
+        series['obv_change'] = np.r_[0.0, np.diff(obv)]
         
-        # 支撑阻力
-        indicators.update(self._calc_pivot_points(df))
-        indicators.update(self._calc_fibonacci(df))
+        vol_ma = volume.rolling(window=20).mean()
+        series['volume'] = volume
+        series['volume_ma'] = vol_ma
+        series['volume_ratio'] = (volume / vol_ma).where(vol_ma > 0, 1)
         
-        # 当前价格和开盘价
-        indicators['price'] = df['close'].iloc[-1]
-        indicators['open'] = df['open'].iloc[-1]
+        typical_price = (high + low + close) / 3.0
+        series['vwap'] = (typical_price * volume).rolling(14, min_periods=14).sum() / volume.rolling(14, min_periods=14).sum()
         
-        return indicators
+        # 支撑阻力
+        pivot = (high + low + close) / 3
+        series['pivot'] = pivot
+        series['r1'] = 2 * pivot - low
+        series['s1'] = 2 * pivot - high
+        series['r2'] = pivot + (high - low)
+        series['s2'] = pivot - (high - low)
+        series['r3'] = high + 2 * (pivot - low)
+        series['s3'] = low - 2 * (high - pivot)
         
-    def _calc_ma(self, df: pd.DataFrame) -> dict:
-        """移动平均线"""
-        result = {}
-        for period in self.config['ma_periods']:
-            if len(df) >= period:
-                ma = df['close'].rolling(window=period).mean()
-                result[f'ma_{period}'] = ma.iloc[-1]
-        return result
-        
-    def _calc_ema(self, df: pd.DataFrame) -> dict:
-        """指数移动平均线"""
-        result = {}
-        for period in self.config['ema_periods']:
-            if len(df) >= period:
-                ema = df['close'].ewm(span=period, adjust=False).mean()
-                result[f'ema_{period}'] = ema.iloc[-1]
-        return result
-        
-    def _calc_macd(self, df: pd.DataFrame) -> dict:
-        """MACD"""
-        fast = self.config['macd_fast']
-        slow = self.config['macd_slow']
-        signal = self.config['macd_signal']
-        
-        macd = ta.trend.MACD(df['close'], window_slow=slow, window_fast=fast, window_sign=signal)
-        macd_hist = macd.macd_diff()
-        return {
-            'macd': macd.macd().iloc[-1],
-            'macd_signal': macd.macd_signal().iloc[-1],
-            'macd_hist': macd_hist.iloc[-1],
-            'macd_hist_prev': macd_hist.iloc[-2] if len(macd_hist) > 1 else macd_hist.iloc[-1]
-        }
-        
-    def _calc_adx(self, df: pd.DataFrame) -> dict:
-        """ADX"""
-        period = self.config['adx_period']
-        adx = ta.trend.ADXIndicator(df['high'], df['low'], df['close'], window=period)
-        return {
-            'adx': adx.adx().iloc[-1],
-            'di_plus': adx.adx_pos().iloc[-1],
-            'di_minus': adx.adx_neg().iloc[-1]
-        }
-        
-    def _calc_rsi(self, df: pd.DataFrame) -> dict:
-        """RSI"""
-        period = self.config['rsi_period']
-        rsi = ta.momentum.RSIIndicator(df['close'], window=period)
-        rsi_values = rsi.rsi()
-        return {
-            'rsi': rsi_values.iloc[-1],
-            'rsi_prev': rsi_values.iloc[-2] if len(rsi_values) > 1 else rsi_values.iloc[-1]
-        }
-        
-    def _calc_stochastic(self, df: pd.DataFrame) -> dict:
-        """随机指标"""
-        k = self.config['stoch_k']
-        d = self.config['stoch_d']
-        smooth = self.config['stoch_smooth']
-        
-        stoch = ta.momentum.StochasticOscillator(
-            df['high'], df['low'], df['close'],
-            window=k, smooth_window=d
-        )
-        return {
-            'stoch_k': stoch.stoch().iloc[-1],
-            'stoch_d': stoch.stoch_signal().iloc[-1]
-        }
-        
-    def _calc_cci(self, df: pd.DataFrame) -> dict:
-        """CCI"""
-        cci = ta.trend.CCIIndicator(df['high'], df['low'], df['close'], window=20)
-        return {'cci': cci.cci().iloc[-1]}
-        
-    def _calc_williams_r(self, df: pd.DataFrame) -> dict:
-        """Williams %R"""
-        wr = ta.momentum.WilliamsRIndicator(df['high'], df['low'], df['close'], lbp=14)
-        return {'williams_r': wr.williams_r().iloc[-1]}
-        
-    def _calc_bollinger(self, df: pd.DataFrame) -> dict:
-        """布林带"""
-        period = self.config['bb_period']
-        std = self.config['bb_std']
-        
-        bb = ta.volatility.BollingerBands(df['close'], window=period, window_dev=std)
-        return {
-            'bb_upper': bb.bollinger_hband().iloc[-1],
-            'bb_middle': bb.bollinger_mavg().iloc[-1],
-            'bb_lower': bb.bollinger_lband().iloc[-1],
-            'bb_width': bb.bollinger_wband().iloc[-1],
-            'bb_pband': bb.bollinger_pband().iloc[-1]
-        }
-        
-    def _calc_atr(self, df: pd.DataFrame) -> dict:
-        """ATR"""
-        period = self.config['atr_period']
-        atr = ta.volatility.AverageTrueRange(df['high'], df['low'], df['close'], window=period)
-        return {'atr': atr.average_true_range().iloc[-1]}
-        
-    def _calc_keltner(self, df: pd.DataFrame) -> dict:
-        """Keltner Channel"""
-        kc = ta.volatility.KeltnerChannel(df['high'], df['low'], df['close'], window=20)
-        return {
-            'kc_upper': kc.keltner_channel_hband().iloc[-1],
-            'kc_middle': kc.keltner_channel_mband().iloc[-1],
-            'kc_lower': kc.keltner_channel_lband().iloc[-1]
-        }
-        
-    def _calc_obv(self, df: pd.DataFrame) -> dict:
-        """OBV"""
-        obv = ta.volume.OnBalanceVolumeIndicator(df['close'], df['volume'])
-        obv_values = obv.on_balance_volume()
-        return {
-            'obv': obv_values.iloc[-1],
-            'obv_change': obv_values.iloc[-1] - obv_values.iloc[-2] if len(obv_values) > 1 else 0
-        }
-        
-    def _calc_volume_ma(self, df: pd.DataFrame) -> dict:
-        """成交量均线"""
-        vol_ma = df['volume'].rolling(window=20).mean()
-        return {
-            'volume': df['volume'].iloc[-1],
-            'volume_ma': vol_ma.iloc[-1],
-            'volume_ratio': df['volume'].iloc[-1] / vol_ma.iloc[-1] if vol_ma.iloc[-1] > 0 else 1
-        }
-        
-    def _calc_vwap(self, df: pd.DataFrame) -> dict:
-        """VWAP"""
-        vwap = ta.volume.VolumeWeightedAveragePrice(
-            df['high'], df['low'], df['close'], df['volume']
-        )
-        return {'vwap': vwap.volume_weighted_average_price().iloc[-1]}
+        fib_high = high.rolling(window=50, min_periods=1).max()
+        fib_low = low.rolling(window=50, min_periods=1).min()
+        fib_diff = fib_high - fib_low
+        series['fib_0'] = fib_low
+        series['fib_236'] = fib_low + fib_diff * 0.236
+        series['fib_382'] = fib_low + fib_diff * 0.382
+        series['fib_500'] = fib_low + fib_diff * 0.5
+        series['fib_618'] = fib_low + fib_diff * 0.618
+        series['fib_786'] = fib_low + fib_diff * 0.786
+        series['fib_100'] = fib_high
         
-    def _calc_pivot_points(self, df: pd.DataFrame) -> dict:
-        """枢轴点"""
-        high = df['high'].iloc[-1]
-        low = df['low'].iloc[-1]
-        close = df['close'].iloc[-1]
+        series['price'] = close
+        series['open'] = df['open']
         
-        pivot = (high + low + close) / 3
-        r1 = 2 * pivot - low
-        s1 = 2 * pivot - high
-        r2 = pivot + (high - low)
-        s2 = pivot - (high - low)
-        r3 = high + 2 * (pivot - low)
-        s3 = low - 2 * (high - pivot)
-        
-        return {
-            'pivot': pivot,
-            'r1': r1, 'r2': r2, 'r3': r3,
-            's1': s1, 's2': s2, 's3': s3
-        }
-        
-    def _calc_fibonacci(self, df: pd.DataFrame) -> dict:
-        """斐波那契回撤"""
-        # 使用最近50根K线的高低点
-        recent = df.tail(50)
-        high = recent['high'].max()
-        low = recent['low'].min()
-        diff = high - low
-        
-        return {
-            'fib_0': low,
-            'fib_236': low + diff * 0.236,
-            'fib_382': low + diff * 0.382,
-            'fib_500': low + diff * 0.5,
-            'fib_618': low + diff * 0.618,
-            'fib_786': low + diff * 0.786,
-            'fib_100': high
-        }
+        return {k: np.asarray(v, dtype=np.float64) for k, v in series.items()}
+        
+    @staticmethod
+    def snapshot(arrays: Dict[str, np.ndarray], i: int) -> Dict[str, Any]:
+        """从 calculate_all_vectorized 的结果中取第i根K线的指标字典"""
+        if i + 1 < 50:
+            return {}
+        indicators = {}
+        for key, values in arrays.items():
+            value = values[i]
+            # 周期不足的均线不输出
+            if key.startswith(('ma_', 'ema_')) and np.isnan(value):
+                continue
+            indicators[key] = value
+        return indicators
@@ -0,0 +1,17 @@
+"""
+Numba JIT 兼容模块 - 未安装numba时退化为普通Python函数
+"""
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """空装饰器，兼容 @njit 和 @njit(cache=True) 两种写法"""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+
+        def decorator(func):
+            return func
+        return decorator
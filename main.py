@@ -3,13 +3,13 @@
 ETH/USDT 实时交易信号系统
 """
 import asyncio
-import yaml
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from datetime import datetime, timedelta
 from loguru import logger
 
-from data_fetcher import DataFetcher
+from data_fetcher import DataFetcher, to_numpy_dict
 from indicators import TechnicalIndicators
 from strategy import TradingStrategy, SignalType
 from strategy_overnight import OvernightStrategy
@@ -17,6 +17,7 @@ from strategy_trend import TrendStrategy
 from strategy_breakout import BreakoutStrategy
 from strategy_combo import ComboStrategy
 from notifier import Notifier
+from backtest_core import load_config
 
 
 # 策略映射
@@ -75,8 +76,14 @@ class TradingBot:
         
         self.notifier = Notifier(self.config)
         
+        # 各时间周期上次发送信号的单调时钟时间(ns)，不受系统时间调整影响
         self.last_signal_time = {}
+        self._min_signal_ns = self.config['strategy']['min_signal_interval'] * 60 * 1_000_000_000
         self.running = False
+        # 各时间周期上一次的指标结果：{timeframe: (K线指纹, 指标)}
+        self._indicator_cache = {}
+        # 指标计算和策略分析是CPU密集的同步代码，放到线程池中按时间周期并行执行
+        self._executor = ThreadPoolExecutor(max_workers=len(self.config['trading']['timeframes']))
         
     def _load_config(self, path: str) -> dict:
         """加载配置文件"""
@@ -86,8 +93,7 @@ class TradingBot:
             logger.info("请复制 config.example.yaml 为 config.yaml 并配置")
             sys.exit(1)
             
-        with open(config_file, 'r', encoding='utf-8') as f:
-            return yaml.safe_load(f)
+        return load_config(path)
             
     def _setup_logging(self):
         """配置日志"""
@@ -146,6 +152,8 @@ class TradingBot:
         """停止系统"""
         self.running = False
         await self.fetcher.close()
+        await self.notifier.close()
+        self._executor.shutdown(wait=False)
         logger.info("系统已停止")
         
     async def _analyze_cycle(self):
@@ -163,9 +171,11 @@ class TradingBot:
             # 获取所有时间周期数据
             all_data = await self.fetcher.fetch_all_timeframes()
             
-            # 分析每个时间周期
-            for timeframe, df in all_data.items():
-                await self._analyze_timeframe(timeframe, df, ticker)
+            # 各时间周期互不依赖，并发分析
+            await asyncio.gather(*[
+                self._analyze_timeframe(timeframe, df, ticker)
+                for timeframe, df in all_data.items()
+            ])
                 
         except Exception as e:
             logger.error(f"分析周期异常: {e}")
@@ -173,13 +183,9 @@ class TradingBot:
     async def _analyze_timeframe(self, timeframe: str, df, ticker: dict):
         """分析单个时间周期"""
         try:
-            # 计算技术指标
-            indicators = self.indicators.calculate_all(df)
-            if not indicators:
-                return
-                
-            # 生成交易信号
-            signal = self.strategy.analyze(indicators, timeframe)
+            # 计算技术指标并生成交易信号（在线程池中执行，不阻塞事件循环）
+            loop = asyncio.get_running_loop()
+            signal = await loop.run_in_executor(self._executor, self._generate_signal, timeframe, df)
             
             if signal and signal.signal_type != SignalType.NEUTRAL:
                 # 检查信号间隔
@@ -192,32 +198,55 @@ class TradingBot:
                     # 发送通知
                     await self.notifier.send_signal(signal, ticker)
                     
-                    self.last_signal_time[timeframe] = datetime.now()
+                    self.last_signal_time[timeframe] = time.monotonic_ns()
                     
         except Exception as e:
             logger.error(f"[{timeframe}] 分析异常: {e}")
             
+    def _generate_signal(self, timeframe: str, df):
+        """计算技术指标并生成交易信号，指标不足时返回None"""
+        indicators = self._calculate_indicators(timeframe, df)
+        if not indicators:
+            return None
+        return self.strategy.analyze(indicators, timeframe)
+        
+    def _calculate_indicators(self, timeframe: str, df) -> dict:
+        """计算技术指标，K线与上一周期相同时直接复用上次结果
+        
+        最新一根K线在收盘前会持续变化，所以指纹包含它的OHLCV而不只是时间戳
+        """
+        # 列数组只取一次，指纹和指标计算都直接读数组，不再经过 df.iloc 构造行Series
+        ohlcv = to_numpy_dict(df)
+        key = (len(df), df.index[-1], tuple(values[-1] for values in ohlcv.values()))
+        cached = self._indicator_cache.get(timeframe)
+        if cached and cached[0] == key:
+            return cached[1]
+            
+        indicators = self.indicators.calculate_all(ohlcv)
+        self._indicator_cache[timeframe] = (key, indicators)
+        return indicators
+        
     def _should_send_signal(self, timeframe: str) -> bool:
         """检查是否应该发送信号（避免频繁发送）"""
-        if timeframe not in self.last_signal_time:
+        last = self.last_signal_time.get(timeframe)
+        if last is None:
             return True
-            
-        min_interval = self.config['strategy']['min_signal_interval']
-        elapsed = datetime.now() - self.last_signal_time[timeframe]
-        return elapsed > timedelta(minutes=min_interval)
+        return time.monotonic_ns() - last > self._min_signal_ns
         
     def _print_signal(self, signal):
-        """打印信号详情到控制台"""
-        logger.info("-" * 40)
-        logger.info(f"信号类型: {signal.signal_type.value}")
-        logger.info(f"信号强度: {signal.strength}/100")
-        logger.info(f"当前价格: ${signal.price:.2f}")
-        logger.info(f"止损价位: ${signal.stop_loss:.2f}")
-        logger.info(f"止盈价位: ${signal.take_profit:.2f}")
-        logger.info("信号依据:")
-        for reason in signal.reasons[:5]:
-            logger.info(f"  • {reason}")
-        logger.info("-" * 40)
+        """打印信号详情到控制台（拼成一条多行日志，只经过一次loguru格式化和分发）"""
+        lines = [
+            "-" * 40,
+            f"信号类型: {signal.signal_type.value}",
+            f"信号强度: {signal.strength}/100",
+            f"当前价格: ${signal.price:.2f}",
+            f"止损价位: ${signal.stop_loss:.2f}",
+            f"止盈价位: ${signal.take_profit:.2f}",
+            "信号依据:",
+        ]
+        lines.extend(f"  • {reason}" for reason in signal.reasons[:5])
+        lines.append("-" * 40)
+        logger.info("\n".join(lines))
 
 
 async def main():
@@ -236,6 +265,7 @@ async def main():
     if args.test:
         await bot.fetcher.init()
         await bot.notifier.send_test()
+        await bot.notifier.close()
         await bot.fetcher.close()
     else:
         await bot.start()
@@ -4,31 +4,79 @@ ETH/USDT 多策略并行交易信号系统
 同时运行多个策略，每个策略独立发送信号
 """
 import asyncio
-import yaml
+import importlib
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from datetime import datetime, timedelta
 from loguru import logger
 
-from data_fetcher import DataFetcher
+from data_fetcher import DataFetcher, to_numpy_dict
 from indicators import TechnicalIndicators
 from strategy import SignalType
-from strategy_trend import TrendStrategy
-from strategy_combo import ComboStrategy
-from strategy_overnight import OvernightStrategy
 from notifier import Notifier
+from backtest_core import load_config
 
 
-# 策略配置
+# 策略配置（按模块名和类名登记，只导入实际选中的策略）
 STRATEGIES = {
     'trend': {
-        'class': TrendStrategy,
+        'module': 'strategy_trend',
+        'class': 'TrendStrategy',
         'name': '趋势跟踪V3',
         'emoji': '📈'
     }
 }
 
 
+# 策略信号邮件模板，模块加载时定义一次，发送时只填入变化的字段
+SIGNAL_EMAIL_TEMPLATE = """
+<html>
+<body style="font-family: Arial, sans-serif; padding: 20px;">
+<h2 style="color: {color};">
+    {emoji} {strategy_name} - {signal_type}
+</h2>
+
+<div style="background: #f5f5f5; padding: 15px; border-radius: 8px; margin: 10px 0;">
+    <h3>📊 行情信息</h3>
+    <p><strong>当前价格:</strong> ${price:.2f}</p>
+    <p><strong>24h涨跌:</strong> {change:+.2f}%</p>
+    <p><strong>信号强度:</strong> {strength}/100</p>
+</div>
+
+<div style="background: #e3f2fd; padding: 15px; border-radius: 8px; margin: 10px 0;">
+    <h3>🎯 交易建议</h3>
+    <p><strong>入场价格:</strong> ${entry_price:.2f}</p>
+    <p><strong>止损价位:</strong> ${stop_loss:.2f}</p>
+    <p><strong>止盈价位:</strong> ${take_profit:.2f}</p>
+    <p><strong>时间周期:</strong> {timeframe}</p>
+</div>
+
+<div style="background: #fff3e0; padding: 15px; border-radius: 8px; margin: 10px 0;">
+    <h3>📝 信号依据</h3>
+    <ul>
+        {reasons_html}
+    </ul>
+</div>
+
+<p style="color: #666; font-size: 12px; margin-top: 20px;">
+    策略: {strategy_name} | 时间: {timestamp}
+</p>
+</body>
+</html>
+"""
+
+
+@dataclass
+class StrategyRunner:
+    """运行中的单个策略：实例、显示名称和各时间周期上次发送信号的单调时钟时间(ns)"""
+    instance: object
+    name: str
+    emoji: str
+    last_signal_time: dict = field(default_factory=dict)
+
+
 class MultiStrategyBot:
     def __init__(self, config_path: str = "config.yaml", strategies: list = None):
         self.config = self._load_config(config_path)
@@ -37,6 +85,8 @@ class MultiStrategyBot:
         self.fetcher = DataFetcher(self.config)
         self.indicators = TechnicalIndicators(self.config)
         self.notifier = Notifier(self.config)
+        # 策略信号只走邮件，未启用时不再生成邮件内容
+        self._email_enabled = self.config['notifications']['email']['enabled']
         
         # 初始化选中的策略
         self.strategies = {}
@@ -45,23 +95,27 @@ class MultiStrategyBot:
         for key in strategy_list:
             if key in STRATEGIES:
                 info = STRATEGIES[key]
-                self.strategies[key] = {
-                    'instance': info['class'](self.config),
-                    'name': info['name'],
-                    'emoji': info['emoji'],
-                    'last_signal_time': {}
-                }
+                strategy_cls = getattr(importlib.import_module(info['module']), info['class'])
+                self.strategies[key] = StrategyRunner(strategy_cls(self.config), info['name'], info['emoji'])
         
+        # 信号最小间隔(ns)，与 last_signal_time 中的单调时钟时间比较
+        self._min_signal_ns = self.config['strategy']['min_signal_interval'] * 60 * 1_000_000_000
+        # 各时间周期上一次的指标结果：{timeframe: (K线指纹, 指标)}
+        self._indicator_cache = {}
+        # 指标计算和策略分析是CPU密集的同步代码，放到线程池中执行，不阻塞事件循环
+        self._executor = ThreadPoolExecutor(max_workers=len(self.config['trading']['timeframes']))
         self.running = False
         self.startup_delay = True  # 启动延迟标志，避免启动时发送大量邮件
+        # 待发送的邮件(标题, 内容)，由后台任务依次发送，分析周期不等待SMTP往返
+        self._mail_queue = asyncio.Queue(maxsize=64)
+        self._mail_task = None
         
     def _load_config(self, path: str) -> dict:
         config_file = Path(path)
         if not config_file.exists():
             logger.error(f"配置文件不存在: {path}")
             sys.exit(1)
-        with open(config_file, 'r', encoding='utf-8') as f:
-            return yaml.safe_load(f)
+        return load_config(path)
             
     def _setup_logging(self):
         log_config = self.config.get('logging', {})
@@ -86,13 +140,14 @@ class MultiStrategyBot:
         logger.info("ETH/USDT 多策略并行交易信号系统启动")
         logger.info("=" * 60)
         
-        for key, info in self.strategies.items():
-            logger.info(f"  {info['emoji']} {info['name']}")
+        for runner in self.strategies.values():
+            logger.info(f"  {runner.emoji} {runner.name}")
         
         logger.info("=" * 60)
         
         await self.fetcher.init()
         self.running = True
+        self._mail_task = asyncio.create_task(self._mail_worker())
         
         interval = self.config['trading'].get('fetch_interval', 10)
         logger.info(f"数据刷新间隔: {interval}秒")
@@ -113,9 +168,27 @@ class MultiStrategyBot:
             
     async def stop(self):
         self.running = False
+        if self._mail_task:
+            # 尽量发完已排队的邮件再退出
+            try:
+                await asyncio.wait_for(self._mail_queue.join(), timeout=30)
+            except asyncio.TimeoutError:
+                logger.warning(f"退出时仍有 {self._mail_queue.qsize()} 封邮件未发送")
+            self._mail_task.cancel()
+        self._executor.shutdown(wait=False)
+        await self.notifier.close()
         await self.fetcher.close()
         logger.info("系统已停止")
         
+    async def _mail_worker(self):
+        """后台发送邮件队列中的通知"""
+        while True:
+            subject, body = await self._mail_queue.get()
+            try:
+                await self.notifier.send_email(subject, body)
+            finally:
+                self._mail_queue.task_done()
+        
     async def _analyze_cycle(self):
         try:
             ticker = await self.fetcher.fetch_ticker()
@@ -128,15 +201,19 @@ class MultiStrategyBot:
             
             all_data = await self.fetcher.fetch_all_timeframes()
             
-            for timeframe, df in all_data.items():
-                await self._analyze_timeframe(timeframe, df, ticker)
+            # 各时间周期互不依赖，并发分析（_analyze_timeframe 内部捕获各自的异常）
+            await asyncio.gather(*[
+                self._analyze_timeframe(timeframe, df, ticker)
+                for timeframe, df in all_data.items()
+            ])
                 
         except Exception as e:
             logger.error(f"分析周期异常: {e}")
             
     async def _analyze_timeframe(self, timeframe: str, df, ticker: dict):
         try:
-            indicators = self.indicators.calculate_all(df)
+            loop = asyncio.get_running_loop()
+            indicators = await loop.run_in_executor(self._executor, self._calculate_indicators, timeframe, df)
             if not indicators:
                 return
             
@@ -150,16 +227,29 @@ class MultiStrategyBot:
         except Exception as e:
             logger.error(f"[{timeframe}] 分析异常: {e}")
     
+    def _calculate_indicators(self, timeframe: str, df) -> dict:
+        """计算技术指标，最新K线的时间和OHLCV都没变时直接复用上次结果（所有策略共用）"""
+        ohlcv = to_numpy_dict(df)
+        key = (len(df), df.index[-1], tuple(values[-1] for values in ohlcv.values()))
+        cached = self._indicator_cache.get(timeframe)
+        if cached and cached[0] == key:
+            return cached[1]
+            
+        indicators = self.indicators.calculate_all(ohlcv)
+        self._indicator_cache[timeframe] = (key, indicators)
+        return indicators
+    
     async def _analyze_with_strategy(self, strategy_key, strategy_info, 
                                       indicators, timeframe, ticker):
         try:
-            strategy = strategy_info['instance']
-            signal = strategy.analyze(indicators, timeframe)
+            strategy = strategy_info.instance
+            loop = asyncio.get_running_loop()
+            signal = await loop.run_in_executor(self._executor, strategy.analyze, indicators, timeframe)
             
             if signal and signal.signal_type != SignalType.NEUTRAL:
                 if self._should_send_signal(strategy_info, timeframe):
-                    strategy_name = strategy_info['name']
-                    emoji = strategy_info['emoji']
+                    strategy_name = strategy_info.name
+                    emoji = strategy_info.emoji
                     
                     logger.info(f"[{timeframe}] {emoji} {strategy_name} 发现信号: {signal.signal_type.value}")
                     self._print_signal(signal, strategy_name)
@@ -167,86 +257,66 @@ class MultiStrategyBot:
                     # 启动时只记录不发送，避免邮件轰炸
                     if self.startup_delay:
                         logger.info(f"[启动中] 跳过发送邮件，等待下一周期")
-                    else:
+                    elif self._email_enabled:
                         await self._send_strategy_signal(signal, ticker, strategy_name, emoji)
                     
-                    strategy_info['last_signal_time'][timeframe] = datetime.now()
+                    strategy_info.last_signal_time[timeframe] = time.monotonic_ns()
                     
         except Exception as e:
-            logger.error(f"[{timeframe}] {strategy_info['name']} 分析异常: {e}")
+            logger.error(f"[{timeframe}] {strategy_info.name} 分析异常: {e}")
     
     def _should_send_signal(self, strategy_info, timeframe: str) -> bool:
-        last_signal_time = strategy_info['last_signal_time']
-        if timeframe not in last_signal_time:
+        last = strategy_info.last_signal_time.get(timeframe)
+        if last is None:
             return True
-        min_interval = self.config['strategy']['min_signal_interval']
-        elapsed = datetime.now() - last_signal_time[timeframe]
-        return elapsed > timedelta(minutes=min_interval)
+        return time.monotonic_ns() - last > self._min_signal_ns
     
     async def _send_strategy_signal(self, signal, ticker, strategy_name, emoji):
         """发送带策略名称的信号通知"""
         price = ticker['price']
         change = ticker.get('change_24h', 0)
         
-        # 获取主机名前4个字符
-        import socket
-        hostname = socket.gethostname()[:4]
-        
         # 构建邮件标题，包含策略名称和强度
         signal_type = signal.signal_type.value
         subject = f"{emoji}【{strategy_name}】ETH {signal_type} ${price:.0f} 强度{signal.strength}"
         
         # 构建邮件内容
-        body = f"""
-<html>
-<body style="font-family: Arial, sans-serif; padding: 20px;">
-<h2 style="color: {'#00C853' if '买' in signal_type else '#FF1744'};">
-    {emoji} {strategy_name} - {signal_type}
-</h2>
-
-<div style="background: #f5f5f5; padding: 15px; border-radius: 8px; margin: 10px 0;">
-    <h3>📊 行情信息</h3>
-    <p><strong>当前价格:</strong> ${price:.2f}</p>
-    <p><strong>24h涨跌:</strong> {change:+.2f}%</p>
-    <p><strong>信号强度:</strong> {signal.strength}/100</p>
-</div>
-
-<div style="background: #e3f2fd; padding: 15px; border-radius: 8px; margin: 10px 0;">
-    <h3>🎯 交易建议</h3>
-    <p><strong>入场价格:</strong> ${signal.entry_price:.2f}</p>
-    <p><strong>止损价位:</strong> ${signal.stop_loss:.2f}</p>
-    <p><strong>止盈价位:</strong> ${signal.take_profit:.2f}</p>
-    <p><strong>时间周期:</strong> {signal.timeframe}</p>
-</div>
-
-<div style="background: #fff3e0; padding: 15px; border-radius: 8px; margin: 10px 0;">
-    <h3>📝 信号依据</h3>
-    <ul>
-        {''.join(f'<li>{r}</li>' for r in signal.reasons[:6])}
-    </ul>
-</div>
-
-<p style="color: #666; font-size: 12px; margin-top: 20px;">
-    策略: {strategy_name} | 时间: {signal.timestamp}
-</p>
-</body>
-</html>
-"""
+        body = SIGNAL_EMAIL_TEMPLATE.format_map({
+            'color': '#00C853' if '买' in signal_type else '#FF1744',
+            'emoji': emoji,
+            'strategy_name': strategy_name,
+            'signal_type': signal_type,
+            'price': price,
+            'change': change,
+            'strength': signal.strength,
+            'entry_price': signal.entry_price,
+            'stop_loss': signal.stop_loss,
+            'take_profit': signal.take_profit,
+            'timeframe': signal.timeframe,
+            'reasons_html': ''.join(f'<li>{r}</li>' for r in signal.reasons[:6]),
+            'timestamp': signal.timestamp,
+        })
         
-        await self.notifier._send_email(subject, body)
+        try:
+            self._mail_queue.put_nowait((subject, body))
+        except asyncio.QueueFull:
+            logger.warning(f"邮件队列已满，丢弃通知: {subject}")
         
     def _print_signal(self, signal, strategy_name):
-        logger.info("-" * 50)
-        logger.info(f"策略: {strategy_name}")
-        logger.info(f"信号类型: {signal.signal_type.value}")
-        logger.info(f"信号强度: {signal.strength}/100")
-        logger.info(f"当前价格: ${signal.price:.2f}")
-        logger.info(f"止损价位: ${signal.stop_loss:.2f}")
-        logger.info(f"止盈价位: ${signal.take_profit:.2f}")
-        logger.info("信号依据:")
-        for reason in signal.reasons[:5]:
-            logger.info(f"  • {reason}")
-        logger.info("-" * 50)
+        # 拼成一条多行日志，只经过一次loguru格式化和分发
+        lines = [
+            "-" * 50,
+            f"策略: {strategy_name}",
+            f"信号类型: {signal.signal_type.value}",
+            f"信号强度: {signal.strength}/100",
+            f"当前价格: ${signal.price:.2f}",
+            f"止损价位: ${signal.stop_loss:.2f}",
+            f"止盈价位: ${signal.take_profit:.2f}",
+            "信号依据:",
+        ]
+        lines.extend(f"  • {reason}" for reason in signal.reasons[:5])
+        lines.append("-" * 50)
+        logger.info("\n".join(lines))
 
 
 async def main():
@@ -266,6 +336,7 @@ async def main():
     if args.test:
         await bot.fetcher.init()
         await bot.notifier.send_test()
+        await bot.notifier.close()
         await bot.fetcher.close()
     else:
         await bot.start()
@@ -2,241 +2,380 @@
 消息推送模块 - 支持Telegram/微信/邮件
 """
 import asyncio
+import socket
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
 import aiohttp
+import aiosmtplib
 from typing import Optional
 from loguru import logger
+from reliability import CircuitBreaker, retry
 from strategy import TradeSignal
 
 
+# 本机主机名在导入时取一次，邮件标题以前4位作为服务器标识
+_HOSTNAME = socket.gethostname()
+_HOST_TAG = f"[{_HOSTNAME[:4]}]"
+
+# 单个渠道的发送时限（秒，含重试），卡住的渠道不会拖慢其他渠道
+CHANNEL_TIMEOUT = 15
+# 每个渠道的发送尝试次数和退避基数（秒）
+RETRY_ATTEMPTS = 3
+RETRY_BASE = 0.5
+# 每次尝试的时限（秒）：渠道时限扣除最长退避等待后按尝试次数均分，超时的尝试仍有时间重试
+ATTEMPT_TIMEOUT = (CHANNEL_TIMEOUT - sum(RETRY_BASE * 2 ** n for n in range(RETRY_ATTEMPTS - 1))) / RETRY_ATTEMPTS
+# 建立HTTP连接的时限（秒）
+HTTP_CONNECT_TIMEOUT = 3
+# 各渠道熔断状态的日志间隔（秒）
+HEALTH_LOG_INTERVAL = 600
+
+
+class ChannelError(Exception):
+    """通知渠道返回失败（如鉴权错误），不重试"""
+
+
+class TransientChannelError(ChannelError):
+    """限流(429)或服务端错误(5xx)，可重试"""
+
+
+def _raise_for_status(channel: str, status: int, detail):
+    """按HTTP状态码抛出对应的渠道异常"""
+    error = TransientChannelError if status == 429 or status >= 500 else ChannelError
+    raise error(f"{channel}发送失败({status}): {detail}")
+
+
+# 网络错误、超时、限流和服务端错误才重试，鉴权失败等直接交给熔断器计数
+_http_retry = retry(max_attempts=RETRY_ATTEMPTS, base=RETRY_BASE, timeout=ATTEMPT_TIMEOUT,
+                    retry_on=(aiohttp.ClientError, asyncio.TimeoutError, TransientChannelError))
+_smtp_retry = retry(max_attempts=RETRY_ATTEMPTS, base=RETRY_BASE, timeout=ATTEMPT_TIMEOUT,
+                    retry_on=(aiosmtplib.SMTPException, asyncio.TimeoutError),
+                    give_up_on=(aiosmtplib.SMTPAuthenticationError,))
+
+
+# 信号方向对应的emoji，买入类为绿色，其余为红色
+# 按枚举名称对应（各策略模块各自定义了SignalType），与 backtest_core.SIGNAL_CODES 一致
+_EMOJI = {
+    'STRONG_BUY': "🟢",
+    'BUY': "🟢",
+}
+
+# 信号消息模板，每次推送只做一次 format_map
+_MSG_TMPL = """
+{emoji} ETH/USDT 交易信号 {emoji}
+
+📊 信号类型: {signal_type}
+💪 信号强度: {strength}/100
+⏰ 时间周期: {timeframe}
+🕐 时间: {timestamp}
+
+💰 当前价格: ${price:.2f}
+🎯 建议入场: ${entry_price:.2f}
+🛑 止损价位: ${stop_loss:.2f}
+✅ 止盈价位: ${take_profit:.2f}
+
+📈 盈亏比: {rr:.2f}
+"""
+
+_TICKER_TMPL = """
+📊 24H数据:
+  • 最高: ${high_24h:.2f}
+  • 最低: ${low_24h:.2f}
+  • 涨跌: {change_24h:.2f}%
+  • 成交量: {volume_24h:,.0f} ETH
+"""
+
+_REASON_TMPL = "  {}. {}\n"
+
+_RISK_TIP = "\n⚠️ 风险提示: 此为系统自动分析，仅供参考，请谨慎操作！"
+
+# 信号邮件的HTML模板
+_EMAIL_HTML_TMPL = """
+                <html>
+                <body style="font-family: Arial, sans-serif;">
+                <h2>{emoji} ETH/USDT 交易信号</h2>
+                <table style="border-collapse: collapse; width: 100%;">
+                    <tr><td style="padding: 8px; border: 1px solid #ddd;"><b>信号类型</b></td><td style="padding: 8px; border: 1px solid #ddd;">{signal_type}</td></tr>
+                    <tr><td style="padding: 8px; border: 1px solid #ddd;"><b>信号强度</b></td><td style="padding: 8px; border: 1px solid #ddd;">{strength}/100</td></tr>
+                    <tr><td style="padding: 8px; border: 1px solid #ddd;"><b>当前价格</b></td><td style="padding: 8px; border: 1px solid #ddd;">${price:.2f}</td></tr>
+                    <tr><td style="padding: 8px; border: 1px solid #ddd;"><b>止损价位</b></td><td style="padding: 8px; border: 1px solid #ddd;">${stop_loss:.2f}</td></tr>
+                    <tr><td style="padding: 8px; border: 1px solid #ddd;"><b>止盈价位</b></td><td style="padding: 8px; border: 1px solid #ddd;">${take_profit:.2f}</td></tr>
+                </table>
+                <h3>信号依据:</h3>
+                <ul>
+                {reasons}
+                </ul>
+                <p style="color: red;"><b>⚠️ 风险提示: 此为系统自动分析，仅供参考！</b></p>
+                </body>
+                </html>
+                """
+
+
 class Notifier:
     def __init__(self, config: dict):
         self.config = config['notifications']
+        # 各渠道是否启用，启动时读一次
+        self._enabled = {name: self.config[name]['enabled'] for name in ('telegram', 'wechat', 'email')}
+        # Telegram/Server酱共用一个HTTP会话，复用连接池和keep-alive，首次发送时创建
+        self._session: Optional[aiohttp.ClientSession] = None
+        # 邮件复用一个已登录的SMTP连接，锁保证同一连接上的发送依次进行
+        self._smtp = None
+        self._smtp_lock = asyncio.Lock()
+        # 每个渠道一个熔断器，连续失败后一段时间内直接跳过该渠道
+        self._breakers = {name: CircuitBreaker() for name in ('telegram', 'wechat', 'email')}
+        self._last_health_log = time.monotonic()
+        
+    def _get_session(self) -> aiohttp.ClientSession:
+        """取共用的HTTP会话，未创建或已关闭时新建
+        
+        每个推送域名最多保持5个keep-alive连接，DNS解析结果缓存5分钟
+        """
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=20,
+                    limit_per_host=5,
+                    keepalive_timeout=90,
+                    use_dns_cache=True,
+                    ttl_dns_cache=300
+                ),
+                # 每次请求的总时限由重试装饰器的 ATTEMPT_TIMEOUT 控制
+                timeout=aiohttp.ClientTimeout(total=None, connect=HTTP_CONNECT_TIMEOUT)
+            )
+        return self._session
+        
+    async def close(self):
+        """关闭共用的HTTP会话和SMTP连接"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        if self._smtp is not None and self._smtp.is_connected:
+            try:
+                await self._smtp.quit()
+            except Exception as e:
+                logger.debug(f"关闭SMTP连接异常: {e}")
+        self._smtp = None
+        
+    async def _smtp_send(self, msg):
+        """通过长连接发送邮件，连接未建立或已断开时重新连接登录
+        
+        断线时丢弃连接后抛出，由调用方的 _smtp_retry 重连重发
+        """
+        config = self.config['email']
+        async with self._smtp_lock:
+            if self._smtp is None or not self._smtp.is_connected:
+                # QQ邮箱使用SSL端口465直连，其余端口用STARTTLS
+                use_tls = config.get('use_ssl', False) or config['smtp_port'] == 465
+                self._smtp = aiosmtplib.SMTP(
+                    hostname=config['smtp_server'],
+                    port=config['smtp_port'],
+                    username=config['username'],
+                    password=config['password'],
+                    use_tls=use_tls,
+                    start_tls=not use_tls
+                )
+                try:
+                    await self._smtp.connect()
+                except BaseException:
+                    # 连接在TLS握手或登录途中失败/被取消时客户端只初始化了一半，丢弃后下次重连
+                    self._smtp.close()
+                    self._smtp = None
+                    raise
+            try:
+                await self._smtp.send_message(msg)
+            except asyncio.CancelledError:
+                # 发送超时被取消时连接停在事务中途，丢弃后下次重连
+                self._smtp.close()
+                self._smtp = None
+                raise
+            except (aiosmtplib.SMTPServerDisconnected, aiosmtplib.SMTPResponseException):
+                # 服务器会关闭空闲连接；返回错误码后连接状态也不可靠，一律丢弃后由重试重连
+                self._smtp.close()
+                self._smtp = None
+                raise
         
     async def send_signal(self, signal: TradeSignal, ticker: dict = None):
         """发送交易信号通知"""
+        # 没有启用的渠道时不必格式化消息
+        if not any(self._enabled.values()):
+            logger.warning("没有启用任何通知渠道")
+            return
+        
         message = self._format_signal(signal, ticker)
         
+        sends = {}
+        if self._enabled['telegram']:
+            sends['telegram'] = self._send_telegram(message)
+        if self._enabled['wechat']:
+            sends['wechat'] = self._send_wechat(f"ETH交易信号: {signal.signal_type.value}", message)
+        if self._enabled['email']:
+            sends['email'] = self._send_email(signal, message)
+        await self._fan_out(sends)
+            
+    async def send_email(self, subject: str, body: str):
+        """发送指定标题和HTML内容的邮件，与信号通知一样受超时和熔断保护"""
+        await self._fan_out({'email': self._send_email(subject, body)})
+            
+    async def _fan_out(self, sends: dict):
+        """各渠道并发发送，每个渠道限时 CHANNEL_TIMEOUT 秒，按渠道名记录超时和异常
+        
+        熔断中的渠道直接跳过，发送结果计入对应渠道的熔断器
+        """
         tasks = []
-        if self.config['telegram']['enabled']:
-            tasks.append(self._send_telegram(message))
-        if self.config['wechat']['enabled']:
-            tasks.append(self._send_wechat(signal, message))
-        if self.config['email']['enabled']:
-            tasks.append(self._send_email(signal, message))
+        for name, coro in sends.items():
+            if not self._breakers[name].allow():
+                coro.close()
+                logger.warning(f"{name} 熔断中，跳过本次发送")
+                continue
+            tasks.append(asyncio.create_task(asyncio.wait_for(coro, CHANNEL_TIMEOUT), name=name))
             
-        if tasks:
-            await asyncio.gather(*tasks, return_exceptions=True)
-        else:
-            logger.warning("没有启用任何通知渠道")
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        for task, result in zip(tasks, results):
+            name = task.get_name()
+            if not isinstance(result, BaseException):
+                self._breakers[name].record_success()
+                continue
+            self._breakers[name].record_failure()
+            if isinstance(result, asyncio.TimeoutError):
+                logger.error(f"{name} 发送超时（{CHANNEL_TIMEOUT}秒）")
+            else:
+                logger.error(f"{name} 发送异常: {result!r}")
+        self._log_health()
+            
+    def _log_health(self):
+        """每 HEALTH_LOG_INTERVAL 秒记录一次各渠道的熔断状态"""
+        now = time.monotonic()
+        if now - self._last_health_log < HEALTH_LOG_INTERVAL:
+            return
+        self._last_health_log = now
+        logger.info("通知渠道状态: " + ", ".join(f"{name}={breaker}" for name, breaker in self._breakers.items()))
             
     def _format_signal(self, signal: TradeSignal, ticker: dict = None) -> str:
         """格式化信号消息"""
-        emoji = "🟢" if "买" in signal.signal_type.value else "🔴"
-        
-        msg = f"""
-{emoji} ETH/USDT 交易信号 {emoji}
-
-📊 信号类型: {signal.signal_type.value}
-💪 信号强度: {signal.strength}/100
-⏰ 时间周期: {signal.timeframe}
-🕐 时间: {signal.timestamp}
-
-💰 当前价格: ${signal.price:.2f}
-🎯 建议入场: ${signal.entry_price:.2f}
-🛑 止损价位: ${signal.stop_loss:.2f}
-✅ 止盈价位: ${signal.take_profit:.2f}
-
-📈 盈亏比: {abs(signal.take_profit - signal.entry_price) / abs(signal.entry_price - signal.stop_loss):.2f}
-"""
+        parts = [_MSG_TMPL.format_map({
+            'emoji': _EMOJI.get(signal.signal_type.name, "🔴"),
+            'signal_type': signal.signal_type.value,
+            'strength': signal.strength,
+            'timeframe': signal.timeframe,
+            'timestamp': signal.timestamp,
+            'price': signal.price,
+            'entry_price': signal.entry_price,
+            'stop_loss': signal.stop_loss,
+            'take_profit': signal.take_profit,
+            'rr': abs(signal.take_profit - signal.entry_price) / abs(signal.entry_price - signal.stop_loss)
+        })]
         
         if ticker:
-            msg += f"""
-📊 24H数据:
-  • 最高: ${ticker.get('high_24h', 0):.2f}
-  • 最低: ${ticker.get('low_24h', 0):.2f}
-  • 涨跌: {ticker.get('change_24h', 0):.2f}%
-  • 成交量: {ticker.get('volume_24h', 0):,.0f} ETH
-"""
+            parts.append(_TICKER_TMPL.format(
+                high_24h=ticker.get('high_24h', 0),
+                low_24h=ticker.get('low_24h', 0),
+                change_24h=ticker.get('change_24h', 0),
+                volume_24h=ticker.get('volume_24h', 0)
+            ))
         
-        msg += "\n📋 信号依据:\n"
-        for i, reason in enumerate(signal.reasons[:10], 1):
-            msg += f"  {i}. {reason}\n"
-            
-        msg += "\n⚠️ 风险提示: 此为系统自动分析，仅供参考，请谨慎操作！"
+        parts.append("\n📋 信号依据:\n")
+        parts.extend(_REASON_TMPL.format(i, reason) for i, reason in enumerate(signal.reasons[:10], 1))
+        parts.append(_RISK_TIP)
         
-        return msg
+        return ''.join(parts)
         
+    @_http_retry
     async def _send_telegram(self, message: str):
-        """发送Telegram消息"""
-        try:
-            config = self.config['telegram']
-            url = f"https://api.telegram.org/bot{config['bot_token']}/sendMessage"
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, json={
-                    'chat_id': config['chat_id'],
-                    'text': message,
-                    'parse_mode': 'HTML'
-                }) as resp:
-                    if resp.status == 200:
-                        logger.info("Telegram消息发送成功")
-                    else:
-                        logger.error(f"Telegram发送失败: {await resp.text()}")
-        except Exception as e:
-            logger.error(f"Telegram发送异常: {e}")
-            
-    async def _send_wechat(self, signal: TradeSignal, message: str):
-        """发送微信消息（通过Server酱）"""
-        try:
-            config = self.config['wechat']
-            url = f"https://sctapi.ftqq.com/{config['sendkey']}.send"
-            
-            title = f"ETH交易信号: {signal.signal_type.value}"
+        """发送Telegram消息，失败时抛出异常"""
+        config = self.config['telegram']
+        url = f"https://api.telegram.org/bot{config['bot_token']}/sendMessage"
+        
+        session = self._get_session()
+        async with session.post(url, json={
+            'chat_id': config['chat_id'],
+            'text': message,
+            'parse_mode': 'HTML'
+        }) as resp:
+            if resp.status != 200:
+                _raise_for_status("Telegram", resp.status, await resp.text())
+        logger.info("Telegram消息发送成功")
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, data={
-                    'title': title,
-                    'desp': message.replace('\n', '\n\n')  # Markdown格式
-                }) as resp:
-                    if resp.status == 200:
-                        result = await resp.json()
-                        if result.get('code') == 0:
-                            logger.info("微信消息发送成功")
-                        else:
-                            logger.error(f"微信发送失败: {result}")
-                    else:
-                        logger.error(f"微信发送失败: {resp.status}")
-        except Exception as e:
-            logger.error(f"微信发送异常: {e}")
+    @_http_retry
+    async def _send_wechat(self, title: str, message: str):
+        """发送微信消息（通过Server酱），失败时抛出异常"""
+        config = self.config['wechat']
+        url = f"https://sctapi.ftqq.com/{config['sendkey']}.send"
+        
+        session = self._get_session()
+        async with session.post(url, data={
+            'title': title,
+            'desp': message.replace('\n', '\n\n')  # Markdown格式
+        }) as resp:
+            if resp.status != 200:
+                _raise_for_status("微信", resp.status, await resp.text())
+            result = await resp.json()
+        if result.get('code') != 0:
+            raise ChannelError(f"微信发送失败: {result}")
+        logger.info("微信消息发送成功")
             
+    @_smtp_retry
     async def _send_email(self, subject_or_signal, body_or_message: str = None):
         """发送邮件通知
         支持两种调用方式：
         1. _send_email(signal, message) - 传入信号对象
         2. _send_email(subject, body) - 直接传入标题和内容
+        失败时抛出异常
         """
-        try:
-            import aiosmtplib
-            from email.mime.text import MIMEText
-            from email.mime.multipart import MIMEMultipart
-            
-            config = self.config['email']
-            
-            import socket
-            hostname = socket.gethostname()
-            
-            msg = MIMEMultipart()
-            msg['From'] = config['username']
-            msg['To'] = config['to_address']
-            
-            # 判断调用方式
-            if hasattr(subject_or_signal, 'signal_type'):
-                # 传入的是signal对象
-                signal = subject_or_signal
-                msg['Subject'] = f"[{hostname[:4]}] ETH交易信号: {signal.signal_type.value} 强度{signal.strength}"
-                
-                html = f"""
-                <html>
-                <body style="font-family: Arial, sans-serif;">
-                <h2>{'🟢' if '买' in signal.signal_type.value else '🔴'} ETH/USDT 交易信号</h2>
-                <table style="border-collapse: collapse; width: 100%;">
-                    <tr><td style="padding: 8px; border: 1px solid #ddd;"><b>信号类型</b></td><td style="padding: 8px; border: 1px solid #ddd;">{signal.signal_type.value}</td></tr>
-                    <tr><td style="padding: 8px; border: 1px solid #ddd;"><b>信号强度</b></td><td style="padding: 8px; border: 1px solid #ddd;">{signal.strength}/100</td></tr>
-                    <tr><td style="padding: 8px; border: 1px solid #ddd;"><b>当前价格</b></td><td style="padding: 8px; border: 1px solid #ddd;">${signal.price:.2f}</td></tr>
-                    <tr><td style="padding: 8px; border: 1px solid #ddd;"><b>止损价位</b></td><td style="padding: 8px; border: 1px solid #ddd;">${signal.stop_loss:.2f}</td></tr>
-                    <tr><td style="padding: 8px; border: 1px solid #ddd;"><b>止盈价位</b></td><td style="padding: 8px; border: 1px solid #ddd;">${signal.take_profit:.2f}</td></tr>
-                </table>
-                <h3>信号依据:</h3>
-                <ul>
-                {''.join(f'<li>{r}</li>' for r in signal.reasons[:10])}
-                </ul>
-                <p style="color: red;"><b>⚠️ 风险提示: 此为系统自动分析，仅供参考！</b></p>
-                </body>
-                </html>
-                """
-            else:
-                # 传入的是subject和body
-                msg['Subject'] = f"[{hostname[:4]}] {subject_or_signal}"
-                html = body_or_message
-            
-            msg.attach(MIMEText(html, 'html'))
+        config = self.config['email']
+        
+        msg = MIMEMultipart()
+        msg['From'] = config['username']
+        msg['To'] = config['to_address']
+        
+        # 判断调用方式
+        if hasattr(subject_or_signal, 'signal_type'):
+            # 传入的是signal对象
+            signal = subject_or_signal
+            msg['Subject'] = f"{_HOST_TAG} ETH交易信号: {signal.signal_type.value} 强度{signal.strength}"
             
-            # QQ邮箱使用SSL端口465
-            if config.get('use_ssl', False) or config['smtp_port'] == 465:
-                await aiosmtplib.send(
-                    msg,
-                    hostname=config['smtp_server'],
-                    port=config['smtp_port'],
-                    username=config['username'],
-                    password=config['password'],
-                    use_tls=True  # SSL直连
-                )
-            else:
-                await aiosmtplib.send(
-                    msg,
-                    hostname=config['smtp_server'],
-                    port=config['smtp_port'],
-                    username=config['username'],
-                    password=config['password'],
-                    start_tls=True  # STARTTLS
-                )
-            logger.info("邮件发送成功")
-        except Exception as e:
-            logger.error(f"邮件发送异常: {e}")
+            html = _EMAIL_HTML_TMPL.format_map({
+                'emoji': _EMOJI.get(signal.signal_type.name, "🔴"),
+                'signal_type': signal.signal_type.value,
+                'strength': signal.strength,
+                'price': signal.price,
+                'stop_loss': signal.stop_loss,
+                'take_profit': signal.take_profit,
+                'reasons': ''.join(f'<li>{r}</li>' for r in signal.reasons[:10])
+            })
+        else:
+            # 传入的是subject和body
+            msg['Subject'] = f"{_HOST_TAG} {subject_or_signal}"
+            html = body_or_message
+        
+        msg.attach(MIMEText(html, 'html'))
+        
+        await self._smtp_send(msg)
+        logger.info("邮件发送成功")
             
     async def send_test(self):
         """发送测试消息"""
         test_msg = "🔔 ETH交易信号系统测试消息\n\n系统已成功启动，通知功能正常！"
         
-        tasks = []
-        if self.config['telegram']['enabled']:
-            tasks.append(self._send_telegram(test_msg))
-        if self.config['wechat']['enabled']:
-            async with aiohttp.ClientSession() as session:
-                url = f"https://sctapi.ftqq.com/{self.config['wechat']['sendkey']}.send"
-                tasks.append(session.post(url, data={'title': '系统测试', 'desp': test_msg}))
-        if self.config['email']['enabled']:
-            tasks.append(self._send_test_email())
+        sends = {}
+        if self._enabled['telegram']:
+            sends['telegram'] = self._send_telegram(test_msg)
+        if self._enabled['wechat']:
+            sends['wechat'] = self._send_wechat('系统测试', test_msg)
+        if self._enabled['email']:
+            sends['email'] = self._send_test_email()
                 
-        if tasks:
-            await asyncio.gather(*tasks, return_exceptions=True)
+        if sends:
+            await self._fan_out(sends)
             logger.info("测试消息已发送")
             
+    @_smtp_retry
     async def _send_test_email(self):
-        """发送测试邮件"""
-        try:
-            import aiosmtplib
-            from email.mime.text import MIMEText
-            
-            config = self.config['email']
-            
-            import socket
-            hostname = socket.gethostname()
-            
-            msg = MIMEText(f"🔔 ETH交易信号系统测试\n\n系统已成功启动，邮件通知功能正常！\n\n服务器: {hostname}\n\n当出现交易信号时，您将收到邮件通知。", 'plain', 'utf-8')
-            msg['From'] = config['username']
-            msg['To'] = config['to_address']
-            msg['Subject'] = f"[{hostname[:4]}] ETH交易信号系统 - 测试邮件"
-            
-            # QQ邮箱使用SSL端口465
-            if config.get('use_ssl', False) or config['smtp_port'] == 465:
-                await aiosmtplib.send(
-                    msg,
-                    hostname=config['smtp_server'],
-                    port=config['smtp_port'],
-                    username=config['username'],
-                    password=config['password'],
-                    use_tls=True  # SSL直连
-                )
-            else:
-                await aiosmtplib.send(
-                    msg,
-                    hostname=config['smtp_server'],
-                    port=config['smtp_port'],
-                    username=config['username'],
-                    password=config['password'],
-                    start_tls=True  # STARTTLS
-                )
-            logger.info("测试邮件发送成功")
-        except Exception as e:
-            logger.error(f"测试邮件发送异常: {e}")
+        """发送测试邮件，失败时抛出异常"""
+        config = self.config['email']
+        
+        msg = MIMEText(f"🔔 ETH交易信号系统测试\n\n系统已成功启动，邮件通知功能正常！\n\n服务器: {_HOSTNAME}\n\n当出现交易信号时，您将收到邮件通知。", 'plain', 'utf-8')
+        msg['From'] = config['username']
+        msg['To'] = config['to_address']
+        msg['Subject'] = f"{_HOST_TAG} ETH交易信号系统 - 测试邮件"
+        
+        await self._smtp_send(msg)
+        logger.info("测试邮件发送成功")
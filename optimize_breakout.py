@@ -3,177 +3,287 @@
 突破策略参数优化
 """
 import asyncio
-import yaml
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
 import numpy as np
-import pandas as pd
 from loguru import logger
 import sys
 from itertools import product
 
-from data_fetcher import DataFetcher
+from data_fetcher import close_shared_fetcher, get_fetcher
 from strategy_breakout import SignalType
+from backtest_core import max_drawdown, load_config
+from jit_utils import njit
 
 
-def calculate_indicators_vectorized(df):
-    """向量化计算所有指标"""
-    close = df['close']
-    high = df['high']
-    low = df['low']
-    volume = df['volume']
-    
-    # ATR
-    tr = pd.concat([
-        high - low,
-        (high - close.shift()).abs(),
-        (low - close.shift()).abs()
-    ], axis=1).max(axis=1)
-    df['atr'] = tr.rolling(14).mean()
-    
-    # Bollinger Bands
-    bb_mid = close.rolling(20).mean()
-    bb_std = close.rolling(20).std()
-    df['bb_upper'] = bb_mid + 2 * bb_std
-    df['bb_lower'] = bb_mid - 2 * bb_std
-    df['bb_pband'] = (close - df['bb_lower']) / (df['bb_upper'] - df['bb_lower'])
-    
-    # 20日高低点
-    df['high_20'] = high.rolling(20).max()
-    df['low_20'] = low.rolling(20).min()
-    
-    # 成交量比率
-    df['volume_ma'] = volume.rolling(20).mean()
-    df['volume_ratio'] = volume / df['volume_ma']
-    
-    # ADX
-    plus_dm = high.diff()
-    minus_dm = -low.diff()
-    plus_dm = plus_dm.where((plus_dm > minus_dm) & (plus_dm > 0), 0)
-    minus_dm = minus_dm.where((minus_dm > plus_dm) & (minus_dm > 0), 0)
-    
-    atr14 = tr.rolling(14).mean()
-    df['di_plus'] = 100 * (plus_dm.rolling(14).mean() / atr14)
-    df['di_minus'] = 100 * (minus_dm.rolling(14).mean() / atr14)
-    dx = 100 * (df['di_plus'] - df['di_minus']).abs() / (df['di_plus'] + df['di_minus'])
-    df['adx'] = dx.rolling(14).mean()
-    
-    # RSI
-    delta = close.diff()
-    gain = delta.where(delta > 0, 0).rolling(14).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(14).mean()
-    rs = gain / loss
-    df['rsi'] = 100 - (100 / (1 + rs))
-    
-    # EMA
-    df['ema_9'] = close.ewm(span=9).mean()
-    df['ema_21'] = close.ewm(span=21).mean()
+# 滚动均值状态的列：观测数, 和
+_WINDOW_STATE_SIZE = 2
+
+
+@njit(cache=True)
+def _rolling_mean_step(state, x_out, x_in, window):
+    """滚动均值推进一根K线：移出 x_out、加入 x_in（NaN不计入），窗口内观测数不足 window 时为NaN"""
+    if not np.isnan(x_out):
+        state[0] -= 1
+        state[1] -= x_out
+    if not np.isnan(x_in):
+        state[0] += 1
+        state[1] += x_in
+    if state[0] < window:
+        return np.nan
+    return state[1] / state[0]
+
+
+@njit(cache=True)
+def _rolling_std_step(state, x_out, x_in, window):
+    """滚动标准差(ddof=1)推进一根K线，Welford在线更新，state 为 (观测数, 均值, 偏差平方和)"""
+    if not np.isnan(x_out):
+        state[0] -= 1
+        if state[0]:
+            delta = x_out - state[1]
+            state[1] -= delta / state[0]
+            state[2] -= delta * (x_out - state[1])
+        else:
+            state[1] = 0.0
+            state[2] = 0.0
+    if not np.isnan(x_in):
+        state[0] += 1
+        delta = x_in - state[1]
+        state[1] += delta / state[0]
+        state[2] += delta * (x_in - state[1])
+    
+    nobs = state[0]
+    if nobs < window or nobs <= 1:
+        return np.nan
+    return np.sqrt(max(state[2] / (nobs - 1), 0.0))
+
+
+@njit(cache=True)
+def _ewm_step(state, x, alpha):
+    """ewm(alpha).mean()（adjust=True）推进一根K线，state 为 (加权和, 权重和)"""
+    state[0] = state[0] * (1.0 - alpha) + x
+    state[1] = state[1] * (1.0 - alpha) + 1.0
+    return state[0] / state[1]
+
+
+@njit(cache=True, error_model='numpy')
+def _compute_indicators(high, low, close, volume):
+    """一次遍历K线算出全部指标，各窗口用在线滚动状态维护，20周期高低点用单调队列
+    
+    返回 (atr, bb_upper, bb_lower, bb_pband, high_20, low_20, volume_ma, volume_ratio,
+          di_plus, di_minus, adx, rsi, ema_9, ema_21)
+    滚动和、方差按在线更新累积，与逐列调用pandas的结果在浮点误差内一致（相对误差约1e-9），
+    参数搜索只比较各组合的优劣，不要求逐位相同
+    """
+    n = len(close)
+    atr = np.empty(n)
+    bb_upper = np.empty(n)
+    bb_lower = np.empty(n)
+    bb_pband = np.empty(n)
+    high_20 = np.empty(n)
+    low_20 = np.empty(n)
+    volume_ma = np.empty(n)
+    volume_ratio = np.empty(n)
+    di_plus = np.empty(n)
+    di_minus = np.empty(n)
+    adx = np.empty(n)
+    rsi = np.empty(n)
+    ema_9 = np.empty(n)
+    ema_21 = np.empty(n)
+    
+    # 需要移出窗口的中间序列
+    tr = np.empty(n)
+    plus_dm = np.empty(n)
+    minus_dm = np.empty(n)
+    gain = np.empty(n)
+    loss = np.empty(n)
+    dx = np.empty(n)
+    
+    # 各滚动均值的状态：0 TR, 1 +DM, 2 -DM, 3 DX, 4 涨幅, 5 跌幅, 6 布林中轨, 7 成交量
+    states = np.zeros((8, _WINDOW_STATE_SIZE))
+    # 布林标准差的状态
+    var_state = np.zeros(3)
+    ema_states = np.zeros((2, 2))
+    alpha_9 = 1.0 / (1.0 + (9 - 1) / 2.0)
+    alpha_21 = 1.0 / (1.0 + (21 - 1) / 2.0)
+    
+    # 20周期高低点的单调队列（存K线下标），队首即窗口内的最高/最低
+    max_queue = np.empty(n, dtype=np.int64)
+    min_queue = np.empty(n, dtype=np.int64)
+    max_head = max_tail = min_head = min_tail = 0
+    
+    for i in range(n):
+        c = close[i]
+        h = high[i]
+        l = low[i]
+        
+        # TR / DM / 涨跌幅，首根K线没有前值：TR取高低差，其余取0
+        if i == 0:
+            tr[i] = h - l
+            plus_dm[i] = 0.0
+            minus_dm[i] = 0.0
+            gain[i] = 0.0
+            loss[i] = 0.0
+        else:
+            prev_close = close[i - 1]
+            tr[i] = max(h - l, abs(h - prev_close), abs(l - prev_close))
+            up = h - high[i - 1]
+            down = -(l - low[i - 1])
+            plus_dm[i] = up if up > down and up > 0 else 0.0
+            minus_dm[i] = down if down > plus_dm[i] and down > 0 else 0.0
+            delta = c - prev_close
+            gain[i] = delta if delta > 0 else 0.0
+            loss[i] = -delta if delta < 0 else 0.0
+        
+        out14 = i - 14
+        out20 = i - 20
+        
+        # ATR 与 DI
+        atr[i] = _rolling_mean_step(states[0], tr[out14] if out14 >= 0 else np.nan, tr[i], 14)
+        di_plus[i] = 100 * (_rolling_mean_step(states[1], plus_dm[out14] if out14 >= 0 else np.nan, plus_dm[i], 14) / atr[i])
+        di_minus[i] = 100 * (_rolling_mean_step(states[2], minus_dm[out14] if out14 >= 0 else np.nan, minus_dm[i], 14) / atr[i])
+        dx[i] = 100 * abs(di_plus[i] - di_minus[i]) / (di_plus[i] + di_minus[i])
+        adx[i] = _rolling_mean_step(states[3], dx[out14] if out14 >= 0 else np.nan, dx[i], 14)
+        
+        # RSI
+        rs = (_rolling_mean_step(states[4], gain[out14] if out14 >= 0 else np.nan, gain[i], 14) /
+              _rolling_mean_step(states[5], loss[out14] if out14 >= 0 else np.nan, loss[i], 14))
+        rsi[i] = 100 - (100 / (1 + rs))
+        
+        # 布林带
+        c_out = close[out20] if out20 >= 0 else np.nan
+        bb_mid = _rolling_mean_step(states[6], c_out, c, 20)
+        bb_std = _rolling_std_step(var_state, c_out, c, 20)
+        bb_upper[i] = bb_mid + 2 * bb_std
+        bb_lower[i] = bb_mid - 2 * bb_std
+        bb_pband[i] = (c - bb_lower[i]) / (bb_upper[i] - bb_lower[i])
+        
+        # 成交量比率
+        volume_ma[i] = _rolling_mean_step(states[7], volume[out20] if out20 >= 0 else np.nan, volume[i], 20)
+        volume_ratio[i] = volume[i] / volume_ma[i]
+        
+        # 20周期高低点
+        while max_tail > max_head and high[max_queue[max_tail - 1]] <= h:
+            max_tail -= 1
+        max_queue[max_tail] = i
+        max_tail += 1
+        if max_queue[max_head] <= out20:
+            max_head += 1
+        while min_tail > min_head and low[min_queue[min_tail - 1]] >= l:
+            min_tail -= 1
+        min_queue[min_tail] = i
+        min_tail += 1
+        if min_queue[min_head] <= out20:
+            min_head += 1
+        high_20[i] = high[max_queue[max_head]] if i >= 19 else np.nan
+        low_20[i] = low[min_queue[min_head]] if i >= 19 else np.nan
+        
+        # EMA
+        ema_9[i] = _ewm_step(ema_states[0], c, alpha_9)
+        ema_21[i] = _ewm_step(ema_states[1], c, alpha_21)
     
+    return (atr, bb_upper, bb_lower, bb_pband, high_20, low_20, volume_ma, volume_ratio,
+            di_plus, di_minus, adx, rsi, ema_9, ema_21)
+
+
+# _compute_indicators 输出对应的列名
+INDICATOR_COLUMNS = (
+    'atr', 'bb_upper', 'bb_lower', 'bb_pband', 'high_20', 'low_20', 'volume_ma', 'volume_ratio',
+    'di_plus', 'di_minus', 'adx', 'rsi', 'ema_9', 'ema_21'
+)
+
+
+def calculate_indicators_vectorized(df):
+    """计算所有指标（单次遍历的JIT内核），结果写回df的各列"""
+    outputs = _compute_indicators(
+        *(df[col].to_numpy(dtype=np.float64) for col in ('high', 'low', 'close', 'volume'))
+    )
+    for col, values in zip(INDICATOR_COLUMNS, outputs):
+        df[col] = values
     return df
 
 
-def detect_breakout(row, params):
-    """检测突破信号"""
-    score = 0
-    breakout_level = row['close']
-    price = row['close']
-    
-    bb_pband = row['bb_pband']
-    high_20 = row['high_20']
-    low_20 = row['low_20']
-    adx = row['adx']
-    volume_ratio = row['volume_ratio']
-    
-    vol_threshold = params.get('vol_threshold', 1.2)
-    adx_threshold = params.get('adx_threshold', 20)
-    bb_breakout_threshold = params.get('bb_breakout', 1.0)
-    
-    # 成交量确认
-    if volume_ratio < vol_threshold:
-        return {'valid': False, 'score': 0, 'breakout_level': price}
-    
-    up_breakout = False
-    down_breakout = False
-    
-    # 向上突破
-    if bb_pband > bb_breakout_threshold:
-        score += 40
-        breakout_level = row['bb_upper']
-        up_breakout = True
-    
-    if price > high_20 * 0.998:
-        score += 35
-        breakout_level = high_20
-        up_breakout = True
-    
-    # 向下突破
-    if bb_pband < (1 - bb_breakout_threshold):
-        score -= 40
-        breakout_level = row['bb_lower']
-        down_breakout = True
-    
-    if price < low_20 * 1.002:
-        score -= 35
-        breakout_level = low_20
-        down_breakout = True
-    
-    # ADX确认
-    if adx > adx_threshold:
-        if up_breakout:
-            score += 20
-        elif down_breakout:
-            score -= 20
-    
-    return {
-        'valid': up_breakout or down_breakout,
-        'score': score,
-        'breakout_level': breakout_level
-    }
+# 回测用到的指标列
+BACKTEST_COLUMNS = (
+    'close', 'high', 'low', 'atr', 'bb_pband', 'bb_upper', 'bb_lower',
+    'high_20', 'low_20', 'adx', 'volume_ratio'
+)
 
 
-def run_backtest_fast(df, params, leverage=20, position_size=0.10):
-    """快速回测"""
-    trades = []
-    position = None
-    initial_capital = 10000
+def detect_breakout(arrays, vol_threshold, adx_threshold, bb_breakout_threshold):
+    """向量化检测每根K线的突破信号，返回 (是否有效, 分数, 突破位) 三个数组，突破位只在有效的K线上有意义
+    只依赖成交量/ADX/布林突破三个阈值，参数搜索中相同阈值的组合共用结果
+    """
+    price = arrays['close']
+    
+    # 成交量确认（NaN不算量能不足，与逐根比较的结果一致）
+    vol_ok = ~(arrays['volume_ratio'] < vol_threshold)
+    
+    # 向上/向下突破
+    up_bb = arrays['bb_pband'] > bb_breakout_threshold
+    up_hi = price > arrays['high_20'] * 0.998
+    dn_bb = arrays['bb_pband'] < (1 - bb_breakout_threshold)
+    dn_lo = price < arrays['low_20'] * 1.002
+    up_breakout = up_bb | up_hi
+    down_breakout = dn_bb | dn_lo
+    
+    score = 40 * up_bb + 35 * up_hi - 40 * dn_bb - 35 * dn_lo
+    
+    # ADX确认，同时突破上下轨时按向上处理
+    adx_ok = arrays['adx'] > adx_threshold
+    score += 20 * (adx_ok & up_breakout) - 20 * (adx_ok & ~up_breakout & down_breakout)
+    
+    # 突破位按 上轨 -> 20日高点 -> 下轨 -> 20日低点 的顺序，后满足的条件覆盖前面的
+    breakout_level = np.select(
+        [dn_lo, dn_bb, up_hi, up_bb],
+        [arrays['low_20'], arrays['bb_lower'], arrays['high_20'], arrays['bb_upper']],
+        price
+    )
+    
+    valid = vol_ok & (up_breakout | down_breakout)
+    score = np.where(vol_ok, score, 0)
+    return valid, score, breakout_level
+
+
+@njit(cache=True)
+def _walk(close, high, low, atr, bar_ok, valid, score, breakout_level, entry_threshold, sl_mult, tp_mult,
+          leverage, position_size, initial_capital, trade_pnl_pct, trade_pnl):
+    """逐根K线模拟开平仓，成交写入 trade_pnl_pct(%)/trade_pnl，返回 (成交笔数, 最终资金)
+    bar_ok 为False（ATR缺失或波动过大/过小）的K线既不平仓也不开仓
+    """
+    n = len(close)
     capital = initial_capital
+    n_trades = 0
     
-    entry_threshold = params.get('entry_threshold', 50)
-    sl_mult = params.get('sl_mult', 0.5)
-    tp_mult = params.get('tp_mult', 2.0)
+    in_position = False
+    direction = 0
+    entry_price = 0.0
+    stop_loss = 0.0
+    take_profit = 0.0
     
-    for i in range(50, len(df)):
-        row = df.iloc[i]
-        price = row['close']
-        atr = row['atr']
-        
-        if pd.isna(atr) or atr / price * 100 > 4 or atr / price * 100 < 0.3:
+    for i in range(50, n):
+        if not bar_ok[i]:
             continue
         
-        # 检查平仓
-        if position:
-            exit_reason = None
-            exit_price = None
-            
-            if position['direction'] == 'long':
-                if row['low'] <= position['stop_loss']:
-                    exit_price = position['stop_loss']
-                    exit_reason = "止损"
-                elif row['high'] >= position['take_profit']:
-                    exit_price = position['take_profit']
-                    exit_reason = "止盈"
-            else:
-                if row['high'] >= position['stop_loss']:
-                    exit_price = position['stop_loss']
-                    exit_reason = "止损"
-                elif row['low'] <= position['take_profit']:
-                    exit_price = position['take_profit']
-                    exit_reason = "止盈"
+        price = close[i]
+        bar_atr = atr[i]
+        
+        # 检查平仓（同一根K线都触及时按止损处理），direction为±1，多空按符号统一比较
+        if in_position:
+            adverse = low[i] if direction > 0 else high[i]
+            favorable = high[i] if direction > 0 else low[i]
+            hit = False
+            exit_price = 0.0
+            if direction * (adverse - stop_loss) <= 0:
+                exit_price = stop_loss
+                hit = True
+            elif direction * (favorable - take_profit) >= 0:
+                exit_price = take_profit
+                hit = True
             
-            if exit_reason:
-                if position['direction'] == 'long':
-                    pnl_pct = (exit_price - position['entry_price']) / position['entry_price']
-                else:
-                    pnl_pct = (position['entry_price'] - exit_price) / position['entry_price']
-                
+            if hit:
+                pnl_pct = direction * (exit_price - entry_price) / entry_price
                 pnl_pct_leveraged = pnl_pct * leverage * position_size
                 pnl = capital * pnl_pct_leveraged
                 
@@ -181,76 +291,134 @@ def run_backtest_fast(df, params, leverage=20, position_size=0.10):
                     pnl = -capital * position_size
                 
                 capital += pnl
-                trades.append({'pnl_pct': pnl_pct_leveraged * 100, 'pnl': pnl, 'exit_reason': exit_reason})
-                position = None
+                trade_pnl_pct[n_trades] = pnl_pct_leveraged * 100
+                trade_pnl[n_trades] = pnl
+                n_trades += 1
+                in_position = False
                 
                 if capital <= 0:
                     break
         
         # 开仓
-        if not position and capital > 0:
-            breakout = detect_breakout(row, params)
-            if not breakout['valid']:
-                continue
-            
-            score = breakout['score']
-            if abs(score) < entry_threshold:
+        if not in_position and capital > 0:
+            if not valid[i] or abs(score[i]) < entry_threshold:
                 continue
             
-            direction = 'long' if score > 0 else 'short'
-            bl = breakout['breakout_level']
-            
-            if direction == 'long':
-                stop_loss = bl - atr * sl_mult
-                take_profit = price + atr * tp_mult
+            bl = breakout_level[i]
+            if score[i] > 0:
+                direction = 1
+                stop_loss = bl - bar_atr * sl_mult
+                take_profit = price + bar_atr * tp_mult
             else:
-                stop_loss = bl + atr * sl_mult
-                take_profit = price - atr * tp_mult
-            
-            position = {
-                'entry_price': price,
-                'direction': direction,
-                'stop_loss': stop_loss,
-                'take_profit': take_profit
-            }
-    
-    if not trades or len(trades) < 5:
+                direction = -1
+                stop_loss = bl + bar_atr * sl_mult
+                take_profit = price - bar_atr * tp_mult
+            in_position = True
+            entry_price = price
+    
+    return n_trades, capital
+
+
+def run_backtest_fast(arrays, breakout, params, leverage=20, position_size=0.10):
+    """快速回测，arrays 为 BACKTEST_COLUMNS 各列的float64数组，breakout 为 detect_breakout 的结果"""
+    n = len(arrays['close'])
+    # 每根K线最多平仓一笔，按K线数预分配成交数组
+    trade_pnl_pct = np.empty(n)
+    trade_pnl = np.empty(n)
+    initial_capital = 10000
+    
+    # ATR过滤与参数无关，整段一次算出（NaN价格不算越界，与逐根比较一致）
+    atr_pct = arrays['atr'] / arrays['close'] * 100
+    bar_ok = ~np.isnan(arrays['atr']) & ~(atr_pct > 4) & ~(atr_pct < 0.3)
+    
+    valid, score, breakout_level = breakout
+    n_trades, capital = _walk(
+        arrays['close'], arrays['high'], arrays['low'], arrays['atr'], bar_ok, valid, score, breakout_level,
+        float(params.get('entry_threshold', 50)), float(params.get('sl_mult', 0.5)),
+        float(params.get('tp_mult', 2.0)), float(leverage), float(position_size),
+        float(initial_capital), trade_pnl_pct, trade_pnl
+    )
+    
+    if n_trades < 5:
         return None
     
-    wins = [t for t in trades if t['pnl_pct'] > 0]
-    losses = [t for t in trades if t['pnl_pct'] <= 0]
+    pnl_pct = trade_pnl_pct[:n_trades]
+    pnls = trade_pnl[:n_trades]
+    wins_mask = pnl_pct > 0
+    wins = pnl_pct[wins_mask]
+    losses = pnl_pct[~wins_mask]
+    loss_sum = losses.sum()
     
     total_return = (capital - initial_capital) / initial_capital * 100
-    win_rate = len(wins) / len(trades) * 100
-    profit_factor = abs(sum(t['pnl_pct'] for t in wins) / sum(t['pnl_pct'] for t in losses)) if losses and sum(t['pnl_pct'] for t in losses) != 0 else 0
-    
-    equity = initial_capital
-    peak = initial_capital
-    max_dd = 0
-    for t in trades:
-        equity += t['pnl']
-        peak = max(peak, equity)
-        dd = (equity - peak) / peak
-        max_dd = min(max_dd, dd)
+    win_rate = wins_mask.mean() * 100
+    profit_factor = abs(wins.sum() / loss_sum) if len(losses) and loss_sum != 0 else 0
+    
+    max_dd = max_drawdown(initial_capital, pnls)
     
     return {
         'total_return': total_return,
         'win_rate': win_rate,
         'profit_factor': profit_factor,
         'max_drawdown': max_dd * 100,
-        'trades': len(trades),
+        'trades': n_trades,
         'wins': len(wins)
     }
 
 
+# 参数优化结果，每个有效参数组合一行
+RESULT_DTYPE = np.dtype([
+    ('total_return', np.float64),
+    ('win_rate', np.float64),
+    ('profit_factor', np.float64),
+    ('max_drawdown', np.float64),
+    ('trades', np.int64),
+    ('score', np.float64)
+])
+
+
+# 子进程内共用的指标数组和按阈值缓存的突破信号，由 _init_worker 在进程启动时设置
+_worker_shm = None
+_worker_arrays = None
+_worker_breakout = {}
+
+
+def _share_arrays(arrays):
+    """把各指标列拷进一块共享内存（每列一行），返回共享内存对象和子进程挂载所需的 (名称, 形状)"""
+    n = len(arrays['close'])
+    shape = (len(BACKTEST_COLUMNS), n)
+    shm = SharedMemory(create=True, size=max(shape[0] * n * 8, 1))
+    matrix = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+    for row, col in enumerate(BACKTEST_COLUMNS):
+        matrix[row] = arrays[col]
+    return shm, (shm.name, shape)
+
+
+def _init_worker(shm_name, shape):
+    """子进程初始化：挂载主进程的共享内存，各列直接用只读视图，不复制也不经pickle传输"""
+    global _worker_shm, _worker_arrays
+    _worker_shm = SharedMemory(name=shm_name)
+    matrix = np.ndarray(shape, dtype=np.float64, buffer=_worker_shm.buf)
+    matrix.flags.writeable = False
+    _worker_arrays = {col: matrix[row] for row, col in enumerate(BACKTEST_COLUMNS)}
+    _worker_breakout.clear()
+
+
+def _backtest_one(params):
+    """子进程入口：取（或计算）该组阈值的突破信号后回测一组参数，参数由主进程按顺序对应，不随结果传回"""
+    thresholds = (params['vol_threshold'], params['adx_threshold'], params['bb_breakout'])
+    if thresholds not in _worker_breakout:
+        _worker_breakout[thresholds] = detect_breakout(_worker_arrays, *thresholds)
+    return run_backtest_fast(_worker_arrays, _worker_breakout[thresholds], params)
+
+
 async def optimize():
-    with open('config.yaml', 'r', encoding='utf-8') as f:
-        config = yaml.safe_load(f)
+    config = load_config()
     
-    fetcher = DataFetcher(config)
-    await fetcher.init()
-    df = await fetcher.fetch_ohlcv('1h', limit=1000)
-    await fetcher.close()
+    fetcher = await get_fetcher(config)
+    try:
+        df = await fetcher.fetch_ohlcv('1h', limit=1000)
+    finally:
+        await close_shared_fetcher()
     
     if df.empty or len(df) < 100:
         print("数据不足")
@@ -277,28 +445,46 @@ async def optimize():
     print(f"参数组合数: {total}")
     print("\n正在优化...")
     
-    results = []
     keys = list(param_grid.keys())
-    
-    for values in product(*param_grid.values()):
-        params = dict(zip(keys, values))
-        result = run_backtest_fast(df, params)
-        if result:
-            result['params'] = params
-            results.append(result)
-    
-    if not results:
+    param_list = [dict(zip(keys, values)) for values in product(*param_grid.values())]
+    
+    # 各参数组合互不依赖，分发到多进程并行回测；指标列只取一次放进共享内存，子进程挂载后直接读取
+    arrays = {col: df[col].to_numpy(dtype=np.float64) for col in BACKTEST_COLUMNS}
+    shm, shm_spec = _share_arrays(arrays)
+    workers = os.cpu_count() or 1
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=shm_spec) as pool:
+            outputs = pool.map(_backtest_one, param_list, chunksize=max(1, len(param_list) // (workers * 4)))
+            # 结果按列存进结构化数组，参数另存一个对象数组，两者下标对应
+            results = np.zeros(len(param_list), dtype=RESULT_DTYPE)
+            params_arr = np.empty(len(param_list), dtype=object)
+            n_results = 0
+            for params, r in zip(param_list, outputs):
+                if not r:
+                    continue
+                row = results[n_results]
+                for name in RESULT_DTYPE.names[:-1]:
+                    row[name] = r[name]
+                params_arr[n_results] = params
+                n_results += 1
+    finally:
+        shm.close()
+        shm.unlink()
+    
+    if not n_results:
         print("无有效结果")
         return
+    results = results[:n_results]
+    params_arr = params_arr[:n_results]
     
     # 综合得分
-    for r in results:
-        if r['max_drawdown'] != 0:
-            r['score'] = r['total_return'] / abs(r['max_drawdown']) + r['profit_factor'] * 2
-        else:
-            r['score'] = r['profit_factor'] * 2
+    max_dd = np.abs(results['max_drawdown'])
+    results['score'] = results['profit_factor'] * 2
+    has_dd = max_dd != 0
+    results['score'][has_dd] += results['total_return'][has_dd] / max_dd[has_dd]
     
-    results.sort(key=lambda x: x['score'], reverse=True)
+    # 按得分从高到低排序，得分相同时保持参数组合的原顺序
+    order = np.argsort(-results['score'], kind='stable')
     
     print("\n" + "=" * 70)
     print("                    TOP 10 参数组合")
@@ -306,10 +492,11 @@ async def optimize():
     print(f"{'排名':<4} {'收益%':<9} {'胜率%':<8} {'盈亏比':<8} {'回撤%':<9} {'交易':<6}")
     print("-" * 70)
     
-    for i, r in enumerate(results[:10], 1):
+    for i, r in enumerate(results[order[:10]], 1):
         print(f"{i:<4} {r['total_return']:>+7.2f}%  {r['win_rate']:>6.1f}%  {r['profit_factor']:>6.2f}   {r['max_drawdown']:>7.2f}%  {r['trades']:<6}")
     
-    best = results[0]
+    best = dict(zip(RESULT_DTYPE.names, results[order[0]].tolist()))
+    best['params'] = params_arr[order[0]]
     print("\n" + "=" * 70)
     print("                    🏆 最优参数")
     print("=" * 70)
@@ -4,15 +4,15 @@
 核心思路：只在最有把握的时候交易，宁可错过也不做错
 """
 import asyncio
-import yaml
 import numpy as np
 import pandas as pd
 from loguru import logger
 import sys
 from itertools import product
 
-from data_fetcher import DataFetcher
+from data_fetcher import close_shared_fetcher, get_fetcher
 from strategy_combo import SignalType
+from backtest_core import max_drawdown, load_config
 
 
 def calculate_indicators_vectorized(df):
@@ -38,11 +38,9 @@ def calculate_indicators_vectorized(df):
     df['rsi'] = 100 - (100 / (1 + rs))
     
     # ATR
-    tr = pd.concat([
-        high - low,
-        (high - close.shift()).abs(),
-        (low - close.shift()).abs()
-    ], axis=1).max(axis=1)
+    # 三项逐元素取最大（fmax跳过首根K线前收盘的NaN），不再拼成三列DataFrame按行求最大
+    prev_close = close.shift()
+    tr = np.fmax(np.fmax(high - low, (high - prev_close).abs()), (low - prev_close).abs())
     df['atr'] = tr.rolling(14).mean()
     
     # Bollinger Bands
@@ -173,7 +171,11 @@ def get_range_signal(row, params):
 
 def run_backtest_fast(df, params, leverage=20, position_size=0.10):
     """快速回测"""
-    trades = []
+    # 每根K线最多平仓一笔，按K线数预分配成交数组，避免逐笔append
+    max_trades = len(df)
+    trade_pnl_pct = np.empty(max_trades)
+    trade_pnl = np.empty(max_trades)
+    n_trades = 0
     position = None
     initial_capital = 10000
     capital = initial_capital
@@ -221,7 +223,9 @@ def run_backtest_fast(df, params, leverage=20, position_size=0.10):
                     pnl = -capital * position_size
                 
                 capital += pnl
-                trades.append({'pnl_pct': pnl_pct_leveraged * 100, 'pnl': pnl, 'exit_reason': exit_reason})
+                trade_pnl_pct[n_trades] = pnl_pct_leveraged * 100
+                trade_pnl[n_trades] = pnl
+                n_trades += 1
                 position = None
                 
                 if capital <= 0:
@@ -261,43 +265,40 @@ def run_backtest_fast(df, params, leverage=20, position_size=0.10):
                 'take_profit': take_profit
             }
     
-    if not trades or len(trades) < 5:
+    if n_trades < 5:
         return None
     
-    wins = [t for t in trades if t['pnl_pct'] > 0]
-    losses = [t for t in trades if t['pnl_pct'] <= 0]
+    pnl_pct = trade_pnl_pct[:n_trades]
+    pnls = trade_pnl[:n_trades]
+    wins_mask = pnl_pct > 0
+    wins = pnl_pct[wins_mask]
+    losses = pnl_pct[~wins_mask]
+    loss_sum = losses.sum()
     
     total_return = (capital - initial_capital) / initial_capital * 100
-    win_rate = len(wins) / len(trades) * 100
-    profit_factor = abs(sum(t['pnl_pct'] for t in wins) / sum(t['pnl_pct'] for t in losses)) if losses and sum(t['pnl_pct'] for t in losses) != 0 else 0
-    
-    equity = initial_capital
-    peak = initial_capital
-    max_dd = 0
-    for t in trades:
-        equity += t['pnl']
-        peak = max(peak, equity)
-        dd = (equity - peak) / peak
-        max_dd = min(max_dd, dd)
+    win_rate = wins_mask.mean() * 100
+    profit_factor = abs(wins.sum() / loss_sum) if len(losses) and loss_sum != 0 else 0
+    
+    max_dd = max_drawdown(initial_capital, pnls)
     
     return {
         'total_return': total_return,
         'win_rate': win_rate,
         'profit_factor': profit_factor,
         'max_drawdown': max_dd * 100,
-        'trades': len(trades),
+        'trades': n_trades,
         'wins': len(wins)
     }
 
 
 async def optimize():
-    with open('config.yaml', 'r', encoding='utf-8') as f:
-        config = yaml.safe_load(f)
+    config = load_config()
     
-    fetcher = DataFetcher(config)
-    await fetcher.init()
-    df = await fetcher.fetch_ohlcv('1h', limit=1000)
-    await fetcher.close()
+    fetcher = await get_fetcher(config)
+    try:
+        df = await fetcher.fetch_ohlcv('1h', limit=1000)
+    finally:
+        await close_shared_fetcher()
     
     if df.empty or len(df) < 100:
         print("数据不足")
@@ -6,14 +6,15 @@ import itertools
 import pandas as pd
 import numpy as np
 from datetime import datetime
-from data_fetcher import DataFetcher
+from data_fetcher import close_shared_fetcher, get_fetcher
 import asyncio
-import yaml
 import ta
 
+from backtest_core import load_config
+from indicators import _rsi, _average_true_range
+
 # 加载配置
-with open('config.yaml', 'r') as f:
-    config = yaml.safe_load(f)
+config = load_config()
 
 # 简化参数范围
 PARAM_GRID = {
@@ -27,7 +28,9 @@ PARAM_GRID = {
 
 def backtest_params(df, params):
     """快速回测"""
-    trades = []
+    # 开仓后至少跳过10根K线，成交笔数不超过 len(df)//10+1，预分配收益数组
+    returns = np.empty(len(df) // 10 + 1)
+    n_trades = 0
     capital = 10000
     position_size = 0.1
     leverage = 20
@@ -124,26 +127,28 @@ def backtest_params(df, params):
         drawdown = (peak_capital - capital) / peak_capital
         max_drawdown = max(max_drawdown, drawdown)
         
-        trades.append(trade_return)
+        returns[n_trades] = trade_return
+        n_trades += 1
         i += 10  # 跳过一段时间避免重复信号
     
-    if not trades:
+    if not n_trades:
         return {'total_return': 0, 'win_rate': 0, 'trades': 0, 'profit_factor': 0, 'max_drawdown': 0}
     
-    wins = [t for t in trades if t > 0]
-    losses = [t for t in trades if t <= 0]
+    returns = returns[:n_trades]
+    wins_mask = returns > 0
+    losses = returns[~wins_mask]
     
     total_return = (capital - 10000) / 10000 * 100
-    win_rate = len(wins) / len(trades) * 100
+    win_rate = wins_mask.mean() * 100
     
-    total_wins = sum(wins) if wins else 0
-    total_losses = abs(sum(losses)) if losses else 0.001
+    total_wins = returns[wins_mask].sum()
+    total_losses = abs(losses.sum()) if len(losses) else 0.001
     profit_factor = total_wins / total_losses
     
     return {
         'total_return': total_return,
         'win_rate': win_rate,
-        'trades': len(trades),
+        'trades': n_trades,
         'profit_factor': profit_factor,
         'max_drawdown': max_drawdown * 100
     }
@@ -154,24 +159,28 @@ async def main():
     print("均值回归策略参数优化")
     print("=" * 70)
     
-    fetcher = DataFetcher(config)
-    await fetcher.init()
+    fetcher = await get_fetcher(config)
     
     print("获取历史数据...")
-    df = await fetcher.fetch_ohlcv('15m', limit=1500)
-    await fetcher.close()
+    try:
+        df = await fetcher.fetch_ohlcv('15m', limit=1500)
+    finally:
+        await close_shared_fetcher()
     
     if df is None or len(df) < 100:
         print("数据不足")
         return
     
     # 计算指标
-    df['rsi'] = ta.momentum.RSIIndicator(df['close'], window=14).rsi()
+    # RSI/ATR的Wilder平滑走JIT递推内核
+    close = df['close'].to_numpy(dtype=np.float64)
+    df['rsi'] = _rsi(close, 14)
     bb = ta.volatility.BollingerBands(df['close'], window=20, window_dev=2)
     df['bb_pband'] = bb.bollinger_pband()
     stoch = ta.momentum.StochasticOscillator(df['high'], df['low'], df['close'], window=14, smooth_window=3)
     df['stoch_k'] = stoch.stoch()
-    df['atr'] = ta.volatility.AverageTrueRange(df['high'], df['low'], df['close'], window=14).average_true_range()
+    df['atr'] = _average_true_range(df['high'].to_numpy(dtype=np.float64),
+                                    df['low'].to_numpy(dtype=np.float64), close, 14)
     
     df = df.dropna()
     
@@ -4,16 +4,16 @@
 测试不同参数组合，找出最优配置
 """
 import asyncio
-import yaml
 import numpy as np
 from datetime import datetime
 from loguru import logger
 import sys
+from functools import partial
 from itertools import product
 
-from data_fetcher import DataFetcher
+from data_fetcher import close_shared_fetcher, get_fetcher, to_numpy_dict
 from indicators import TechnicalIndicators
-from strategy_trend import SignalType
+from backtest_core import indicator_column, finalize_signals, simulate, max_drawdown, load_config
 
 
 class TrendStrategyOptimized:
@@ -23,232 +23,101 @@ class TrendStrategyOptimized:
         self.config = config.get('strategy', {})
         self.params = params
         
-    def analyze(self, indicators, timeframe: str):
-        if not indicators or 'price' not in indicators:
-            return None
-        
-        price = indicators['price']
-        atr = indicators.get('atr', price * 0.01)
+    def analyze_batch(self, arrays: dict) -> tuple:
+        """对整段指标序列一次性生成信号，返回与K线对齐的 (信号编码, 止损, 止盈, 强度) 数组"""
+        get = partial(indicator_column, arrays)
+        price = arrays['price']
+        atr = get('atr', price * 0.01)
         atr_pct = atr / price * 100
         
-        if atr_pct > 4 or atr_pct < 0.2:
-            return None
-        
-        trend = self._get_main_trend(indicators)
-        if trend == 'neutral':
-            return None
-        
-        entry_signal = self._check_pullback_entry(indicators, trend)
-        if not entry_signal['valid']:
-            return None
-        
-        momentum_ok = self._check_momentum(indicators, trend)
-        if not momentum_ok:
-            return None
-        
-        total_score = entry_signal['score']
-        threshold = self.params.get('entry_threshold', 40)
-        
-        if abs(total_score) < threshold:
-            return None
-        
-        signal_type = self._get_signal_type(total_score)
-        if signal_type == SignalType.NEUTRAL:
-            return None
-        
-        # 使用参数化的止盈止损
-        sl_mult = self.params.get('sl_mult', 1.0)
-        tp_mult = self.params.get('tp_mult', 1.5)
-        
-        if total_score > 0:
-            stop_loss = price - atr * sl_mult
-            take_profit = price + atr * tp_mult
-        else:
-            stop_loss = price + atr * sl_mult
-            take_profit = price - atr * tp_mult
-        
-        return {
-            'signal_type': signal_type,
-            'strength': min(100, abs(int(total_score))),
-            'price': price,
-            'stop_loss': round(stop_loss, 2),
-            'take_profit': round(take_profit, 2)
-        }
-    
-    def _get_main_trend(self, ind: dict) -> str:
-        price = ind['price']
-        ma20 = ind.get('ma_20', price)
-        ma50 = ind.get('ma_50', price)
-        ema9 = ind.get('ema_9', price)
-        ema21 = ind.get('ema_21', price)
-        adx = ind.get('adx', 20)
-        
-        adx_threshold = self.params.get('adx_threshold', 20)
-        if adx < adx_threshold:
-            return 'neutral'
-        
-        up_count = 0
-        down_count = 0
-        
-        if price > ma20: up_count += 1
-        else: down_count += 1
-        if price > ma50: up_count += 1
-        else: down_count += 1
-        if ema9 > ema21: up_count += 1
-        else: down_count += 1
-        if ma20 > ma50: up_count += 1
-        else: down_count += 1
-        
+        # 1. 主趋势
+        ma20 = get('ma_20', price)
+        ma50 = get('ma_50', price)
+        ema9 = get('ema_9', price)
+        ema21 = get('ema_21', price)
+        adx = get('adx', 20)
+        up_count = (price > ma20).astype(int) + (price > ma50) + (ema9 > ema21) + (ma20 > ma50)
+        has_trend = ~(adx < self.params.get('adx_threshold', 20))
         trend_confirm = self.params.get('trend_confirm', 3)
-        if up_count >= trend_confirm:
-            return 'up'
-        elif down_count >= trend_confirm:
-            return 'down'
-        return 'neutral'
-    
-    def _check_pullback_entry(self, ind: dict, trend: str) -> dict:
-        score = 0
-        reasons = []
-        
-        price = ind['price']
-        rsi = ind.get('rsi', 50)
-        bb_pband = ind.get('bb_pband', 0.5)
-        ema21 = ind.get('ema_21', price)
-        k = ind.get('stoch_k', 50)
+        up = has_trend & (up_count >= trend_confirm)
+        down = has_trend & ~up & (4 - up_count >= trend_confirm)
         
+        # 2. 回调入场点
+        rsi = get('rsi', 50)
+        bb_pband = get('bb_pband', 0.5)
+        k = get('stoch_k', 50)
         rsi_low = self.params.get('rsi_pullback_low', 35)
         rsi_high = self.params.get('rsi_pullback_high', 50)
+        near_ema21 = np.abs(price - ema21) / ema21 < 0.01
+        up_score = (
+            30 * ((rsi_low <= rsi) & (rsi <= rsi_high))
+            + 25 * ((0.3 <= bb_pband) & (bb_pband <= 0.6))
+            + 25 * near_ema21
+            + 20 * ((30 <= k) & (k <= 50))
+        )
+        down_score = -(
+            30 * (((100 - rsi_high) <= rsi) & (rsi <= (100 - rsi_low)))
+            + 25 * ((0.4 <= bb_pband) & (bb_pband <= 0.7))
+            + 25 * near_ema21
+            + 20 * ((50 <= k) & (k <= 70))
+        )
+        total_score = np.where(up, up_score, np.where(down, down_score, 0))
+        
+        # 3. 动量确认
+        macd_hist = get('macd_hist', 0)
+        di_plus = get('di_plus', 0)
+        di_minus = get('di_minus', 0)
+        momentum_ok = np.where(
+            up,
+            (macd_hist > 0) | (di_plus > di_minus),
+            (macd_hist < 0) | (di_minus > di_plus)
+        )
+        
+        valid = (
+            ~((atr_pct > 4) | (atr_pct < 0.2))
+            & (up | down)
+            & momentum_ok
+            & ~(np.abs(total_score) < self.params.get('entry_threshold', 40))
+        )
         
-        if trend == 'up':
-            if rsi_low <= rsi <= rsi_high:
-                score += 30
-            if 0.3 <= bb_pband <= 0.6:
-                score += 25
-            if abs(price - ema21) / ema21 < 0.01:
-                score += 25
-            if 30 <= k <= 50:
-                score += 20
-        else:
-            if (100 - rsi_high) <= rsi <= (100 - rsi_low):
-                score -= 30
-            if 0.4 <= bb_pband <= 0.7:
-                score -= 25
-            if abs(price - ema21) / ema21 < 0.01:
-                score -= 25
-            if 50 <= k <= 70:
-                score -= 20
-        
-        return {'valid': abs(score) >= self.params.get('entry_threshold', 40), 'score': score, 'reasons': reasons}
-    
-    def _check_momentum(self, ind: dict, trend: str) -> bool:
-        macd_hist = ind.get('macd_hist', 0)
-        di_plus = ind.get('di_plus', 0)
-        di_minus = ind.get('di_minus', 0)
-        
-        if trend == 'up':
-            return macd_hist > 0 or di_plus > di_minus
-        else:
-            return macd_hist < 0 or di_minus > di_plus
-    
-    def _get_signal_type(self, score: float) -> SignalType:
-        if score >= 60:
-            return SignalType.STRONG_BUY
-        elif score >= 40:
-            return SignalType.BUY
-        elif score <= -60:
-            return SignalType.STRONG_SELL
-        elif score <= -40:
-            return SignalType.SELL
-        return SignalType.NEUTRAL
+        # 使用参数化的止盈止损
+        sl_mult = self.params.get('sl_mult', 1.0)
+        tp_mult = self.params.get('tp_mult', 1.5)
+        long = total_score > 0
+        stop_loss = np.where(long, price - atr * sl_mult, price + atr * sl_mult)
+        take_profit = np.where(long, price + atr * tp_mult, price - atr * tp_mult)
+        return finalize_signals(valid, total_score.astype(np.float64), stop_loss, take_profit, 60, 40)
 
 
-async def run_backtest(df, indicators_calc, params, leverage=20, position_size=0.10):
-    """运行单次回测"""
+async def run_backtest(df, indicator_arrays, params, leverage=20, position_size=0.10):
+    """运行单次回测，indicator_arrays 为整段K线预先算好的指标序列"""
     strategy = TrendStrategyOptimized({}, params)
-    
-    trades = []
-    position = None
     initial_capital = 10000
-    capital = initial_capital
     
-    for i in range(50, len(df)):
-        current_bar = df.iloc[i]
-        current_time = df.index[i]
-        current_price = current_bar['close']
-        
-        historical = df.iloc[:i+1].copy()
-        ind = indicators_calc.calculate_all(historical)
-        
-        if not ind:
-            continue
-        
-        if position:
-            exit_reason = None
-            exit_price = None
-            
-            if position['direction'] == 'long':
-                if current_bar['low'] <= position['stop_loss']:
-                    exit_price = position['stop_loss']
-                    exit_reason = "止损"
-                elif current_bar['high'] >= position['take_profit']:
-                    exit_price = position['take_profit']
-                    exit_reason = "止盈"
-            else:
-                if current_bar['high'] >= position['stop_loss']:
-                    exit_price = position['stop_loss']
-                    exit_reason = "止损"
-                elif current_bar['low'] <= position['take_profit']:
-                    exit_price = position['take_profit']
-                    exit_reason = "止盈"
-            
-            if exit_reason:
-                if position['direction'] == 'long':
-                    pnl_pct = (exit_price - position['entry_price']) / position['entry_price']
-                else:
-                    pnl_pct = (position['entry_price'] - exit_price) / position['entry_price']
-                
-                pnl_pct_leveraged = pnl_pct * leverage * position_size
-                pnl = capital * pnl_pct_leveraged
-                
-                if pnl_pct * leverage <= -1:
-                    pnl = -capital * position_size
-                
-                capital += pnl
-                trades.append({'pnl_pct': pnl_pct_leveraged * 100, 'pnl': pnl, 'exit_reason': exit_reason})
-                position = None
-                
-                if capital <= 0:
-                    break
-        
-        if not position and capital > 0:
-            signal = strategy.analyze(ind, '1h')
-            if signal and signal['signal_type'] != SignalType.NEUTRAL:
-                direction = 'long' if signal['signal_type'] in [SignalType.BUY, SignalType.STRONG_BUY] else 'short'
-                position = {
-                    'entry_price': current_price,
-                    'direction': direction,
-                    'stop_loss': signal['stop_loss'],
-                    'take_profit': signal['take_profit']
-                }
+    # 信号只取决于指标序列，整段一次性生成后由模拟内核逐根读取
+    signal_type, stop_loss, take_profit, _ = strategy.analyze_batch(indicator_arrays)
+    ohlcv = to_numpy_dict(df)
+    result = simulate(ohlcv['low'], ohlcv['high'], ohlcv['close'],
+                      signal_type, stop_loss, take_profit,
+                      initial_capital=initial_capital, leverage=leverage, position_size=position_size)
+    capital = result.capital
+    trades = result.trades
     
-    if not trades:
+    if not len(trades):
         return None
     
-    wins = [t for t in trades if t['pnl_pct'] > 0]
-    losses = [t for t in trades if t['pnl_pct'] <= 0]
+    pnl_pct = trades['pnl_pct'] * leverage * position_size * 100
+    pnls = trades['pnl']
+    wins_mask = pnl_pct > 0
+    wins = pnl_pct[wins_mask]
+    losses = pnl_pct[~wins_mask]
+    loss_sum = losses.sum()
     
     total_return = (capital - initial_capital) / initial_capital * 100
-    win_rate = len(wins) / len(trades) * 100 if trades else 0
-    profit_factor = abs(sum(t['pnl_pct'] for t in wins) / sum(t['pnl_pct'] for t in losses)) if losses and sum(t['pnl_pct'] for t in losses) != 0 else 0
+    win_rate = wins_mask.mean() * 100
+    profit_factor = abs(wins.sum() / loss_sum) if len(losses) and loss_sum != 0 else 0
     
-    equity = initial_capital
-    peak = initial_capital
-    max_dd = 0
-    for t in trades:
-        equity += t['pnl']
-        peak = max(peak, equity)
-        dd = (equity - peak) / peak
-        max_dd = min(max_dd, dd)
+    max_dd = max_drawdown(initial_capital, pnls)
     
     return {
         'total_return': total_return,
@@ -261,20 +130,22 @@ async def run_backtest(df, indicators_calc, params, leverage=20, position_size=0
 
 
 async def optimize():
-    with open('config.yaml', 'r', encoding='utf-8') as f:
-        config = yaml.safe_load(f)
+    config = load_config()
     
-    fetcher = DataFetcher(config)
-    await fetcher.init()
+    fetcher = await get_fetcher(config)
     
-    df = await fetcher.fetch_ohlcv('1h', limit=1000)
-    await fetcher.close()
+    try:
+        df = await fetcher.fetch_ohlcv('1h', limit=1000)
+    finally:
+        await close_shared_fetcher()
     
     if df.empty or len(df) < 100:
         print("数据不足")
         return
     
     indicators_calc = TechnicalIndicators(config)
+    # 指标与参数无关，所有参数组合共用一份
+    indicator_arrays = indicators_calc.calculate_all_vectorized(df)
     
     # 参数搜索空间（精简版）
     param_grid = {
@@ -300,7 +171,7 @@ async def optimize():
         params = dict(zip(keys, values))
         params['trend_confirm'] = 3
         
-        result = await run_backtest(df, indicators_calc, params)
+        result = await run_backtest(df, indicator_arrays, params)
         if result and result['trades'] >= 10:
             result['params'] = params
             results.append(result)
@@ -0,0 +1,86 @@
+"""
+可靠性工具 - 熔断器和带抖动的指数退避重试，用于各通知渠道
+"""
+import asyncio
+import functools
+import random
+import time
+
+from loguru import logger
+
+
+class CircuitBreaker:
+    """熔断器：连续失败 threshold 次后断开，cooldown 秒后放行一次试探（半开），成功则恢复"""
+
+    CLOSED = "CLOSED"
+    OPEN = "OPEN"
+    HALF_OPEN = "HALF_OPEN"
+
+    def __init__(self, threshold: int = 5, cooldown: float = 60):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        # 半开状态下放行试探调用的时间，结果记录后清空；试探超过 cooldown 仍无结果（如调用被取消）时可再放行一次
+        self.probe_at = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self) -> bool:
+        """是否放行本次调用，断开期间直接跳过，半开时只放行一次试探，结果记录前其余调用都跳过"""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        now = time.monotonic()
+        if state == self.OPEN or (self.probe_at is not None and now - self.probe_at < self.cooldown):
+            return False
+        self.probe_at = now
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probe_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        self.probe_at = None
+        # 半开状态下试探失败，或连续失败达到阈值，重新计时断开
+        if self.opened_at is not None or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+    def __str__(self):
+        return f"{self.state}(失败{self.failures})"
+
+
+def retry(max_attempts: int = 3, base: float = 0.5, cap: float = 5.0,
+          retry_on: tuple = (Exception,), give_up_on: tuple = (), timeout: float = None):
+    """异步函数重试装饰器，第n次重试前等待 uniform(0, min(cap, base*2^n)) 秒（full jitter）
+
+    只重试 retry_on 中的异常，give_up_on 中的异常（如鉴权失败）直接抛出
+    timeout 为每次尝试的时限（秒），超时按 asyncio.TimeoutError 处理
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            for attempt in range(max_attempts):
+                try:
+                    if timeout is None:
+                        return await func(*args, **kwargs)
+                    return await asyncio.wait_for(func(*args, **kwargs), timeout)
+                except give_up_on:
+                    raise
+                except retry_on as e:
+                    if attempt == max_attempts - 1:
+                        raise
+                    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+                    logger.debug(f"{func.__name__} 第{attempt + 1}次失败，{delay:.2f}秒后重试: {e!r}")
+                    await asyncio.sleep(delay)
+        return wrapper
+    return decorator
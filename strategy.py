@@ -5,6 +5,10 @@
 from typing import Dict, Any, Optional
 from dataclasses import dataclass
 from enum import Enum
+from functools import partial
+import numpy as np
+
+from backtest_core import indicator_column, finalize_signals
 
 
 class SignalType(Enum):
@@ -107,6 +111,118 @@ class TradingStrategy:
             timestamp=datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         )
     
+    def analyze_batch(self, arrays: Dict[str, np.ndarray]) -> tuple:
+        """对 calculate_all_vectorized 的整段指标序列一次性生成信号（回测用）
+        返回与K线对齐的 (信号编码, 止损, 止盈, 强度) 数组，逐根结果与 analyze 一致
+        """
+        price = arrays['price']
+        atr = indicator_column(arrays, 'atr', price * 0.01)
+        atr_pct = atr / price * 100
+        get = partial(indicator_column, arrays)
+        
+        # 市场状态
+        adx = get('adx', 25)
+        bb_width = get('bb_width', 0.03)
+        trending = (adx > 30) & (bb_width > 0.04)
+        ranging = ~trending & ((adx < 20) | (bb_width < 0.02))
+        
+        # 均值回归
+        rsi = get('rsi', 50)
+        bb_pband = get('bb_pband', 0.5)
+        k = get('stoch_k', 50)
+        d = get('stoch_d', 50)
+        mean_rev = (
+            np.select([rsi < 20, rsi < 30, rsi < 40, rsi > 80, rsi > 70, rsi > 60],
+                      [50, 35, 15, -50, -35, -15], 0)
+            + np.select([bb_pband < -0.05, bb_pband < 0.1, bb_pband > 1.05, bb_pband > 0.9],
+                        [40, 25, -40, -25], 0)
+            + np.select([(k < 15) & (d < 20) & (k > d), (k > 85) & (d > 80) & (k < d),
+                         (k < 25) & (k > d), (k > 75) & (k < d)],
+                        [35, -35, 20, -20], 0)
+        )
+        mean_rev = np.clip(mean_rev, -100, 100)
+        
+        # 趋势
+        ma20 = get('ma_20', price)
+        ma50 = get('ma_50', price)
+        ema9 = get('ema_9', price)
+        ema21 = get('ema_21', price)
+        above_count = (price > ma20).astype(int) + (price > ma50) + (price > ema21)
+        macd_hist = get('macd_hist', 0)
+        macd = get('macd', 0)
+        macd_signal = get('macd_signal', 0)
+        adx_trend = get('adx', 20)
+        di_plus = get('di_plus', 0)
+        di_minus = get('di_minus', 0)
+        strong_adx = adx_trend > 25
+        trend = (
+            np.select([ema9 > ema21 * 1.002, ema9 < ema21 * 0.998], [20, -20], 0)
+            + np.select([ma20 > ma50 * 1.005, ma20 < ma50 * 0.995], [25, -25], 0)
+            + np.select([above_count == 3, above_count == 0], [20, -20], 0)
+            + np.select([(macd_hist > 0) & (macd > macd_signal), (macd_hist < 0) & (macd < macd_signal)],
+                        [25, -25], 0)
+            + np.select([strong_adx & (di_plus > di_minus * 1.2), strong_adx & (di_minus > di_plus * 1.2)],
+                        [20, -20], 0)
+        )
+        trend = np.clip(trend, -100, 100)
+        
+        # 成交量
+        vol_ratio = get('volume_ratio', 1)
+        obv_change = get('obv_change', 0)
+        volume = (
+            np.select([vol_ratio > 2.5, vol_ratio > 1.8, vol_ratio > 1.3, vol_ratio < 0.5],
+                      [30, 20, 10, -15], 0)
+            + np.where(obv_change > 0, 15, -15)
+        )
+        volume = np.clip(volume, -50, 50)
+        
+        # 市场结构
+        s1 = get('s1', 0)
+        r1 = get('r1', 0)
+        fib_382 = get('fib_382', 0)
+        fib_618 = get('fib_618', 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            dist_s1 = (price - s1) / s1 * 100
+            dist_r1 = (price - r1) / r1 * 100
+            near_382 = np.abs(price - fib_382) / fib_382 < 0.005
+            near_618 = np.abs(price - fib_618) / fib_618 < 0.005
+        has_fib = (fib_382 > 0) & (fib_618 > 0)
+        structure = (
+            np.select([(s1 > 0) & (0 < dist_s1) & (dist_s1 < 0.8),
+                       (s1 > 0) & (-0.3 < dist_s1) & (dist_s1 <= 0)], [25, 35], 0)
+            + np.select([(r1 > 0) & (-0.8 < dist_r1) & (dist_r1 < 0),
+                         (r1 > 0) & (0 <= dist_r1) & (dist_r1 < 0.3)], [-25, -35], 0)
+            + np.select([has_fib & near_382, has_fib & near_618], [20, 25], 0)
+        )
+        structure = np.clip(structure, -60, 60)
+        
+        total_score = np.select(
+            [trending, ranging],
+            [trend * 0.5 + structure * 0.25 + volume * 0.25,
+             mean_rev * 0.5 + structure * 0.25 + volume * 0.25],
+            (trend + mean_rev) * 0.35 + structure * 0.15 + volume * 0.15
+        )
+        
+        # 大趋势过滤
+        ma200 = get('ma_200', price)
+        against_trend = (ma200 > 0) & (
+            ((ma50 > ma200 * 1.02) & (total_score < -20))
+            | ((ma50 < ma200 * 0.98) & (total_score > 20))
+        )
+        
+        threshold = self.config.get('signal_threshold', 28)
+        valid = (
+            ~((atr_pct > 5) | (atr_pct < 0.3))
+            & ~against_trend
+            & ~(np.abs(total_score) < threshold)
+        )
+        
+        # 2.8倍ATR止损，1.6倍ATR止盈
+        long = total_score > 0
+        stop_loss = np.where(long, price - atr * 2.8, price + atr * 2.8)
+        take_profit = np.where(long, price + atr * 1.6, price - atr * 1.6)
+        return finalize_signals(valid, total_score, stop_loss, take_profit, 45, 28)
+    
     def _get_market_state(self, ind: dict) -> str:
         adx = ind.get('adx', 25)
         bb_width = ind.get('bb_width', 0.03)
@@ -5,6 +5,10 @@ from typing import Dict, Any, Optional
 from dataclasses import dataclass
 from datetime import datetime
 from enum import Enum
+from functools import partial
+import numpy as np
+
+from backtest_core import indicator_column, finalize_signals
 
 
 class SignalType(Enum):
@@ -94,6 +98,59 @@ class BreakoutStrategy:
             timestamp=datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         )
     
+    def analyze_batch(self, arrays: Dict[str, np.ndarray]) -> tuple:
+        """对 calculate_all_vectorized 的整段指标序列一次性生成信号（回测用）
+        返回与K线对齐的 (信号编码, 止损, 止盈, 强度) 数组，逐根结果与 analyze 一致
+        """
+        get = partial(indicator_column, arrays)
+        price = arrays['price']
+        atr = get('atr', price * 0.01)
+        atr_pct = atr / price * 100
+        
+        bb_upper = get('bb_upper', price * 1.02)
+        bb_lower = get('bb_lower', price * 0.98)
+        bb_pband = get('bb_pband', 0.5)
+        r1 = get('r1', 0)
+        s1 = get('s1', 0)
+        high_20 = get('high_20', price)
+        low_20 = get('low_20', price)
+        adx = get('adx', 20)
+        
+        # 突破条件按 _detect_breakout 的顺序判断，后满足的条件覆盖突破位
+        breakouts = [
+            (bb_pband > 1.0, 40, bb_upper),
+            (price > high_20 * 0.998, 35, high_20),
+            ((r1 > 0) & (price > r1), 30, r1),
+            (bb_pband < 0, -40, bb_lower),
+            (price < low_20 * 1.002, -35, low_20),
+            ((s1 > 0) & (price < s1), -30, s1),
+        ]
+        total_score = np.zeros(len(price))
+        breakout_level = price
+        for hit, score, level in breakouts:
+            total_score = total_score + np.where(hit, score, 0)
+            breakout_level = np.where(hit, level, breakout_level)
+        up_breakout = breakouts[0][0] | breakouts[1][0] | breakouts[2][0]
+        down_breakout = breakouts[3][0] | breakouts[4][0] | breakouts[5][0]
+        
+        # ADX确认趋势强度
+        total_score = total_score + np.select(
+            [(adx > 25) & up_breakout, (adx > 25) & down_breakout], [20, -20], 0
+        )
+        
+        vol_ratio = get('volume_ratio', 1)
+        valid = (
+            ~((atr_pct > 4) | (atr_pct < 0.3))
+            & (up_breakout | down_breakout)
+            & ~(vol_ratio < 1.5)
+            & ~(np.abs(total_score) < 50)
+        )
+        
+        long = total_score > 0
+        stop_loss = np.where(long, breakout_level - atr * 0.5, breakout_level + atr * 0.5)
+        take_profit = np.where(long, price + atr * 3.0, price - atr * 3.0)
+        return finalize_signals(valid, total_score, stop_loss, take_profit, 70, 50)
+    
     def _detect_breakout(self, ind: dict) -> dict:
         """检测突破信号"""
         score = 0
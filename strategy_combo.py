@@ -6,6 +6,10 @@ from typing import Dict, Any, Optional
 from dataclasses import dataclass
 from datetime import datetime
 from enum import Enum
+from functools import partial
+import numpy as np
+
+from backtest_core import indicator_column, finalize_signals
 
 
 class SignalType(Enum):
@@ -112,6 +116,72 @@ class ComboStrategy:
             timestamp=datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         )
     
+    def analyze_batch(self, arrays: Dict[str, np.ndarray]) -> tuple:
+        """对 calculate_all_vectorized 的整段指标序列一次性生成信号（回测用）
+        返回与K线对齐的 (信号编码, 止损, 止盈, 强度) 数组，逐根结果与 analyze 一致
+        """
+        get = partial(indicator_column, arrays)
+        price = arrays['price']
+        atr = get('atr', price * 0.01)
+        atr_pct = atr / price * 100
+        
+        # 1. 市场状态
+        adx = get('adx', 20)
+        trending = adx > self.adx_trend
+        ranging = ~trending & (adx < self.adx_range)
+        
+        # 2. 趋势市场：顺势回调
+        ma20 = get('ma_20', price)
+        ma50 = get('ma_50', price)
+        ema9 = get('ema_9', price)
+        ema21 = get('ema_21', price)
+        rsi = get('rsi', 50)
+        macd_hist = get('macd_hist', 0)
+        bb_pband = get('bb_pband', 0.5)
+        bull = (ema9 > ema21) & (ma20 > ma50) & (price > ma20)
+        bear = ~bull & (ema9 < ema21) & (ma20 < ma50) & (price < ma20)
+        trend_score = np.where(
+            bull,
+            30 + 30 * ((35 <= rsi) & (rsi <= 50)) + 20 * ((0.3 <= bb_pband) & (bb_pband <= 0.6))
+            + 10 * (macd_hist > 0),
+            0
+        ) - np.where(
+            bear,
+            30 + 30 * ((50 <= rsi) & (rsi <= 65)) + 20 * ((0.4 <= bb_pband) & (bb_pband <= 0.7))
+            + 10 * (macd_hist < 0),
+            0
+        )
+        
+        # 3. 震荡市场：极端超买超卖
+        k = get('stoch_k', 50)
+        oversold = rsi < self.rsi_oversold
+        overbought = ~oversold & (rsi > self.rsi_overbought)
+        range_score = np.where(
+            oversold,
+            35 + 25 * (bb_pband < 0.1) + 20 * (k < 20),
+            0
+        ) - np.where(
+            overbought,
+            35 + 25 * (bb_pband > 0.9) + 20 * (k > 80),
+            0
+        )
+        
+        total_score = np.where(trending, trend_score, np.where(ranging, range_score, 0))
+        sl_mult = np.where(trending, self.trend_sl, self.range_sl)
+        tp_mult = np.where(trending, self.trend_tp, self.range_tp)
+        
+        valid = (
+            ~((atr_pct > 4) | (atr_pct < 0.2))
+            & (trending | ranging)
+            & (np.abs(total_score) >= 50)
+            & ~(np.abs(total_score) < self.entry_threshold)
+        )
+        
+        long = total_score > 0
+        stop_loss = np.where(long, price - atr * sl_mult, price + atr * sl_mult)
+        take_profit = np.where(long, price + atr * tp_mult, price - atr * tp_mult)
+        return finalize_signals(valid, total_score.astype(np.float64), stop_loss, take_profit, 60, 50)
+    
     def _identify_market_state(self, ind: dict) -> str:
         """识别市场状态"""
         adx = ind.get('adx', 20)
@@ -6,6 +6,10 @@ from typing import Dict, Any, Optional
 from dataclasses import dataclass
 from datetime import datetime
 from enum import Enum
+from functools import partial
+import numpy as np
+
+from backtest_core import indicator_column, finalize_signals
 
 
 class SignalType(Enum):
@@ -107,6 +111,79 @@ class OvernightStrategy:
             timestamp=datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         )
     
+    def analyze_batch(self, arrays: Dict[str, np.ndarray]) -> tuple:
+        """对 calculate_all_vectorized 的整段指标序列一次性生成信号（回测用）
+        返回与K线对齐的 (信号编码, 止损, 止盈, 强度) 数组，逐根结果与 analyze 一致
+        """
+        get = partial(indicator_column, arrays)
+        price = arrays['price']
+        atr = get('atr', price * 0.01)
+        atr_pct = atr / price * 100
+        
+        # 均值回归
+        rsi = get('rsi', 50)
+        bb_pband = get('bb_pband', 0.5)
+        k = get('stoch_k', 50)
+        d = get('stoch_d', 50)
+        mean_rev = (
+            np.select([rsi < self.rsi_oversold, rsi < self.rsi_oversold + 10,
+                       rsi > self.rsi_overbought, rsi > self.rsi_overbought - 10],
+                      [45, 30, -45, -30], 0)
+            + np.select([bb_pband < 0, bb_pband < 0.15, bb_pband > 1, bb_pband > 0.85],
+                        [40, 25, -40, -25], 0)
+            + np.select([(k < 20) & (d < 25), (k > 80) & (d > 75)], [30, -30], 0)
+        )
+        mean_rev = np.clip(mean_rev, -100, 100)
+        
+        # 市场结构
+        s1 = get('s1', 0)
+        r1 = get('r1', 0)
+        fib_382 = get('fib_382', 0)
+        fib_618 = get('fib_618', 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            dist_s1 = (price - s1) / s1 * 100
+            dist_r1 = (price - r1) / r1 * 100
+            near_618 = np.abs(price - fib_618) / fib_618 < 0.008
+            near_382 = np.abs(price - fib_382) / fib_382 < 0.008
+        structure = (
+            np.select([(s1 > 0) & (0 < dist_s1) & (dist_s1 < 1),
+                       (s1 > 0) & (-0.5 < dist_s1) & (dist_s1 <= 0)], [35, 45], 0)
+            + np.select([(r1 > 0) & (-1 < dist_r1) & (dist_r1 < 0),
+                         (r1 > 0) & (0 <= dist_r1) & (dist_r1 < 0.5)], [-35, -45], 0)
+            + np.select([(fib_618 > 0) & near_618, (fib_382 > 0) & near_382], [25, 20], 0)
+        )
+        structure = np.clip(structure, -80, 80)
+        
+        # 动量
+        macd_hist = get('macd_hist', 0)
+        vol_ratio = get('volume_ratio', 1)
+        momentum = (
+            np.where(macd_hist > 0, 15, -15)
+            + np.select([vol_ratio > 1.5, vol_ratio < 0.6], [10, -10], 0)
+        )
+        momentum = np.clip(momentum, -30, 30)
+        
+        total_score = mean_rev * 0.5 + structure * 0.3 + momentum * 0.2
+        
+        threshold = self.config.get('signal_threshold', 50)
+        valid = (
+            ~((atr_pct > 3) | (atr_pct < 0.2))
+            & ~(np.abs(total_score) < threshold)
+        )
+        
+        # 动态止盈止损依赖候选价位筛选，只对有信号的K线逐根计算
+        nan = np.full(len(price), np.nan)
+        codes, _, _, strength = finalize_signals(valid, total_score, nan, nan, 50, 30)
+        stop_loss = nan.copy()
+        take_profit = nan.copy()
+        level_keys = ('s1', 's2', 'r1', 'r2', 'bb_lower', 'bb_upper', 'bb_middle')
+        for i in np.flatnonzero(codes):
+            ind = {key: arrays[key][i] for key in level_keys if key in arrays}
+            stop_loss[i], take_profit[i] = self._calculate_dynamic_levels(
+                ind, total_score[i], price[i], atr[i]
+            )
+        return codes, stop_loss, take_profit, strength
+    
     def _mean_reversion_signal(self, ind: dict) -> dict:
         """均值回归信号 - 优化版"""
         score = 0
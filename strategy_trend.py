@@ -6,6 +6,10 @@ from typing import Dict, Any, Optional
 from dataclasses import dataclass
 from datetime import datetime
 from enum import Enum
+from functools import partial
+import numpy as np
+
+from backtest_core import indicator_column, finalize_signals
 
 
 class SignalType(Enum):
@@ -109,6 +113,68 @@ class TrendStrategy:
             timestamp=datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         )
     
+    def analyze_batch(self, arrays: Dict[str, np.ndarray]) -> tuple:
+        """对 calculate_all_vectorized 的整段指标序列一次性生成信号（回测用）
+        返回与K线对齐的 (信号编码, 止损, 止盈, 强度) 数组，逐根结果与 analyze 一致
+        """
+        get = partial(indicator_column, arrays)
+        price = arrays['price']
+        atr = get('atr', price * 0.01)
+        atr_pct = atr / price * 100
+        
+        # 1. 主趋势
+        ma20 = get('ma_20', price)
+        ma50 = get('ma_50', price)
+        ema9 = get('ema_9', price)
+        ema21 = get('ema_21', price)
+        adx = get('adx', 20)
+        up_count = (price > ma20).astype(int) + (price > ma50) + (ema9 > ema21) + (ma20 > ma50)
+        has_trend = ~(adx < self.adx_threshold)
+        up = has_trend & (up_count >= 3)
+        down = has_trend & (up_count <= 1)
+        
+        # 2. 回调入场点
+        rsi = get('rsi', 50)
+        bb_pband = get('bb_pband', 0.5)
+        k = get('stoch_k', 50)
+        near_ema21 = np.abs(price - ema21) / ema21 < 0.01
+        up_score = (
+            30 * ((self.rsi_pullback_low <= rsi) & (rsi <= self.rsi_pullback_high))
+            + 25 * ((0.3 <= bb_pband) & (bb_pband <= 0.6))
+            + 25 * near_ema21
+            + 20 * ((30 <= k) & (k <= 50))
+        )
+        down_score = -(
+            30 * (((100 - self.rsi_pullback_high) <= rsi) & (rsi <= (100 - self.rsi_pullback_low)))
+            + 25 * ((0.4 <= bb_pband) & (bb_pband <= 0.7))
+            + 25 * near_ema21
+            + 20 * ((50 <= k) & (k <= 70))
+        )
+        total_score = np.where(up, up_score, np.where(down, down_score, 0))
+        
+        # 3. 动量确认
+        macd_hist = get('macd_hist', 0)
+        di_plus = get('di_plus', 0)
+        di_minus = get('di_minus', 0)
+        momentum_ok = np.where(
+            up,
+            (macd_hist > 0) | (di_plus > di_minus),
+            (macd_hist < 0) | (di_minus > di_plus)
+        )
+        
+        valid = (
+            ~((atr_pct > 4) | (atr_pct < 0.2))
+            & (up | down)
+            & (np.abs(total_score) >= 40)
+            & momentum_ok
+            & ~(np.abs(total_score) < self.entry_threshold)
+        )
+        
+        long = total_score > 0
+        stop_loss = np.where(long, price - atr * self.sl_mult, price + atr * self.sl_mult)
+        take_profit = np.where(long, price + atr * self.tp_mult, price - atr * self.tp_mult)
+        return finalize_signals(valid, total_score.astype(np.float64), stop_loss, take_profit, 60, 35)
+    
     def _get_main_trend(self, ind: dict) -> str:
         """判断主趋势"""
         price = ind['price']